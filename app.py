@@ -428,14 +428,37 @@ import sys
 
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import streamlit as st
-import requests
-import os
-import re
-from pydantic import BaseModel, Field
-from crewai import Agent, Task, Crew, Process
-from crewai import LLM
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from dotenv import load_dotenv
 import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+from pipeline import (
+    DEFAULT_API_URL,
+    SECTION_CODE_CONCURRENCY,
+    generation_history,
+    get_llm,
+    get_render_function,
+    lookup_cached_generation,
+    record_generation,
+    render_approved,
+    run_generation,
+    run_incremental_generation,
+    store_cached_generation,
+    video_source,
+)
+from topics import log_topic
+from sections import strip_section_ids
+from replay import PIPELINE_MODE
+from render_cost import estimate_render_cost
+from store import new_job_id
+from generation_jobs import STEPS, get_job, start_job
+from cache_warming import start_cache_warming
+from render_warmup import get_service_warmer
+from cancellation import CancelledError
+from hedging import DeadlineExceeded
 
 # Load environment variables
 load_dotenv()
@@ -486,278 +509,374 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Define pydantic model for Manim code output
-class ManimCodeOutput(BaseModel):
-    code: str = Field(..., description="The complete Manim Python code")
-    scene_name: str = Field("", description="The name of the main scene class in the code")
-
-# Set up the LLM
-def get_llm():
-    return LLM(
-        model='anthropic/claude-3-7-sonnet-20250219', 
-        api_key=st.secrets['ANTHROPIC_API_KEY'],
-        temperature=0.2,
-        max_tokens=10000,
-        max_completion_tokens=20000
-    )
+# Show a stored generation (history entry) as the current result
+def load_job(job):
+    st.session_state.content = job["content"]
+    st.session_state.edited_content = job["content"]
+    st.session_state.manim_code = job["manim_code"]
+    st.session_state.video_id = job["video_id"]
+    st.session_state.video_path = job["video_path"]
+    st.session_state.job_id = job["id"]
+    st.session_state.storyboard = None
+    st.session_state.generation_complete = True
 
-# Define the agents
-def create_agents(llm):
-    # Agent 1: Content Generator Agent
-    content_generator_agent = Agent(
-        role="Educational Content Creator",
-        goal="Generate comprehensive educational content on mathematical topics",
-        backstory="""You are an expert mathematics educator with deep understanding of 
-        various mathematical concepts. You excel at explaining complex topics in clear, 
-        structured ways that make them accessible to students. You're known for your 
-        ability to break down difficult concepts into digestible chunks and for creating 
-        content that flows logically from introduction to advanced applications.""",
-        verbose=False,
-        llm=llm
-    )
+# Seconds between progress polls while a generation runs in the background
+PROGRESS_POLL_SECONDS = 0.5
 
-    # Agent 2: Manim Developer Agent
-    manim_developer_agent = Agent(
-        role="Manim Animation Developer",
-        goal="""Transform educational content into beautiful animated visualizations using Manim""",
-        backstory="""You are a Python developer specializing in mathematical animations 
-        using the Manim library (version 0.19.0). You have extensive experience translating mathematical 
-        concepts into visually stunning animations. You're skilled at writing clean, efficient 
-        Manim code that brings abstract mathematical concepts to life through animation.
-        You are known for creating perfectly timed animations with NO OVERLAPPING elements and
-        clear transitions between concepts.""",
-        verbose=False,
-        llm=llm
-    )
+STEP_TITLES = {
+    "content": "Step 1: Creating educational content",
+    "animation": "Step 2: Designing animations",
+    "rendering": "Step 3: Rendering final video",
+}
 
-    return content_generator_agent, manim_developer_agent
+# Server CPU spent on this session's script runs, per scope ("app" full reruns, "fragment" polls)
+@contextmanager
+def track_cpu(scope):
+    started = time.thread_time()
+    try:
+        yield
+    finally:
+        stats = st.session_state.setdefault("cpu_stats", {})
+        seconds, runs = stats.get(scope, (0.0, 0))
+        stats[scope] = (seconds + time.thread_time() - started, runs + 1)
 
-# Define the tasks
-def create_tasks(content_generator_agent, manim_developer_agent, topic):
-    # Task 1: Generate educational content
-    content_generation_task = Task(
-        name="generate_math_content",
-        description=f"""
-        Create comprehensive educational content about {topic} with the following:
-        
-        1. Clear introduction to the concept
-        2. Step-by-step explanation of the key principles
-        3. Mathematical notation and formulas
-        4. At least one worked example demonstrating the concept
-        5. Suggestions for visual representations that would help illustrate the concept
-        
-        Your content should be well-structured, engaging, and suitable for transformation 
-        into an animated video. Focus on both clarity and accuracy.
-        """,
-        agent=content_generator_agent,
-        expected_output="""Detailed educational content covering the requested mathematical topic,
-        including explanations, examples, and suggestions for visualization.""",
-    )
+# Show a render's real percent complete and ETA (reported by the rendering service) on the
+# rendering step; section renders of the incremental mode also count finished sections
+def report_render_progress(job, progress):
+    fraction = progress["percent"] / 100.0
+    where = []
+    if progress.get("sections"):
+        fraction = (progress["section"] - 1 + fraction) / progress["sections"]
+        where.append(f"section {progress['section']}/{progress['sections']}")
+    if progress.get("animation"):
+        where.append(f"animation {progress['animation']}/{progress['animations']}")
+    eta = f" (ETA ~{progress['eta_seconds']:.0f}s)" if progress.get("eta_seconds") is not None else ""
+    job.set("rendering", min(0.99, fraction),
+            f"🎬 Rendering {', '.join(where) or 'animation frames'}... {progress['percent']:.0f}%{eta}")
 
-    # Task 2: Develop Manim code based on content
-    manim_code_development_task = Task(
-        name="develop_manim_code",
-        description=f"""
-        Using the provided educational content about {topic}, create a Python script using 
-        the Manim library (version 0.19.0) that:
-        
-        1. Implements all the key explanations from the content
-        2. Creates a SINGLE scene class named "MainScene" that inherits from Scene
-        3. Includes proper mathematical notation and formulas
-        4. Animates the worked examples with clear transitions
-        5. Uses color, movement, and timing effectively
-        
-        CRITICAL REQUIREMENTS:
-        1. Create ONLY ONE scene class named "MainScene" - this is essential for proper rendering
-        2. Ensure your code follows these strict timing rules:
-           - Use self.wait() after each animation to provide breathing room
-           - NEVER have overlapping animations unless explicitly using AnimationGroup
-           - Always FadeOut or Transform old elements before introducing new ones in the same area
-           - Position text and equations with careful spacing (use buffers of at least 0.5)
-           - For text elements, use font_size parameter to control size
-        3. Start your response with: ```python
-        4. End your response with: ```
-        5. Include ONLY these two imports at the top:
-           ```
-           from manim import *
-           import numpy as np
-           ```
-        6. Your code must be complete and executable with no missing components
-        
-        COMPATIBILITY REQUIREMENTS:
-        1. ONLY use standard Manim classes (v0.19.0):
-           - For geometric shapes, use: Circle, Square, Rectangle, Polygon, Line, Arrow, etc.
-           - For text, use: Text, Tex, or MathTex
-           - DO NOT use custom classes like 'RightAngleTriangle'
-           
-        2. For a right-angled triangle, use Polygon:
-           ```python
-           triangle = Polygon(
-               ORIGIN, 
-               RIGHT * 4, 
-               UP * 3,
-               color=WHITE
-           )
-           ```
-           
-        3. For right angle marks, use Square:
-           ```python
-           right_angle = Square(side_length=0.5, color=WHITE).move_to(
-               triangle.get_vertices()[0] + (RIGHT * 0.25 + UP * 0.25)
-           )
-           ```
-          
-        4. DO NOT use print statements or comments with special Unicode characters
-        5. Use simple ASCII characters only in strings and comments
-        6. Use self.play() for all animations, not Transform() on its own
-        7. Break long animations into shorter sequences
-        """,
-        agent=manim_developer_agent,
-        expected_output="""A complete, well-structured Python script using Manim to animate
-        the educational content provided, with a single MainScene class and careful timing.""",
-        context=[content_generation_task]
-    )
-    return content_generation_task, manim_code_development_task
 
-# Extract all scene class names from the code (kept for utility)
-def extract_scene_classes(code):
-    scene_classes = []
-    pattern = r'class\s+(\w+)\s*\(\s*Scene\s*\)'
-    matches = re.finditer(pattern, code)
-    
-    for match in matches:
-        scene_classes.append(match.group(1))
-    
-    return scene_classes
+# How much of the rendering service's cold start the warm-up ping took off the render
+def warmup_note(response):
+    warmup = (response or {}).get("warmup")
+    if not warmup or warmup["hidden_seconds"] < 1:
+        return ""
+    return f" (the render service was woken up early, hiding ~{warmup['hidden_seconds']:.0f}s of its cold start)"
 
-# Extract Manim code (minimal debugging messages)
-def extract_manim_code(result):
-    try:
-        result_str = str(result)
-        
-        # Case 1: Standard code block with ```python ... ```
-        start_marker = "```python"
-        end_marker = "```"
-        
-        start_pos = result_str.find(start_marker)
-        if start_pos != -1:
-            code_start = start_pos + len(start_marker)
-            end_pos = result_str.find(end_marker, code_start)
-            
-            if end_pos != -1:
-                code = result_str[code_start:end_pos].strip()
+
+# Generation work for the background thread. It makes no Streamlit calls: progress goes
+# through the job, and the session state to apply is returned for the UI to pick up.
+def run_generation_job(job, topic, llm, api_url, mode, session_id, edited_content=None):
+    incremental = mode == "incremental"
+    storyboard_mode = mode == "storyboard"
+    updates = {}
+    job.set("content", message="🧠 Researching and planning educational content...")
+    
+    # Drive the progress steps from the pipeline stages
+    def on_event(stage, payload=None):
+        if stage == "crew_started":
+            job.ramp("content", 0.7, 3.5, [
+                (2.0, "🧠 Analyzing mathematical concepts..."),
+                (3.5, "📝 Formulating explanations and examples..."),
+            ])
+        
+        elif stage == "crew_finished":
+            updates["content"] = payload
+            updates["edited_content"] = payload
+            updates["queue_wait"] = llm.queue_wait
+            if llm.queue_wait >= 1:
+                job.set("content", 1.0, f"✅ Educational content created successfully! (waited {llm.queue_wait:.1f}s in the API queue)")
             else:
-                code = result_str[code_start:].strip()
-        
-        # Case 2: No start marker, but contains "from manim import"
-        elif "from manim import" in result_str:
-            code_start = result_str.find("from manim import")
-            code = result_str[code_start:].strip()
-        
-        # Case 3: No markers at all, but contains "class" and "Scene"
-        elif "class" in result_str and "Scene" in result_str:
-            scene_class_match = re.search(r'class\s+\w+\s*\(\s*Scene\s*\)', result_str)
-            if scene_class_match:
-                import_pos = result_str.rfind("import", 0, scene_class_match.start())
-                if import_pos != -1:
-                    code_start = import_pos
-                else:
-                    code_start = scene_class_match.start()
-                
-                code = result_str[code_start:].strip()
+                job.set("content", 1.0, "✅ Educational content created successfully!")
+            
+            # Section modes report real progress instead
+            job.set("animation", message="🎨 Generating animation code...")
+            if not (incremental or SECTION_CODE_CONCURRENCY > 0):
+                job.ramp("animation", 0.99, 5.0, [(2.5, "💻 Optimizing animation sequences...")])
+        
+        elif stage == "code_extracted":
+            if payload:
+                job.set("animation", 1.0, "✅ Animation code generated successfully!")
+                updates["manim_code"] = payload
             else:
-                return None
-        else:
-            return None
+                job.set("animation", message="❌ Animation code generation failed. Please try again.")
+                job.set("rendering", message="⏸️ Video rendering skipped.")
         
-        # Ensure the code has proper imports
-        imports_to_add = []
-        if "from manim import" not in code and "import manim" not in code:
-            imports_to_add.append("from manim import *")
+        elif stage == "section_code":
+            job.set("animation", payload)
         
-        if "import numpy as np" not in code and "numpy" in code:
-            imports_to_add.append("import numpy as np")
-            
-        if imports_to_add:
-            code = "\n".join(imports_to_add) + "\n\n" + code
+        elif stage == "section_render":
+            job.set("rendering", payload)
         
-        # Ensure it uses MainScene class - rename if necessary
-        if "class MainScene(Scene)" not in code:
-            scene_class_match = re.search(r'class\s+(\w+)\s*\(\s*Scene\s*\)', code)
-            if scene_class_match:
-                original_name = scene_class_match.group(1)
-                code = code.replace(f"class {original_name}(Scene)", "class MainScene(Scene)")
-                code = code.replace(f"{original_name}()", "MainScene()")
+        elif stage == "render_started" and storyboard_mode:
+            job.set("rendering", message="🖼️ Rendering storyboard frames...")
         
-        # Clean the code of any potentially problematic characters
-        cleaned_lines = []
-        for line in code.split('\n'):
-            if '#' in line:
-                comment_pos = line.find('#')
-                code_part = line[:comment_pos]
-                comment_part = line[comment_pos:]
-                cleaned_comment = ''.join(c if ord(c) < 128 else ' ' for c in comment_part)
-                cleaned_lines.append(code_part + cleaned_comment)
+        elif stage == "render_started":
+            estimate = None if incremental else estimate_render_cost(payload.code, payload.scene_name)
+            if estimate:
+                job.set("rendering", message=(
+                    f"🎬 Rendering animation frames... (~{estimate.video_seconds:.0f}s of video, "
+                    f"est. {estimate.render_cpu_seconds:.0f}s to render)"
+                ))
             else:
-                cleaned_lines.append(line)
-        
-        code = '\n'.join(cleaned_lines)
+                job.set("rendering", message="🎬 Rendering animation frames...")
+            if not incremental:
+                job.ramp("rendering", 0.9, 9.0, [(3.0, "🎥 Processing video...")])
         
-        # Setting scene_name to "MainScene" to ensure only one scene is rendered
-        scene_name = "MainScene"
-        
-        return ManimCodeOutput(code=code, scene_name=scene_name)
+        elif stage == "render_progress":
+            report_render_progress(job, payload)
+    
+    try:
+        if incremental:
+            result = run_incremental_generation(
+                topic, llm, api_url, content=edited_content, render=get_render_function(), on_event=on_event,
+                cancel_token=job.cancel_token, client_id=session_id
+            )
+            if result["manim_code"]:
+                if result["video_path"]:
+                    updates["video_path"] = result["video_path"]
+                    store_cached_generation(
+                        topic, result["content"], result["manim_code"], api_url, video_path=result["video_path"]
+                    )
+                    stats = result["stats"]
+                    job.set("rendering", 1.0, f"✅ Video rendered successfully! Reused {stats['clips_reused']} of {stats['sections']} section clips.")
+                    updates["generation_complete"] = True
+                else:
+                    job.set("rendering", 1.0, "❌ Video rendering failed. Please try again.")
+        else:
+            result = run_generation(
+                topic, llm, api_url, render=get_render_function(), on_event=on_event, storyboard=storyboard_mode,
+                cancel_token=job.cancel_token, client_id=session_id
+            )
+        response = result.get("render")
         
+        if result["manim_code"] and storyboard_mode:
+            if response and response["frames"]:
+                updates["storyboard"] = dict(response, topic=topic)
+                job.set("rendering", 1.0, "✅ Storyboard ready! Review it below before rendering the video."
+                        + warmup_note(response))
+            else:
+                job.set("rendering", 1.0, "❌ Storyboard rendering failed. Please try again.")
+        elif result["manim_code"] and not incremental:
+            if response and "video_id" in response:
+                updates["video_id"] = response["video_id"]
+                store_cached_generation(
+                    topic, result["content"], result["manim_code"], api_url, video_id=response["video_id"]
+                )
+                updates["scenes_rendered"] = response.get("scenes_rendered", [])
+                job.set("rendering", 1.0, "✅ Video rendered successfully!" + warmup_note(response))
+                updates["generation_complete"] = True
+            elif response and response.get("violation") == "latex":
+                job.set("rendering", 1.0, f"❌ {response['error']}")
+            else:
+                job.set("rendering", 1.0, "❌ Video rendering failed. Please try again.")
+        
+        status = "done" if updates.get("generation_complete") else "storyboard" if updates.get("storyboard") else "failed"
+        record_generation(job.id, session_id, topic, mode, api_url, status, result=result)
+    except CancelledError:
+        record_generation(job.id, session_id, topic, mode, api_url, "cancelled",
+                          error=job.cancel_token.reason, reclaimed=job.cancel_token.reclaimed)
+        raise
     except Exception as e:
-        return None
+        if isinstance(e, DeadlineExceeded):
+            # Say which step ran out of time on the step that was running
+            view = job.view()
+            step = next((step for step in STEPS if view[step]["progress"] < 1.0), STEPS[-1])
+            job.set(step, message=f"⏱️ {e}.")
+        record_generation(job.id, session_id, topic, mode, api_url, "error", error=str(e))
+        raise
+    return updates
 
-# Function to send code to the rendering API
-def render_manim_code(manim_code: ManimCodeOutput, api_url: str):
+# Full render of a storyboard the user approved, on the background thread
+def render_storyboard_job(job, storyboard, content, manim_code, api_url, session_id):
+    job.set("content", 1.0, "✅ Educational content created successfully!")
+    job.set("animation", 1.0, "✅ Storyboard approved.")
+    job.set("rendering", message="🎬 Rendering animation frames...")
+    job.ramp("rendering", 0.9, 9.0, [(3.0, "🎥 Processing video...")])
     try:
-        if api_url.endswith('/'):
-            api_url = api_url[:-1]
-        
-        # Create payload with the extracted code
-        payload = {
-            "code": manim_code.code,
-            "scene_name": manim_code.scene_name
-        }
-        
-        # Send to API
-        response = requests.post(
-            f"{api_url}/render",
-            json=payload
-        )
+        response = render_approved(storyboard["topic"], content, manim_code, api_url, render=get_render_function(),
+                                   cancel_token=job.cancel_token, client_id=session_id,
+                                   on_progress=lambda progress: report_render_progress(job, progress))
+    except CancelledError:
+        record_generation(job.id, session_id, storyboard["topic"], "storyboard", api_url, "cancelled",
+                          error=job.cancel_token.reason, reclaimed=job.cancel_token.reclaimed)
+        raise
+    if not (response and "video_id" in response):
+        job.set("rendering", 1.0, "❌ Video rendering failed. Please try again.")
+        return {}
+    store_cached_generation(storyboard["topic"], content, manim_code, api_url, video_id=response["video_id"])
+    record_generation(job.id, session_id, storyboard["topic"], "storyboard", api_url, "done", result={"render": response})
+    job.set("rendering", 1.0, "✅ Video rendered successfully!")
+    return {
+        "video_id": response["video_id"],
+        "scenes_rendered": response.get("scenes_rendered", []),
+        "storyboard": None,
+        "generation_complete": True,
+    }
+
+def show_progress(view):
+    for step in STEPS:
+        st.markdown(f"#### {STEP_TITLES[step]}")
+        st.progress(min(1.0, view[step]["progress"]))
+        if view[step]["message"]:
+            st.markdown(view[step]["message"])
+
+# Whether this browser session is still connected, for cancelling the jobs of closed
+# tabs (switching pages or backgrounding the tab keeps the session). None when there
+# is no runtime to ask, e.g. in tests.
+def session_liveness():
+    ctx = get_script_run_ctx()
+    if ctx is None or not runtime.exists():
+        return None
+    instance, session_id = runtime.get_instance(), ctx.session_id
+    return lambda: instance.is_active_session(session_id)
+
+# Progress of the running generation. Only this fragment reruns while polling; when the
+# job ends its results are queued for the next full run, which shows them.
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def progress_panel():
+    with track_cpu("fragment"):
+        job = get_job(st.session_state.active_job_id)
+        if job is None:
+            st.session_state.active_job_id = None
+            st.rerun()
+        view = job.view()
+        show_progress(view)
+        if job.done:
+            st.session_state.active_job_id = None
+            st.session_state.last_progress = view
+            st.session_state.last_error = job.error if job.status == "error" else None
+            st.session_state.last_cancelled = job.cancel_token.reclaimed if job.status == "cancelled" else None
+            st.session_state.pending_updates = job.result or {}
+            st.rerun()
+
+# Storyboard review: one frame per animation
+@st.fragment
+def storyboard_panel(api_url):
+    storyboard = st.session_state.storyboard
+    st.markdown("### 🖼️ Storyboard")
+    if storyboard.get("error"):
+        st.warning("The animation code stopped with an error after the frames below.")
+    columns = st.columns(4)
+    for index, frame in enumerate(storyboard["frames"]):
+        columns[index % 4].image(frame, caption=f"Animation {index + 1}", use_container_width=True)
+    if st.button("Render Full Video 🎥", key="render_storyboard_button"):
+        st.session_state.generation_complete = False
+        start_job(st.session_state.job_id, partial(
+            render_storyboard_job, storyboard=storyboard, content=st.session_state.content,
+            manim_code=st.session_state.manim_code, api_url=api_url, session_id=st.session_state.session_id
+        ), alive=session_liveness())
+        st.session_state.active_job_id = st.session_state.job_id
+        st.session_state.active_topic = storyboard["topic"]
+        st.rerun()
+    if st.session_state.manim_code:
+        with st.expander("View Animation Code", expanded=False):
+            st.code(st.session_state.manim_code.code, language="python")
+
+# Finished video with its content, code and editor; widgets here rerun only this fragment
+@st.fragment
+def results_panel(api_url):
+    st.markdown("### 🎉 Your Math Animation is Ready!")
+    
+    if st.session_state.video_path:
+        # Stitched section video stored locally
+        st.video(st.session_state.video_path)
+        with open(st.session_state.video_path, "rb") as file:
+            st.download_button(
+                label="Download Video",
+                data=file.read(),
+                file_name="math_animation.mp4",
+                mime="video/mp4",
+                use_container_width=False
+            )
+    else:
+        # Video display without card wrapper
+        if not api_url:
+            api_url = "http://localhost:8000"
         
-        if response.status_code != 200:
-            return None
-            
-        data = response.json()
+        video_url = video_source(api_url, st.session_state.video_id)
+        st.video(video_url)
         
-        if data.get("success", False):
-            if "video_id" in data:
-                return {"video_id": data["video_id"], "scenes_rendered": data.get("scenes_rendered", [])}
-            else:
-                return None
-        else:
-            return None
-            
-    except Exception as e:
-        return None
+        # Download button
+        st.markdown(f"<div style='text-align: center;'><a href='{video_url}' download='math_animation.mp4' target='_blank'><button style='background-color: #1E88E5; color: white; padding: 10px 20px; border: none; border-radius: 4px; cursor: pointer; font-weight: bold; max-width: 300px;'>Download Video</button></a></div>", unsafe_allow_html=True)
+    
+    # Educational content in expander
+    if st.session_state.content:
+        with st.expander("View Educational Content", expanded=False):
+            st.markdown(strip_section_ids(st.session_state.content))
+    
+    # Editable content: only sections that change are regenerated and re-rendered
+    if st.session_state.video_path and st.session_state.content:
+        with st.expander("Edit Content and Update Video", expanded=False):
+            st.text_area(
+                "Section content (keep the ## [section-id] headings)",
+                height=300,
+                key="edited_content"
+            )
+            if st.button("Update Changed Sections", key="update_sections_button"):
+                st.session_state.pending_update = True
+                st.rerun()
+    
+    # Code in expander for those who want to see it
+    if st.session_state.manim_code:
+        with st.expander("View Animation Code", expanded=False):
+            st.code(st.session_state.manim_code.code, language="python")
 
 # Main application function
 def main():
+    with track_cpu("app"):
+        app_body()
+
+# Anthropic key for background work; None falls back to the environment
+def background_api_key():
+    if PIPELINE_MODE == "replay":
+        return None
+    try:
+        return st.secrets['ANTHROPIC_API_KEY']
+    except Exception:
+        return None
+
+def app_body():
+    # Pre-generate the warm-list topics in the background (once per server process)
+    start_cache_warming(api_key=background_api_key())
+    
     # Application header - no card elements
     st.markdown("<h1 class='main-header'>Math Animation Studio</h1>", unsafe_allow_html=True)
     st.markdown("<p class='sub-header'>Generate beautiful educational videos explaining mathematical concepts using AI</p>", unsafe_allow_html=True)
     
+    # Results of a background generation that finished since the last run
+    for key, value in st.session_state.pop("pending_updates", {}).items():
+        st.session_state[key] = value
+    
     # Hidden configuration in the sidebar (collapsed by default)
     with st.sidebar.expander("Advanced Configuration", expanded=False):
         api_url = st.text_input(
             "Rendering Service URL", 
-            value="https://video-server-dlz7.onrender.com",
+            value=DEFAULT_API_URL,
             help="URL of the rendering service (default is fine for most users)"
         )
+        st.checkbox(
+            "Incremental section rendering",
+            value=False,
+            key="incremental_mode",
+            help="Generate and render each content section separately so edits only redo the changed sections"
+        )
+        st.checkbox(
+            "Reuse earlier videos for similar topics",
+            value=True,
+            key="reuse_cached",
+            help="Serve near-duplicate topics (e.g. 'pythagoras theorem') from earlier generations"
+        )
+        st.checkbox(
+            "Storyboard preview before rendering",
+            value=False,
+            key="storyboard_mode",
+            help="Show the end frame of every animation within seconds and render the full video only once approved"
+        )
+        cpu_stats = st.session_state.get("cpu_stats")
+        if cpu_stats:
+            st.caption("Server CPU this session: " + ", ".join(
+                f"{scope} {seconds * 1000:.0f} ms over {runs} runs" for scope, (seconds, runs) in cpu_stats.items()
+            ))
     
     # Input field for mathematical topic - without card wrapper
     st.text_input(
@@ -784,166 +903,137 @@ def main():
         st.session_state.scenes_rendered = []
     if 'generation_complete' not in st.session_state:
         st.session_state.generation_complete = False
+    if 'video_path' not in st.session_state:
+        st.session_state.video_path = None
     
     # Progress tracking
     if 'progress_status' not in st.session_state:
         st.session_state.progress_status = None
     
-    # Handle generation workflow
+    # Identify this session to the shared LLM rate limiter and the job store. The id is
+    # kept in the URL so a page refresh finds the session's history again.
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = st.query_params.get("session") or str(uuid.uuid4())
+        st.query_params["session"] = st.session_state.session_id
+        history = generation_history(st.session_state.session_id, limit=1)
+        if history:
+            load_job(history[0])
+    
+    # Wake the rendering service up while the user picks a topic (every rerun: page load,
+    # topic input, Generate), so its cold start overlaps LLM generation. Active sessions
+    # also keep it from spinning down.
+    get_service_warmer().warm(api_url or DEFAULT_API_URL, st.session_state.session_id)
+    
+    if 'queue_wait' not in st.session_state:
+        st.session_state.queue_wait = 0.0
+    if 'storyboard' not in st.session_state:
+        st.session_state.storyboard = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'active_job_id' not in st.session_state:
+        st.session_state.active_job_id = None
+    if 'active_topic' not in st.session_state:
+        st.session_state.active_topic = None
+    
+    # Earlier generations of this session
+    history = generation_history(st.session_state.session_id)
+    if history:
+        with st.sidebar.expander("History", expanded=False):
+            for job in history:
+                if st.button(job["topic"], key=f"history_{job['id']}", use_container_width=True):
+                    load_job(job)
+    
+    # Editing the content of an incremental video re-runs only the changed sections
+    incremental = st.session_state.incremental_mode
+    update_button = incremental and st.session_state.pop("pending_update", False)
+    storyboard_mode = st.session_state.storyboard_mode and not incremental
+    
+    # Serve near-duplicate topics from earlier generations
+    cached = None
     if generate_button and topic:
+        log_topic(topic)
+        if st.session_state.reuse_cached:
+            cached = lookup_cached_generation(topic, api_url)
+    if cached:
+        st.session_state.content = cached["content"]
+        st.session_state.edited_content = cached["content"]
+        st.session_state.manim_code = cached["manim_code"]
+        st.session_state.video_id = cached["video_id"]
+        st.session_state.video_path = cached["video_path"]
+        st.session_state.generation_complete = True
+        st.session_state.job_id = new_job_id()
+        record_generation(
+            st.session_state.job_id, st.session_state.session_id, topic, "cached", api_url, "done",
+            result={"content": cached["content"], "manim_code": cached["manim_code"],
+                    "render": {"video_id": cached["video_id"]}, "video_path": cached["video_path"]}
+        )
+        st.info(f"⚡ Reused the video generated for \"{cached['topic']}\" (match confidence {cached['confidence']:.0%}).")
+    
+    # A running generation is cancelled once it is superseded: by a new request or a
+    # different topic. Its LLM calls stop and its render is dropped from the queue.
+    active_job = get_job(st.session_state.active_job_id) if st.session_state.active_job_id else None
+    if active_job and not active_job.done:
+        if (generate_button or update_button) and topic:
+            active_job.cancel("superseded")
+            st.session_state.active_job_id = None
+        elif topic != st.session_state.active_topic:
+            active_job.cancel("topic changed")
+    
+    # Handle generation workflow: the work runs on a background thread and
+    # the progress fragment polls it
+    if (generate_button or update_button) and topic and not cached and not st.session_state.active_job_id:
         st.session_state.generation_complete = False
         st.session_state.video_id = None
+        st.session_state.video_path = None
+        st.session_state.storyboard = None
+        st.session_state.job_id = new_job_id()
+        mode = "incremental" if incremental else "storyboard" if storyboard_mode else "full"
+        record_generation(st.session_state.job_id, st.session_state.session_id, topic, mode, api_url, "running")
         
-        # Progress container - no card wrapper
-        progress_container = st.container()
-        
-        with progress_container:
-            # Step 1: Content Generation
-            st.markdown("#### Step 1: Creating educational content")
-            content_progress = st.progress(0)
-            content_status = st.empty()
-            content_status.markdown("🧠 Researching and planning educational content...")
-            
-            # Step 2: Animation Generation
-            st.markdown("#### Step 2: Designing animations")
-            animation_progress = st.progress(0)
-            animation_status = st.empty()
-            
-            # Step 3: Video Rendering
-            st.markdown("#### Step 3: Rendering final video")
-            rendering_progress = st.progress(0)
-            rendering_status = st.empty()
-        
-        # Run the generation process
         try:
-            # Initialize the LLM and agents
-            llm = get_llm()
-            content_generator_agent, manim_developer_agent = create_agents(llm)
-            content_generation_task, manim_code_development_task = create_tasks(
-                content_generator_agent, manim_developer_agent, topic
-            )
-            
-            # Create and run the crew
-            crew = Crew(
-                agents=[content_generator_agent, manim_developer_agent],
-                tasks=[content_generation_task, manim_code_development_task],
-                verbose=False,
-                process=Process.sequential
-            )
-            
-            # Animate content generation progress
-            for i in range(40):
-                content_progress.progress((i + 1) / 100)
-                time.sleep(0.05)
-            
-            content_status.markdown("🧠 Analyzing mathematical concepts...")
+            # Use the default API URL if not provided
+            if not api_url:
+                api_url = DEFAULT_API_URL
             
-            for i in range(40, 70):
-                content_progress.progress((i + 1) / 100)
-                time.sleep(0.05)
+            # Initialize the LLM for this session
+            api_key = None if PIPELINE_MODE == "replay" else st.secrets['ANTHROPIC_API_KEY']
+            llm = get_llm(api_key=api_key, session_id=st.session_state.session_id)
             
-            content_status.markdown("📝 Formulating explanations and examples...")
-            
-            # Run the crew
-            result = crew.kickoff()
-            
-            # Mark content as complete
-            content_progress.progress(100)
-            content_status.markdown("✅ Educational content created successfully!")
-            
-            # Extract the content
-            try:
-                if hasattr(result, 'tasks_output') and result.tasks_output:
-                    for task_output in result.tasks_output:
-                        if hasattr(task_output, 'task') and task_output.task.name == "generate_math_content":
-                            st.session_state.content = task_output.output
-                            break
-            except:
-                pass
-            
-            # Animate animation progress
-            animation_status.markdown("🎨 Generating animation code...")
-            
-            for i in range(50):
-                animation_progress.progress((i + 1) / 100)
-                time.sleep(0.05)
-            
-            animation_status.markdown("💻 Optimizing animation sequences...")
-            
-            for i in range(50, 100):
-                animation_progress.progress((i + 1) / 100)
-                time.sleep(0.05)
-            
-            animation_status.markdown("✅ Animation code generated successfully!")
-            
-            # Extract the Manim code
-            manim_code = extract_manim_code(result)
-            
-            if manim_code:
-                st.session_state.manim_code = manim_code
-                
-                # Render the video
-                rendering_status.markdown("🎬 Rendering animation frames...")
-                
-                # Animate rendering progress
-                for i in range(30):
-                    rendering_progress.progress((i + 1) / 100)
-                    time.sleep(0.1)
-                
-                # Use the default API URL if not provided
-                if not api_url:
-                    api_url = "https://video-server-dlz7.onrender.com"
-                
-                # Send to rendering service
-                rendering_status.markdown("🎥 Processing video...")
-                response = render_manim_code(manim_code, api_url)
-                
-                for i in range(30, 90):
-                    rendering_progress.progress((i + 1) / 100)
-                    time.sleep(0.1)
-                
-                if response and "video_id" in response:
-                    st.session_state.video_id = response["video_id"]
-                    st.session_state.scenes_rendered = response.get("scenes_rendered", [])
-                    rendering_progress.progress(100)
-                    rendering_status.markdown("✅ Video rendered successfully!")
-                    st.session_state.generation_complete = True
-                else:
-                    rendering_progress.progress(100)
-                    rendering_status.markdown("❌ Video rendering failed. Please try again.")
-            else:
-                animation_status.markdown("❌ Animation code generation failed. Please try again.")
-                rendering_status.markdown("⏸️ Video rendering skipped.")
+            edited_content = st.session_state.get("edited_content") if update_button else None
+            start_job(st.session_state.job_id, partial(
+                run_generation_job, topic=topic, llm=llm, api_url=api_url, mode=mode,
+                session_id=st.session_state.session_id, edited_content=edited_content
+            ), alive=session_liveness())
+            st.session_state.active_job_id = st.session_state.job_id
+            st.session_state.active_topic = topic
         
         except Exception as e:
+            record_generation(
+                st.session_state.job_id, st.session_state.session_id, topic, mode, api_url, "error", error=str(e)
+            )
             st.error("An error occurred during generation. Please try again.")
     
-    # Display results after generation is complete
-    if st.session_state.generation_complete and st.session_state.video_id:
-        st.markdown("### 🎉 Your Math Animation is Ready!")
-        
-        # Video display without card wrapper
-        if not api_url:
-            api_url = "http://localhost:8000"
-        
-        if api_url.endswith('/'):
-            api_url = api_url[:-1]
-        
-        video_url = f"{api_url}/video/{st.session_state.video_id}"
-        st.video(video_url)
-        
-        # Download button
-        st.markdown(f"<div style='text-align: center;'><a href='{video_url}' download='math_animation.mp4' target='_blank'><button style='background-color: #1E88E5; color: white; padding: 10px 20px; border: none; border-radius: 4px; cursor: pointer; font-weight: bold; max-width: 300px;'>Download Video</button></a></div>", unsafe_allow_html=True)
-        
-        # Educational content in expander
-        if st.session_state.content:
-            with st.expander("View Educational Content", expanded=False):
-                st.markdown(st.session_state.content)
+    # Progress of the running generation, or how the last one ended
+    if st.session_state.active_job_id:
+        progress_panel()
+    else:
+        last_progress = st.session_state.pop("last_progress", None)
+        if last_progress:
+            show_progress(last_progress)
+        if st.session_state.pop("last_error", None):
+            st.error("An error occurred during generation. Please try again.")
+        reclaimed = st.session_state.pop("last_cancelled", None)
+        if reclaimed is not None:
+            st.info(f"⏹️ Generation cancelled. Skipped {reclaimed['llm_calls_avoided']} LLM calls and "
+                    f"freed ~{reclaimed['render_cpu_seconds']:.0f}s of render time.")
+    
+    if not st.session_state.active_job_id:
+        if st.session_state.storyboard:
+            storyboard_panel(api_url)
         
-        # Code in expander for those who want to see it
-        if st.session_state.manim_code:
-            with st.expander("View Animation Code", expanded=False):
-                st.code(st.session_state.manim_code.code, language="python")
+        # Display results after generation is complete
+        if st.session_state.generation_complete and (st.session_state.video_id or st.session_state.video_path):
+            results_panel(api_url)
     
     # Footer
     st.markdown("<div class='footer'>Math Animation Studio © 2025 | Powered by AI and Mathematical Visualization</div>", unsafe_allow_html=True)
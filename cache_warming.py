@@ -0,0 +1,179 @@
+import sys
+
+# Same sqlite swap as app.py when used headless (crewai needs a recent sqlite)
+if 'sqlite3' not in sys.modules:
+    try:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    except ImportError:
+        pass
+
+import argparse
+import json
+import os
+import threading
+import time
+from pipeline import (
+    DEFAULT_API_URL,
+    get_llm,
+    get_render_function,
+    lookup_cached_generation,
+    record_generation,
+    record_outcome,
+    run_generation,
+    store_cached_generation,
+)
+from rate_limiter import PRIORITY_BATCH
+from store import get_store, new_job_id
+
+# Topics generated ahead of demand, and the budget one warming run may spend
+WARM_TOPICS_PATH = os.getenv("WARM_TOPICS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_topics.json"))
+# "startup" warms once when the app starts, "schedule" also every interval_seconds, "off" never
+CACHE_WARMING = os.getenv("CACHE_WARMING", "startup")
+
+# Session the warming jobs are recorded (and rate limited) under
+WARMING_SESSION_ID = "cache-warming"
+
+DEFAULT_WARM_CONFIG = {
+    "topics": [],
+    "budget": {"llm_cost": 2.0, "llm_tokens": 300000, "render_seconds": 1200},
+    "interval_seconds": 21600,
+}
+
+
+def load_warm_config(path=WARM_TOPICS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_WARM_CONFIG)
+    return {**DEFAULT_WARM_CONFIG, **config, "budget": {**DEFAULT_WARM_CONFIG["budget"], **config.get("budget", {})}}
+
+
+# What a warming run has spent so far, against its budget
+class WarmingBudget:
+    def __init__(self, llm_cost=None, llm_tokens=None, render_seconds=None):
+        self.limits = {"llm_cost": llm_cost, "llm_tokens": llm_tokens, "render_seconds": render_seconds}
+        self.spent = {"llm_cost": 0.0, "llm_tokens": 0, "render_seconds": 0.0}
+
+    def charge(self, result):
+        for usage in result.get("llm_usage", {}).values():
+            self.spent["llm_cost"] += usage.get("cost", 0.0)
+            self.spent["llm_tokens"] += usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        self.spent["render_seconds"] += result.get("timings", {}).get("render", 0.0)
+
+    # Name of the first limit reached, or None
+    def exhausted(self):
+        return next((name for name, limit in self.limits.items()
+                     if limit is not None and self.spent[name] >= limit), None)
+
+
+# Generate and render every warm-list topic that the topic cache cannot already serve,
+# as batch-priority LLM work so interactive sessions keep their place in the rate
+# limiter. A topic is only started while the budget lasts, so the last one may overshoot
+# by one generation. Returns {topic: "cached" | "warmed" | "failed" | "budget: <limit>"}.
+def warm_cache(topics, api_url=DEFAULT_API_URL, budget=None, api_key=None, render=None):
+    budget = budget or WarmingBudget()
+    render = render or get_render_function()
+    report = {}
+    for topic in topics:
+        if lookup_cached_generation(topic, api_url):
+            report[topic] = "cached"
+            continue
+        limit = budget.exhausted()
+        if limit:
+            report[topic] = f"budget: {limit}"
+            continue
+
+        job_id = new_job_id()
+        record_generation(job_id, WARMING_SESSION_ID, topic, "warm", api_url, "running")
+        try:
+            llm = get_llm(api_key=api_key, session_id=WARMING_SESSION_ID, priority=PRIORITY_BATCH)
+            result = run_generation(topic, llm, api_url, render=render)
+        except Exception as e:
+            record_generation(job_id, WARMING_SESSION_ID, topic, "warm", api_url, "error", error=str(e))
+            report[topic] = "failed"
+            continue
+        budget.charge(result)
+
+        response = result.get("render") or {}
+        if result["manim_code"] and (response.get("video_id") or result.get("video_path")):
+            store_cached_generation(topic, result["content"], result["manim_code"], api_url,
+                                    video_id=response.get("video_id"), video_path=result.get("video_path"))
+            record_generation(job_id, WARMING_SESSION_ID, topic, "warm", api_url, "done", result=result)
+            report[topic] = "warmed"
+        else:
+            record_generation(job_id, WARMING_SESSION_ID, topic, "warm", api_url, "failed", result=result)
+            report[topic] = "failed"
+    return report
+
+
+# One warming run of the configured warm list
+def run_warming(config=None, api_key=None, render=None):
+    config = config or load_warm_config()
+    budget = WarmingBudget(**config["budget"])
+    report = warm_cache(config["topics"], config.get("api_url") or DEFAULT_API_URL, budget, api_key, render)
+    return {"topics": report, "spent": budget.spent}
+
+
+# Record a background warming run as a "cache_warming" stage (duration, status and the
+# run's report). A run that raised also gets an error outcome, which the operations
+# page counts among the failures.
+def record_warming_run(run_id, seconds, result=None, error=None):
+    store = get_store()
+    store.record_stage(run_id, "cache_warming", seconds, status="error" if error else "done", error=error,
+                       **(result or {}))
+    if error:
+        record_outcome(store, run_id, "warm", "error", None, error)
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+# Warm the cache on a background thread, once per process: a single run for
+# "startup", a run every interval_seconds for "schedule"
+def start_cache_warming(mode=CACHE_WARMING, api_key=None):
+    global _warmer
+    with _warmer_lock:
+        if mode == "off" or _warmer is not None:
+            return
+        config = load_warm_config()
+        if not config["topics"]:
+            return
+
+        def warm():
+            while True:
+                run_id, started = new_job_id(), time.perf_counter()
+                try:
+                    result = run_warming(config, api_key)
+                except Exception as e:
+                    record_warming_run(run_id, time.perf_counter() - started, error=str(e))
+                else:
+                    record_warming_run(run_id, time.perf_counter() - started, result=result)
+                if mode != "schedule":
+                    return
+                time.sleep(config["interval_seconds"])
+
+        _warmer = threading.Thread(target=warm, name="cache-warming", daemon=True)
+        _warmer.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate and render the warm-list topics into the topic cache")
+    parser.add_argument("topics", nargs="*", help="Topics to warm (default: the warm list)")
+    parser.add_argument("--api-url", default=None)
+    args = parser.parse_args()
+
+    config = load_warm_config()
+    if args.topics:
+        config["topics"] = args.topics
+    if args.api_url:
+        config["api_url"] = args.api_url
+    started = time.perf_counter()
+    print(json.dumps(run_warming(config), indent=2))
+    print(f"Warmed in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import threading
+import time
+
+
+# A BaseException, like asyncio.CancelledError, so the broad `except Exception`
+# handlers in crewai (which retry failed tasks) and in the pipeline let it through
+class CancelledError(BaseException):
+    pass
+
+
+# Cooperative cancellation shared by every stage of one generation. Work checks the
+# token between steps; on_cancel callbacks abort work running elsewhere (e.g. a remote
+# render). Compute that cancelling saved is tallied in `reclaimed`.
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+        self.cancelled_at = None
+        self.reclaimed = {"llm_calls_avoided": 0, "render_cpu_seconds": 0.0}
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.cancelled_at = time.time()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    # Run callback on cancel (at once if already cancelled); returns a function that unregisters it
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledError(self.reason)
+
+    # Sleep that wakes up (and raises) as soon as the token is cancelled
+    def sleep(self, seconds):
+        if self._event.wait(seconds):
+            raise CancelledError(self.reason)
+
+    def add_reclaimed(self, key, amount):
+        with self._lock:
+            self.reclaimed[key] = self.reclaimed.get(key, 0) + amount
+
+
+def raise_if_cancelled(token):
+    if token is not None:
+        token.raise_if_cancelled()
@@ -0,0 +1,157 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from store import get_store
+from topics import STOP_WORDS
+
+# Successful topic -> content -> code generations, used as few-shot examples
+EXAMPLES_DIR = os.getenv("EXAMPLES_DIR", os.path.join(os.getcwd(), "example_index"))
+MAX_EXAMPLES = int(os.getenv("MAX_EXAMPLES", "500"))
+EXAMPLES_ENABLED = os.getenv("EXAMPLE_INDEX", "on") != "off"
+
+# How many examples go into a prompt, how similar they must be, and how much code each may add
+EXAMPLES_PER_PROMPT = int(os.getenv("EXAMPLES_PER_PROMPT", "2"))
+MIN_EXAMPLE_SIMILARITY = float(os.getenv("MIN_EXAMPLE_SIMILARITY", "0.2"))
+MAX_EXAMPLE_CHARS = 3000
+
+# The topic says more about relevance than the body text, so it counts more
+TOPIC_WEIGHT = 3
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOP_WORDS]
+
+
+# Offline TF-IDF index over stored examples with cosine similarity search
+class ExampleIndex:
+    def __init__(self, root=EXAMPLES_DIR, max_examples=MAX_EXAMPLES, store=None):
+        self.root = root
+        self.store = store or get_store()
+        self.max_examples = max_examples
+        self.examples_path = os.path.join(root, "examples.jsonl")
+        self.stats_path = os.path.join(root, "stats.json")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.examples = self._load()
+        self._build()
+
+    def _load(self):
+        if not os.path.exists(self.examples_path):
+            return []
+        with open(self.examples_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _terms(self, example):
+        terms = Counter(tokenize(example["content"]))
+        for token in tokenize(example["topic"]):
+            terms[token] += TOPIC_WEIGHT
+        return terms
+
+    def _build(self):
+        document_frequency = Counter()
+        term_counts = [self._terms(example) for example in self.examples]
+        for terms in term_counts:
+            document_frequency.update(terms.keys())
+        total = len(self.examples)
+        self._idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self._vectors = [self._weigh(terms) for terms in term_counts]
+
+    def _weigh(self, terms):
+        vector = {term: (1 + math.log(count)) * self._idf.get(term, 0.0) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items() if weight}
+
+    # Store a generation that rendered successfully
+    def add(self, topic, content, code):
+        example = {"topic": topic, "content": content or "", "code": code, "created": time.time()}
+        with self._lock:
+            self.examples = [e for e in self.examples if e["topic"].strip().lower() != topic.strip().lower()]
+            self.examples.append(example)
+            self.examples = self.examples[-self.max_examples:]
+            with open(self.examples_path, "w", encoding="utf-8") as f:
+                for item in self.examples:
+                    f.write(json.dumps(item) + "\n")
+            self._build()
+
+    # Nearest stored examples for a topic (and optional content), best first
+    def search(self, topic, content="", limit=EXAMPLES_PER_PROMPT, min_similarity=MIN_EXAMPLE_SIMILARITY):
+        with self._lock:
+            if not self.examples:
+                return []
+            query = self._weigh(self._terms({"topic": topic, "content": content}))
+            scored = []
+            for example, vector in zip(self.examples, self._vectors):
+                score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                if score >= min_similarity:
+                    scored.append((score, example))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [dict(example, similarity=score) for score, example in scored[:limit]]
+
+    # Outcome counters, split by whether examples were injected, to see if they help
+    def record_outcome(self, used_examples, rendered, llm_calls):
+        key = "with_examples" if used_examples else "without_examples"
+        with self._lock:
+            stats = self._read_stats()
+            bucket = stats.setdefault(key, {"attempts": 0, "rendered": 0, "llm_calls": 0})
+            bucket["attempts"] += 1
+            bucket["rendered"] += int(bool(rendered))
+            bucket["llm_calls"] += llm_calls
+            self.store.cache_put("example_stats", "outcomes", stats)
+
+    # Counters live in the shared store; stats.json is read once if it predates it
+    def _read_stats(self):
+        stats = self.store.cache_get("example_stats", "outcomes")
+        if stats is not None:
+            return stats
+        if not os.path.exists(self.stats_path):
+            return {}
+        with open(self.stats_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    # First-pass render success rate and LLM calls per delivered video
+    def report(self):
+        with self._lock:
+            stats = self._read_stats()
+        report = {}
+        for key, bucket in stats.items():
+            report[key] = {
+                "attempts": bucket["attempts"],
+                "first_pass_success_rate": bucket["rendered"] / bucket["attempts"] if bucket["attempts"] else 0.0,
+                "llm_calls_per_video": bucket["llm_calls"] / bucket["rendered"] if bucket["rendered"] else None,
+            }
+        return report
+
+
+# Prompt block with the examples' code, trimmed so prompts stay bounded
+def format_examples(examples):
+    if not examples:
+        return ""
+    blocks = ["REFERENCE EXAMPLES (previously rendered successfully - reuse their patterns, not their content):"]
+    for example in examples:
+        code = example["code"]
+        if len(code) > MAX_EXAMPLE_CHARS:
+            code = code[:MAX_EXAMPLE_CHARS] + "\n# ... (truncated)"
+        blocks.append(f"Topic: {example['topic']}\n```python\n{code}\n```")
+    return "\n\n".join(blocks)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_example_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ExampleIndex()
+        return _index
+
+
+if __name__ == "__main__":
+    print(json.dumps(get_example_index().report(), indent=2))
@@ -0,0 +1,162 @@
+import threading
+import time
+from cancellation import CancelToken, CancelledError
+
+# Progress steps shown in the UI, in order
+STEPS = ("content", "animation", "rendering")
+
+# Finished jobs are forgotten after this long (the UI collects them within seconds)
+FINISHED_JOB_TTL = 15 * 60
+
+# A running job is cancelled once the browser session that started it has been gone
+# from the Streamlit runtime (tab closed) this long; the grace covers reconnects.
+# Switching to another page or a throttled background tab keep the session.
+ABANDONED_JOB_SECONDS = 120
+# Jobs started without a session to watch are cancelled only after this long unpolled
+UNPOLLED_JOB_SECONDS = 15 * 60
+# How often the watchdog looks for abandoned jobs
+WATCHDOG_SECONDS = 30
+
+
+# A generation running on a background thread. The worker reports progress through
+# set()/ramp(); the UI polls view() and never blocks on the work itself. cancel()
+# trips the job's cancel_token, which the pipeline checks between LLM calls and stages.
+# `alive()` says whether the session that started the job is still connected.
+class GenerationJob:
+    def __init__(self, job_id, alive=None):
+        self.id = job_id
+        self.alive = alive
+        self.gone_since = None
+        self.status = "running"
+        self.result = None
+        self.error = None
+        self.finished = None
+        self.cancel_token = CancelToken()
+        self.last_polled = time.monotonic()
+        self._lock = threading.Lock()
+        self._steps = {step: {"progress": 0.0, "message": "", "ramp": None} for step in STEPS}
+
+    @property
+    def done(self):
+        return self.status != "running"
+
+    def set(self, step, progress=None, message=None):
+        with self._lock:
+            state = self._steps[step]
+            if progress is not None:
+                state["progress"] = progress
+                state["ramp"] = None
+            if message is not None:
+                state["message"] = message
+
+    # Let the shown progress rise steadily to `to` over `seconds` while the real work runs,
+    # switching to each (offset, message) as its time comes
+    def ramp(self, step, to, seconds, messages=()):
+        with self._lock:
+            state = self._steps[step]
+            state["ramp"] = (time.monotonic(), state["progress"], to, seconds, list(messages))
+
+    # Progress (0-1) and message of every step as of now
+    def view(self):
+        now = time.monotonic()
+        self.last_polled = now
+        with self._lock:
+            view = {}
+            for step, state in self._steps.items():
+                progress, message = state["progress"], state["message"]
+                if state["ramp"]:
+                    started, start, to, seconds, messages = state["ramp"]
+                    elapsed = now - started
+                    progress = start + (to - start) * min(1.0, elapsed / seconds if seconds else 1.0)
+                    for offset, text in messages:
+                        if elapsed >= offset:
+                            message = text
+                view[step] = {"progress": progress, "message": message}
+            return view
+
+    def cancel(self, reason="cancelled"):
+        self.cancel_token.cancel(reason)
+
+    # Whether the page that started this running job is gone for good. A recent poll
+    # (from any session) keeps the job; otherwise its session must have been gone for
+    # ABANDONED_JOB_SECONDS, or, with no session to watch, UNPOLLED_JOB_SECONDS unpolled.
+    def abandoned(self, now):
+        if self.done or now - self.last_polled <= ABANDONED_JOB_SECONDS:
+            return False
+        if self.alive is None:
+            return now - self.last_polled > UNPOLLED_JOB_SECONDS
+        try:
+            connected = self.alive()
+        except Exception:
+            connected = True
+        if connected:
+            self.gone_since = None
+            return False
+        if self.gone_since is None:
+            self.gone_since = now
+        return now - self.gone_since > ABANDONED_JOB_SECONDS
+
+    def _finish(self, result=None, error=None, cancelled=False):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.finished = time.monotonic()
+            self.status = "cancelled" if cancelled else "error" if error else "done"
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_watchdog = None
+
+
+# Run work(job) on a daemon thread; its return value becomes job.result.
+# `alive` (see GenerationJob) lets the watchdog cancel the job once its page is closed.
+def start_job(job_id, work, alive=None):
+    job = GenerationJob(job_id, alive)
+    with _jobs_lock:
+        now = time.monotonic()
+        for stale in [key for key, other in _jobs.items() if other.finished and now - other.finished > FINISHED_JOB_TTL]:
+            del _jobs[stale]
+        _jobs[job_id] = job
+        _start_watchdog()
+
+    def run():
+        try:
+            job._finish(result=work(job))
+        except CancelledError:
+            job._finish(error=job.cancel_token.reason, cancelled=True)
+        except Exception as e:
+            job._finish(error=str(e) or type(e).__name__)
+
+    threading.Thread(target=run, name=f"generation-{job_id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+# Cancel running jobs whose page is gone; returns them
+def cancel_abandoned(now=None):
+    now = time.monotonic() if now is None else now
+    with _jobs_lock:
+        abandoned = [job for job in _jobs.values() if job.abandoned(now)]
+    for job in abandoned:
+        job.cancel("abandoned")
+    return abandoned
+
+
+# Check for abandoned jobs in the background (caller holds _jobs_lock)
+def _start_watchdog():
+    global _watchdog
+    if _watchdog is not None:
+        return
+
+    def watch():
+        while True:
+            time.sleep(WATCHDOG_SECONDS)
+            cancel_abandoned()
+
+    _watchdog = threading.Thread(target=watch, name="generation-watchdog", daemon=True)
+    _watchdog.start()
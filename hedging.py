@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from cancellation import CancelToken, CancelledError
+
+# Issue a duplicate LLM request once a call runs longer than this percentile of
+# recent calls to the same model and agent ("off" disables hedging)
+LLM_HEDGE = os.getenv("LLM_HEDGE", "on") != "off"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Calls are not hedged until this many were observed: without a tail to compare
+# against, a long but normal call would be paid for twice
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 500
+
+# How often a waiting race checks the caller's cancel token
+CANCEL_POLL_SECONDS = 0.5
+
+
+# A task ran past its deadline; the message names the task
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Recent call latencies of one model serving one agent, shared by every LLM instance doing so
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    @property
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    # Percentile of the recent samples, or None before the first one
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    # Seconds after which to hedge a call, or None (no hedge) until there are min_samples
+    def hedge_after(self, pct=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES):
+        if self.count < min_samples:
+            return None
+        return self.percentile(pct)
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(key):
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker()
+        return _trackers[key]
+
+
+# Deadlines of the tasks an LLM serves. crewai sends every call of a task with the
+# same system and task prompt, so the first two messages identify the task; its
+# deadline starts with its first call.
+class TaskDeadlines:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._started = {}
+
+    def deadline_for(self, messages):
+        if not self.seconds:
+            return None
+        head = messages[:2] if isinstance(messages, list) else messages
+        key = hashlib.sha256(json.dumps(head, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            for stale in [k for k, started in self._started.items() if now - started > 2 * self.seconds]:
+                del self._started[stale]
+            started = self._started.setdefault(key, now)
+        return started + self.seconds
+
+
+# Run attempt(token) and, if it is still running after hedge_after seconds, hedge(token)
+# as well. The first successful result wins and the other attempt's token is cancelled
+# (an HTTP request in flight cannot be aborted; its answer is dropped). Returns
+# (result, hedged, hedge_won). Raises DeadlineExceeded past `deadline` (a monotonic
+# time), CancelledError if cancel_token is cancelled, or the error of the last failure.
+def race(attempt, hedge=None, hedge_after=None, deadline=None, cancel_token=None, label="LLM call"):
+    results = queue.Queue()
+    tokens = []
+
+    def launch(name, function):
+        token = CancelToken()
+        tokens.append(token)
+
+        def run():
+            try:
+                results.put((name, True, function(token)))
+            except BaseException as e:
+                results.put((name, False, e))
+
+        threading.Thread(target=run, name=f"hedge-{name}", daemon=True).start()
+
+    def abandon(reason):
+        for token in tokens:
+            token.cancel(reason)
+
+    started = time.monotonic()
+    launch("primary", attempt)
+    hedged = False
+    failures = 0
+    while True:
+        now = time.monotonic()
+        waits = [CANCEL_POLL_SECONDS if cancel_token is not None else None]
+        if deadline is not None:
+            if now >= deadline:
+                abandon("deadline")
+                raise DeadlineExceeded(f"{label} exceeded its deadline")
+            waits.append(deadline - now)
+        if hedge and not hedged and hedge_after is not None:
+            waits.append(max(0.0, started + hedge_after - now))
+        waits = [wait for wait in waits if wait is not None]
+        try:
+            name, ok, value = results.get(timeout=min(waits) if waits else None)
+        except queue.Empty:
+            if cancel_token is not None and cancel_token.cancelled:
+                abandon("cancelled")
+                raise CancelledError(cancel_token.reason)
+            if hedge and not hedged and hedge_after is not None and time.monotonic() - started >= hedge_after:
+                hedged = True
+                launch("hedge", hedge)
+            continue
+        if ok:
+            abandon("lost the race")
+            return value, hedged, name == "hedge"
+        # A failure only ends the race once no attempt is left running
+        failures += 1
+        if failures >= len(tokens):
+            abandon("failed")
+            raise value
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+# Per-agent LLM settings, grouped into named tiers (see llm_config.json)
+LLM_CONFIG_PATH = os.getenv("LLM_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_config.json"))
+# Tier to run, overriding the config file's "tier"
+LLM_TIER = os.getenv("LLM_TIER")
+
+AGENTS = ("content", "code")
+
+# Keys of a tier entry passed on to the LLM: "timeout" is the budget of one call and
+# "deadline" that of a whole task, in seconds; "hedge_model" answers hedged calls
+LLM_SETTINGS = ("model", "temperature", "max_tokens", "max_completion_tokens", "timeout", "deadline", "hedge_model")
+
+# Used when there is no config file: the single model the pipeline always ran
+DEFAULT_AGENT_SETTINGS = {
+    "model": "anthropic/claude-3-7-sonnet-20250219",
+    "temperature": 0.2,
+    "max_tokens": 10000,
+    "max_completion_tokens": 20000,
+}
+
+
+def load_llm_config(path=LLM_CONFIG_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"tier": "default", "tiers": {"default": {agent: DEFAULT_AGENT_SETTINGS for agent in AGENTS}}}
+
+
+# (tier name, {agent: LLM kwargs}) for the requested, env or configured tier
+def tier_settings(tier=None, config=None):
+    config = config or load_llm_config()
+    tier = tier or LLM_TIER or config.get("tier") or next(iter(config["tiers"]))
+    if tier not in config["tiers"]:
+        raise ValueError(f"Unknown LLM tier '{tier}' (configured: {', '.join(config['tiers'])})")
+    agents = config["tiers"][tier]
+    return tier, {
+        agent: {key: value for key, value in agents.get(agent, DEFAULT_AGENT_SETTINGS).items() if key in LLM_SETTINGS}
+        for agent in AGENTS
+    }
+
+
+# Most output tokens a model can return ("max_output_tokens" in the config), or None if unknown
+def output_token_limit(model, config=None):
+    config = config or load_llm_config()
+    return config.get("max_output_tokens", {}).get(model)
+
+
+# Dollar cost of a call volume at the configured per-million-token prices (0 if unpriced)
+def token_cost(model, prompt_tokens, completion_tokens, config=None):
+    config = config or load_llm_config()
+    prices = config.get("prices_per_million_tokens", {}).get(model)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices["input"] + completion_tokens * prices["output"]) / 1_000_000
+
+
+# Calls, seconds and (estimated) tokens an LLM instance has used; safe across threads
+class UsageMeter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record_hedge(self, won):
+        with self._lock:
+            self.hedges += 1
+            self.hedge_wins += bool(won)
+
+    # calls=0 adds time (or tokens) to calls already counted
+    def record(self, seconds, prompt_tokens, completion_tokens, calls=1):
+        with self._lock:
+            self.calls += calls
+            self.seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {"calls": self.calls, "seconds": self.seconds,
+                    "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                    "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+
+# Nearest-rank percentile of a list of numbers
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+# Latency, cost and render success per tier from the "llm_<agent>" stages of recorded jobs
+def tier_report(store, since=0.0):
+    tiers = {}
+    for row in store.stage_records("llm_%", since):
+        details = json.loads(row["details"] or "{}")
+        tier = tiers.setdefault(details.get("tier") or "unknown", {"jobs": {}, "agents": {}})
+        tier["jobs"].setdefault(row["job_id"], {"status": row["status"], "cost": 0.0, "tokens": 0})
+        job = tier["jobs"][row["job_id"]]
+        job["cost"] += details.get("cost", 0.0)
+        job["tokens"] += details.get("prompt_tokens", 0) + details.get("completion_tokens", 0)
+        agent = tier["agents"].setdefault(row["stage"][len("llm_"):], {"models": set(), "seconds": []})
+        agent["models"].add(details.get("model", "?"))
+        agent["seconds"].append(row["duration"] or 0.0)
+
+    report = {}
+    for name, tier in tiers.items():
+        jobs = list(tier["jobs"].values())
+        # Only finished full runs count towards render success (not storyboards or cancellations)
+        finished = [job for job in jobs if job["status"] in ("done", "failed", "error")]
+        report[name] = {
+            "jobs": len(jobs),
+            "render_success": sum(job["status"] == "done" for job in finished) / len(finished) if finished else None,
+            "cost_per_job": sum(job["cost"] for job in jobs) / len(jobs),
+            "tokens_per_job": sum(job["tokens"] for job in jobs) / len(jobs),
+            "agents": {
+                agent: {"models": sorted(stats["models"]), "p50": percentile(stats["seconds"], 50),
+                        "p95": percentile(stats["seconds"], 95)}
+                for agent, stats in tier["agents"].items()
+            },
+        }
+    return report
+
+
+def print_tier_report(report):
+    if not report:
+        print("No generations with LLM usage recorded yet")
+        return
+    print(f"{'tier':<12}{'jobs':>6}{'success':>9}{'$/job':>9}{'tokens/job':>12}  agent latency p50/p95 (model)")
+    for name, tier in sorted(report.items()):
+        success = f"{tier['render_success']:.0%}" if tier["render_success"] is not None else "-"
+        agents = "; ".join(
+            f"{agent} {stats['p50']:.1f}s/{stats['p95']:.1f}s ({', '.join(model.split('/')[-1] for model in stats['models'])})"
+            for agent, stats in sorted(tier["agents"].items())
+        )
+        print(f"{name:<12}{tier['jobs']:>6}{success:>9}{tier['cost_per_job']:>9.4f}{tier['tokens_per_job']:>12.0f}  {agents}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLM tiers by latency, cost and render success")
+    parser.add_argument("--days", type=float, default=30, help="Only jobs from the last N days")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    from store import get_store
+    report = tier_report(get_store(), since=time.time() - args.days * 86400)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_tier_report(report)
+
+
+if __name__ == "__main__":
+    main()
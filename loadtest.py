@@ -0,0 +1,205 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Measure generation, not the caches (identical fixtures would always hit them)
+os.environ.setdefault("SECTION_CACHE", "off")
+os.environ.setdefault("EXAMPLE_INDEX", "off")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from pipeline import run_generation
+from rate_limiter import (
+    REQUESTS_PER_MINUTE,
+    TOKENS_PER_MINUTE,
+    configure_rate_limiter,
+    estimate_message_tokens,
+    get_rate_limiter,
+)
+from replay import FixtureStore, ReplayLLM, ReplayRenderer, lognormal_latency
+
+SYNTHETIC_CONTENT = """Thought: I now can give a great answer
+Final Answer: {"topic": "Pythagorean Theorem", "sections": [
+{"id": "introduction", "title": "Introduction",
+ "summary": "The Pythagorean theorem relates the sides of a right triangle.", "formulas": ["a^2 + b^2 = c^2"],
+ "visual_hints": ["Right triangle with squares drawn on each side"]},
+{"id": "worked-example", "title": "Worked Example", "summary": "Find the hypotenuse for legs 3 and 4.",
+ "steps": [{"text": "Square the legs", "math": "3^2 + 4^2 = 25"}, {"text": "Take the root", "math": "c = 5"}]}]}"""
+
+SYNTHETIC_CODE = """Thought: I now can give a great answer
+Final Answer: ```python
+from manim import *
+import numpy as np
+
+class MainScene(Scene):
+    def construct(self):
+        title = Text("Pythagorean Theorem", font_size=48)
+        self.play(Write(title))
+        self.wait(1)
+        formula = MathTex("a^2 + b^2 = c^2").next_to(title, DOWN, buff=0.5)
+        self.play(Write(formula))
+        self.wait(2)
+```"""
+
+
+# ReplayLLM that still queues on the shared rate limiter, like the live LLM does
+class LimitedReplayLLM(ReplayLLM):
+    def __init__(self, store, latency=None, session_id="default", completion_tokens=10000, **kwargs):
+        super().__init__(store, latency=latency, **kwargs)
+        self.session_id = session_id
+        self.completion_tokens = completion_tokens
+
+    def call(self, messages, *args, **kwargs):
+        estimated_tokens = estimate_message_tokens(messages) + self.completion_tokens
+        self.queue_wait += get_rate_limiter().acquire(estimated_tokens, self.session_id)
+        return super().call(messages, *args, **kwargs)
+
+
+# Fixtures used when no recording is available: one content call, one code call, one render
+def write_synthetic_fixtures(store):
+    store.save_llm("content", SYNTHETIC_CONTENT, 20.0, "synthetic")
+    store.save_llm("code", SYNTHETIC_CODE, 35.0, "synthetic")
+    store.save_llm("code", SYNTHETIC_CODE, 30.0, "synthetic")
+    store.save_render("", "MainScene", {"video_id": "synthetic", "scenes_rendered": ["MainScene"]}, 45.0)
+
+
+# Nearest-rank percentile of a list of numbers
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+# Run `sessions` concurrent simulated users, each generating `runs` videos
+def run_level(store, sessions, runs, llm_latency, render_latency, topic, hedge=False):
+    results = []
+    errors = []
+    lock = threading.Lock()
+
+    def session_worker():
+        session_id = str(uuid.uuid4())
+        for _ in range(runs):
+            llm = LimitedReplayLLM(store, latency=llm_latency, session_id=session_id, hedge=hedge)
+            renderer = ReplayRenderer(store, latency=render_latency)
+            try:
+                result = run_generation(topic, llm, "replay://", render=renderer.render)
+                with lock:
+                    results.append(result)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session_worker, daemon=True) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {
+        "sessions": sessions,
+        "hedge": hedge,
+        "completed": len(results),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed": elapsed,
+        "throughput_per_min": len(results) / elapsed * 60 if elapsed else 0.0,
+        "memory_per_session_kb": (peak - baseline) / 1024.0 / sessions,
+        "stages": {},
+    }
+    stages = ["llm", "extract", "render", "total"]
+    for stage in stages:
+        values = [r["timings"][stage] for r in results if stage in r["timings"]]
+        report["stages"][stage] = {pct: percentile(values, pct) for pct in (50, 95, 99)}
+    waits = [r["queue_wait"] for r in results]
+    report["stages"]["queue_wait"] = {pct: percentile(waits, pct) for pct in (50, 95, 99)}
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['sessions']} sessions{' (hedged)' if report['hedge'] else ''}: "
+          f"{report['completed']} done, {report['errors']} errors, "
+          f"{report['throughput_per_min']:.2f} videos/min, "
+          f"{report['memory_per_session_kb']:.0f} KiB/session")
+    for error in report["error_samples"]:
+        print(f"  error: {error[:200]}")
+    print(f"{'stage':<12}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<12}{values[50]:>9.2f}s{values[95]:>9.2f}s{values[99]:>9.2f}s")
+
+
+# Double the session count until throughput stops growing or p95 breaks the SLO
+def find_saturation(store, args):
+    reports = []
+    sessions = args.start
+    while sessions <= args.max_sessions:
+        report = run_level(store, sessions, args.runs, args.llm_latency, args.render_latency, args.topic,
+                           args.hedging == "on")
+        print_report(report)
+        reports.append(report)
+        if len(reports) > 1:
+            previous = reports[-2]
+            gain = report["throughput_per_min"] / max(previous["throughput_per_min"], 1e-9)
+            if gain < 1.0 + args.min_gain or report["stages"]["total"][95] > args.slo:
+                print(f"\nSaturation at ~{previous['sessions']} sessions "
+                      f"({previous['throughput_per_min']:.2f} videos/min)")
+                return reports
+        sessions *= 2
+    print(f"\nNo saturation up to {args.max_sessions} sessions")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test with stubbed LLM and render backends")
+    parser.add_argument("--fixtures", default=None, help="Recorded fixture dir (synthetic fixtures if omitted)")
+    parser.add_argument("--topic", default="Pythagorean Theorem")
+    parser.add_argument("--sessions", type=int, default=None, help="Run one level instead of scaling")
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=2, help="Videos generated per session")
+    parser.add_argument("--llm-median", type=float, default=20.0, help="Median seconds per LLM call")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="Lognormal spread of LLM latency (tail weight)")
+    parser.add_argument("--hedging", choices=("off", "on", "compare"), default="off",
+                        help="Hedge slow LLM calls; 'compare' runs the level without and then with hedging")
+    parser.add_argument("--render-median", type=float, default=45.0, help="Median seconds per render")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="Multiply all stub latencies")
+    parser.add_argument("--slo", type=float, default=180.0, help="p95 end-to-end limit in (scaled) seconds")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Throughput gain below this means saturated")
+    args = parser.parse_args()
+
+    args.llm_latency = lognormal_latency(args.llm_median * args.time_scale, args.llm_sigma)
+    args.render_latency = lognormal_latency(args.render_median * args.time_scale)
+    args.slo *= args.time_scale
+    # Scale the API limits with time so the limiter saturates where it would in real time
+    configure_rate_limiter(REQUESTS_PER_MINUTE / args.time_scale, TOKENS_PER_MINUTE / args.time_scale)
+
+    if args.fixtures:
+        store = FixtureStore(args.fixtures)
+    else:
+        store = FixtureStore(os.path.join(tempfile.mkdtemp(prefix="loadtest_"), "fixtures"))
+        write_synthetic_fixtures(store)
+
+    if args.sessions and args.hedging == "compare":
+        # The unhedged run also warms up the latency percentiles hedging relies on
+        for hedge in (False, True):
+            print_report(run_level(store, args.sessions, args.runs, args.llm_latency, args.render_latency,
+                                   args.topic, hedge))
+    elif args.sessions:
+        print_report(run_level(store, args.sessions, args.runs, args.llm_latency, args.render_latency, args.topic,
+                               args.hedging == "on"))
+    else:
+        find_saturation(store, args)
+
+
+if __name__ == "__main__":
+    main()
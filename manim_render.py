@@ -0,0 +1,324 @@
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from partial_cache import CacheHitCollector, get_partial_cache
+from render_sandbox import SandboxLimits, run_sandboxed, spawn_sandboxed
+from tex_preflight import TEX_CACHE_DIR
+
+# Where finished videos are kept
+RENDER_OUTPUT_DIR = os.getenv("RENDER_OUTPUT_DIR", os.path.join(os.getcwd(), "rendered_videos"))
+
+RUNNER_TEMPLATE = """
+import os
+import sys
+from manim import *
+
+# Add the temp directory to path
+sys.path.insert(0, r"{temp_dir}")
+
+# Import the scene module
+scene_module = __import__("scene_{render_id}")
+
+# Configure Manim
+config.media_dir = r"{media_dir}"
+# Compiled LaTeX is shared across jobs (and warmed by the preflight)
+config.tex_dir = r"{tex_dir}"
+config.quality = "medium_quality"
+config.frame_rate = 30
+config.pixel_height = 720
+config.pixel_width = 1280
+
+# Reuse partial movies from the persistent cache linked into this directory
+config.disable_caching = False
+config.flush_cache = False
+config.max_files_cached = -1
+config.partial_movie_dir = r"{partial_dir}"
+
+# Progress bars on stderr are parsed for percent complete
+config.progress_bar = "display"
+
+# Run the scene
+scene = scene_module.{scene_name}()
+scene.render()
+"""
+
+# Storyboard: run the scene at low resolution with animations skipped to their end
+# state and no movie written, saving the frame after every self.play as a PNG
+STORYBOARD_RUNNER_TEMPLATE = """
+import os
+import sys
+from manim import *
+
+sys.path.insert(0, r"{temp_dir}")
+scene_module = __import__("scene_{render_id}")
+
+config.media_dir = r"{media_dir}"
+config.tex_dir = r"{tex_dir}"
+config.pixel_height = 480
+config.pixel_width = 854
+config.write_to_movie = False
+config.skip_animations = True
+config.disable_caching = True
+
+frame_dir = r"{frame_dir}"
+frame_count = 0
+original_play = Scene.play
+
+def storyboard_play(self, *args, **kwargs):
+    global frame_count
+    original_play(self, *args, **kwargs)
+    if frame_count < {max_frames}:
+        self.renderer.update_frame(self)
+        self.renderer.get_image().save(os.path.join(frame_dir, f"frame_{{frame_count:03d}}.png"))
+    frame_count += 1
+
+Scene.play = storyboard_play
+scene = scene_module.{scene_name}()
+scene.render()
+"""
+
+# Frames kept per storyboard, and how long a storyboard may take
+MAX_STORYBOARD_FRAMES = 60
+STORYBOARD_TIMEOUT = float(os.getenv("STORYBOARD_TIMEOUT", "120"))
+
+
+# Interpreter that imports Manim before it has any work, then runs the one runner script
+# whose path arrives on stdin. Each process serves a single job, since Manim's config is global.
+WARM_RUNNER_STUB = """
+import os
+import sys
+import manim
+
+path = sys.stdin.readline().strip()
+if path:
+    os.chdir(os.path.dirname(path))
+    sys.argv = [path]
+    with open(path, encoding="utf-8") as f:
+        code = compile(f.read(), path, "exec")
+    exec(code, {"__name__": "__main__", "__file__": path})
+"""
+
+# Idle pre-started render processes kept by a warm pool
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "2"))
+
+
+# Environment of every render process: a wide console so Manim's log lines (and cache
+# hashes) are not wrapped
+def render_env():
+    return {**os.environ, "COLUMNS": "400"}
+
+
+# Render processes started ahead of time with Manim already imported, so a job skips the
+# interpreter and import start-up. A taken process is replaced in the background.
+class WarmProcessPool:
+    def __init__(self, size=WARM_POOL_SIZE, limits=None):
+        self.size = size
+        self.limits = limits or SandboxLimits()
+        self._lock = threading.Lock()
+        self._idle = []
+        self._starting = 0
+        self.hits = 0
+        self.misses = 0
+        self._refill()
+
+    def _refill(self):
+        with self._lock:
+            missing = self.size - len(self._idle) - self._starting
+            self._starting += max(0, missing)
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._spawn, name="warm-render-spawn", daemon=True).start()
+
+    def _spawn(self):
+        try:
+            process = spawn_sandboxed([sys.executable, "-c", WARM_RUNNER_STUB], env=render_env(), limits=self.limits,
+                                      stdin=True)
+        except OSError:
+            process = None
+        with self._lock:
+            self._starting -= 1
+            if process:
+                self._idle.append(process)
+
+    # A live idle process (None if there is none yet); the pool refills itself behind it
+    def take(self):
+        with self._lock:
+            process = None
+            while self._idle and process is None:
+                candidate = self._idle.pop(0)
+                if candidate.poll() is None:
+                    process = candidate
+                else:
+                    candidate.wait()
+            if process:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._refill()
+        return process
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "hits": self.hits, "misses": self.misses}
+
+
+# Start a warm process on the runner script; None if it died in the meantime
+def _start_warm(process, runner_file):
+    try:
+        process.stdin.write(runner_file.encode("utf-8") + b"\n")
+        process.stdin.close()
+        return process
+    except OSError:
+        process.kill()
+        process.wait()
+        return None
+
+
+# Find the newest mp4 Manim produced under media_dir
+def find_video_file(media_dir, render_id):
+    possible_locations = [
+        os.path.join(media_dir, "videos", f"scene_{render_id}", "1080p60"),
+        os.path.join(media_dir, "videos", f"scene_{render_id}", "720p30"),
+        os.path.join(media_dir, "videos", f"scene_{render_id}", "480p15"),
+        os.path.join(media_dir, "videos", f"scene_{render_id}"),
+        os.path.join(media_dir, "videos"),
+    ]
+    for location in possible_locations:
+        if os.path.exists(location):
+            video_files = glob.glob(os.path.join(location, "*.mp4"))
+            if video_files:
+                return max(video_files, key=os.path.getmtime)
+
+    video_file = None
+    for root, _, files in os.walk(media_dir):
+        # Partial movie files are single animations, not the scene
+        if "partial_movie_files" in root:
+            continue
+        for file in files:
+            if file.endswith(".mp4"):
+                video_path = os.path.join(root, file)
+                if not video_file or os.path.getmtime(video_path) > os.path.getmtime(video_file):
+                    video_file = video_path
+    return video_file
+
+
+# Render Manim code in a sandboxed subprocess and copy the result into output_dir.
+# Manim's output is fed to `progress` (a RenderProgress) as it is produced. With a
+# warm_pool the render runs in one of its pre-started processes (and under its limits).
+# Returns {"success": True, "video_id", "video_path"} or {"success": False, "error", "violation"}.
+def render_manim_locally(code, scene_name="MainScene", output_dir=RENDER_OUTPUT_DIR, timeout=None, limits=None,
+                         cancel_event=None, progress=None, warm_pool=None):
+    render_id = str(uuid.uuid4())[:8]
+    scene_name = scene_name or "MainScene"
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            media_dir = os.path.join(temp_dir, "media")
+            os.makedirs(media_dir, exist_ok=True)
+            os.makedirs(TEX_CACHE_DIR, exist_ok=True)
+
+            scene_file = os.path.join(temp_dir, f"scene_{render_id}.py")
+            with open(scene_file, "w", encoding="utf-8") as f:
+                f.write(code)
+
+            # Link cached partial movies in so only changed animations are rendered
+            partial_cache = get_partial_cache()
+            partial_dir = os.path.join(temp_dir, "partial_movies")
+            partial_cache.populate(partial_dir)
+
+            runner_file = os.path.join(temp_dir, f"runner_{render_id}.py")
+            with open(runner_file, "w", encoding="utf-8") as f:
+                f.write(RUNNER_TEMPLATE.format(
+                    temp_dir=temp_dir, render_id=render_id, media_dir=media_dir,
+                    scene_name=scene_name, partial_dir=partial_dir, tex_dir=TEX_CACHE_DIR
+                ))
+
+            warm = warm_pool.take() if warm_pool else None
+            if warm:
+                warm = _start_warm(warm, runner_file)
+            # Only the tail of the output is kept, so cache hits are picked up as it streams
+            cache_hits = CacheHitCollector()
+
+            def on_output(stream, text):
+                cache_hits.feed(stream, text)
+                if progress:
+                    progress.feed(text)
+
+            process = run_sandboxed(
+                [sys.executable, runner_file],
+                cwd=temp_dir,
+                timeout=timeout,
+                env=render_env(),
+                limits=warm_pool.limits if warm else limits,
+                cancel_event=cancel_event,
+                on_output=on_output,
+                process=warm
+            )
+
+            # Keep new partial movies even if the render failed later on
+            partials_added = partial_cache.harvest(partial_dir)
+            if process["message"]:
+                return {"success": False, "error": process["message"], "violation": process["violation"]}
+            reused = cache_hits.hashes
+            partial_cache.touch(reused)
+
+            video_file = find_video_file(media_dir, render_id)
+            if not video_file:
+                return {"success": False, "error": process["stderr"][-2000:] or "No video file was produced by Manim",
+                        "violation": process["violation"] or "error"}
+
+            os.makedirs(output_dir, exist_ok=True)
+            video_id = uuid.uuid4().hex
+            output_path = os.path.join(output_dir, f"{video_id}.mp4")
+            shutil.copy2(video_file, output_path)
+            return {
+                "success": True,
+                "video_id": video_id,
+                "video_path": output_path,
+                "partials_reused": len(reused),
+                "partials_added": partials_added,
+            }
+
+    except Exception as e:
+        return {"success": False, "error": str(e), "violation": "error"}
+
+
+# Storyboard of a scene: one PNG per self.play, stored under output_dir/storyboards/<id>/.
+# Frames saved before an error are kept, so a scene that breaks half way still shows
+# how far it got. Returns {"success", "storyboard_id", "frames", "error"?, "violation"?}.
+def render_storyboard_locally(code, scene_name="MainScene", output_dir=RENDER_OUTPUT_DIR,
+                              timeout=STORYBOARD_TIMEOUT, limits=None, cancel_event=None):
+    render_id = str(uuid.uuid4())[:8]
+    storyboard_id = uuid.uuid4().hex
+    frame_dir = os.path.join(output_dir, "storyboards", storyboard_id)
+    try:
+        os.makedirs(frame_dir, exist_ok=True)
+        os.makedirs(TEX_CACHE_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, f"scene_{render_id}.py"), "w", encoding="utf-8") as f:
+                f.write(code)
+            runner_file = os.path.join(temp_dir, f"storyboard_{render_id}.py")
+            with open(runner_file, "w", encoding="utf-8") as f:
+                f.write(STORYBOARD_RUNNER_TEMPLATE.format(
+                    temp_dir=temp_dir, render_id=render_id, media_dir=os.path.join(temp_dir, "media"),
+                    frame_dir=frame_dir, scene_name=scene_name or "MainScene", max_frames=MAX_STORYBOARD_FRAMES,
+                    tex_dir=TEX_CACHE_DIR
+                ))
+            process = run_sandboxed(
+                [sys.executable, runner_file],
+                cwd=temp_dir,
+                timeout=timeout,
+                env=render_env(),
+                limits=limits,
+                cancel_event=cancel_event
+            )
+        result = {"success": not process["violation"], "storyboard_id": storyboard_id,
+                  "frames": sorted(name for name in os.listdir(frame_dir) if name.endswith(".png"))}
+        if process["violation"]:
+            result["error"] = process["message"] or process["stderr"][-2000:]
+            result["violation"] = process["violation"]
+        return result
+    except Exception as e:
+        return {"success": False, "storyboard_id": storyboard_id, "frames": [], "error": str(e), "violation": "error"}
@@ -0,0 +1,221 @@
+import argparse
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Rollups are kept per hour; the operations page groups them further
+ROLLUP_BUCKET_SECONDS = 3600
+# Stage rows folded into the rollups per pass
+ROLLUP_BATCH_ROWS = 100000
+ROLLUP_NAME = "ops"
+
+# Latency histograms: log-spaced bins, each 25% wider than the last, starting at 10ms.
+# Percentiles read from them are within one bin (25%) of the exact value.
+HISTOGRAM_BASE = 0.01
+HISTOGRAM_GROWTH = 1.25
+
+# Stages without a meaningful duration
+NON_LATENCY_STAGES = {"outcome", "cancelled"}
+
+_refresh_lock = threading.Lock()
+
+
+def histogram_bin(value):
+    if value <= HISTOGRAM_BASE:
+        return 0
+    return int(math.log(value / HISTOGRAM_BASE, HISTOGRAM_GROWTH)) + 1
+
+
+def bin_upper_bound(index):
+    return HISTOGRAM_BASE * HISTOGRAM_GROWTH ** index
+
+
+# Percentile of a {bin: count} histogram, as the upper bound of the bin it falls in
+def histogram_percentile(histogram, pct):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * total))
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return bin_upper_bound(index)
+    return bin_upper_bound(max(histogram))
+
+
+# Aggregates of one metric in one bucket: how often it was seen, the sum of its
+# values and, for latencies, their histogram
+class Rollup:
+    def __init__(self, count=0, total=0.0, histogram=None):
+        self.count = count
+        self.total = total
+        self.histogram = Counter(histogram or {})
+
+    def add(self, value=0.0, count=1, histogram=False):
+        self.count += count
+        self.total += value
+        if histogram:
+            self.histogram[histogram_bin(value)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.histogram.update(other.histogram)
+
+    @classmethod
+    def from_row(cls, row):
+        histogram = {int(index): count for index, count in json.loads(row["histogram"] or "{}").items()}
+        return cls(row["count"], row["total"], histogram)
+
+
+# Fold one stage row into the bucket's rollups. Metrics:
+#   latency:<stage>  durations (with histogram), e.g. latency:total, latency:render_queue
+#   queue_depth      render jobs queued ahead at submit (with histogram)
+#   outcome:<status> finished generations; failure:<category> why they failed
+#   llm_cost, llm_tokens  summed over finished generations
+#   cache:<name>     count = lookups, total = hits
+def _fold(rollups, row):
+    bucket = int(row["created"] // ROLLUP_BUCKET_SECONDS * ROLLUP_BUCKET_SECONDS)
+    metrics = rollups[bucket]
+    details = json.loads(row["details"]) if row["details"] else {}
+    if row["duration"] is not None and row["stage"] not in NON_LATENCY_STAGES:
+        metrics[f"latency:{row['stage']}"].add(row["duration"], histogram=True)
+    if row["stage"] == "render_queue" and details.get("depth") is not None:
+        metrics["queue_depth"].add(details["depth"], histogram=True)
+    if row["stage"] == "outcome":
+        metrics[f"outcome:{details.get('status')}"].add()
+        if details.get("category"):
+            metrics[f"failure:{details['category']}"].add()
+        metrics["llm_cost"].add(details.get("cost", 0.0))
+        metrics["llm_tokens"].add(details.get("tokens", 0))
+        for name, (hits, lookups) in (details.get("caches") or {}).items():
+            metrics[f"cache:{name}"].add(hits, count=lookups)
+
+
+# Fold stage rows recorded since the last refresh into the hourly rollups. Each pass
+# reads only new rows (by id), so this stays cheap however large the table grows.
+def refresh_rollups(store, batch_rows=ROLLUP_BATCH_ROWS):
+    with _refresh_lock:
+        last_id = store.rollup_watermark(ROLLUP_NAME)
+        while True:
+            rows = store.stages_after(last_id, batch_rows)
+            if not rows:
+                return
+            fresh = defaultdict(lambda: defaultdict(Rollup))
+            for row in rows:
+                _fold(fresh, row)
+            merged = []
+            existing = {(row["bucket"], row["metric"]): Rollup.from_row(row)
+                        for row in store.rollup_rows(min(fresh))}
+            for bucket, metrics in fresh.items():
+                for metric, rollup in metrics.items():
+                    total = existing.get((bucket, metric), Rollup())
+                    total.merge(rollup)
+                    merged.append({"bucket": bucket, "metric": metric, "count": total.count, "total": total.total,
+                                   "histogram": json.dumps(total.histogram) if total.histogram else None})
+            last_id = rows[-1]["id"]
+            store.save_rollups(ROLLUP_NAME, last_id, merged)
+            store.flush()
+            if len(rows) < batch_rows:
+                return
+
+
+# {period start: {metric: Rollup}} for rollups since a timestamp, grouped into periods
+def load_rollups(store, since=0.0, period=ROLLUP_BUCKET_SECONDS):
+    periods = defaultdict(lambda: defaultdict(Rollup))
+    for row in store.rollup_rows(int(since // ROLLUP_BUCKET_SECONDS * ROLLUP_BUCKET_SECONDS)):
+        periods[int(row["bucket"] // period * period)][row["metric"]].merge(Rollup.from_row(row))
+    return periods
+
+
+def _combined(periods):
+    combined = defaultdict(Rollup)
+    for metrics in periods.values():
+        for metric, rollup in metrics.items():
+            combined[metric].merge(rollup)
+    return combined
+
+
+def _per_video(metrics, metric):
+    videos = metrics["outcome:done"].count
+    return metrics[metric].total / videos if videos else None
+
+
+# Everything the operations page shows for a time window: totals over the window
+# and one row per period for the charts
+def ops_report(store, since=0.0, period=ROLLUP_BUCKET_SECONDS):
+    refresh_rollups(store)
+    periods = load_rollups(store, since, period)
+    combined = _combined(periods)
+
+    latency = {
+        metric[len("latency:"):]: {"count": rollup.count, "mean": rollup.total / rollup.count,
+                                   **{f"p{pct}": histogram_percentile(rollup.histogram, pct) for pct in (50, 95, 99)}}
+        for metric, rollup in sorted(combined.items()) if metric.startswith("latency:") and rollup.count
+    }
+    caches = {
+        metric[len("cache:"):]: {"hits": rollup.total, "lookups": rollup.count,
+                                 "hit_rate": rollup.total / rollup.count if rollup.count else None}
+        for metric, rollup in sorted(combined.items()) if metric.startswith("cache:")
+    }
+    outcomes = {metric[len("outcome:"):]: rollup.count for metric, rollup in combined.items()
+                if metric.startswith("outcome:")}
+    failures = {metric[len("failure:"):]: rollup.count for metric, rollup in combined.items()
+                if metric.startswith("failure:")}
+
+    series = []
+    for start in sorted(periods):
+        metrics = periods[start]
+        point = {"time": start, "videos": metrics["outcome:done"].count,
+                 "cost_per_video": _per_video(metrics, "llm_cost"),
+                 "tokens_per_video": _per_video(metrics, "llm_tokens")}
+        for metric, rollup in metrics.items():
+            kind, _, name = metric.partition(":")
+            if kind == "latency" and rollup.count:
+                for pct in (50, 95, 99):
+                    point[f"{name}_p{pct}"] = histogram_percentile(rollup.histogram, pct)
+            elif kind == "cache" and rollup.count:
+                point[f"{name}_hit_rate"] = rollup.total / rollup.count
+            elif kind == "failure":
+                point[f"failure_{name}"] = rollup.count
+            elif metric == "queue_depth" and rollup.count:
+                point["queue_depth_mean"] = rollup.total / rollup.count
+                point["queue_depth_p95"] = histogram_percentile(rollup.histogram, 95)
+        series.append(point)
+
+    queue_depth = combined["queue_depth"]
+    return {
+        "since": since,
+        "period": period,
+        "latency": latency,
+        "outcomes": outcomes,
+        "failures": failures,
+        "caches": caches,
+        "videos": combined["outcome:done"].count,
+        "cost_per_video": _per_video(combined, "llm_cost"),
+        "tokens_per_video": _per_video(combined, "llm_tokens"),
+        "queue_depth_mean": queue_depth.total / queue_depth.count if queue_depth.count else None,
+        "queue_depth_p95": histogram_percentile(queue_depth.histogram, 95),
+        "series": series,
+        "generated": time.time(),
+    }
+
+
+# Fold new stage rows into the rollups (e.g. a large backfill outside page loads) and print the totals
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the operations rollups and print a summary")
+    parser.add_argument("--days", type=float, default=1, help="Summarize the last N days")
+    args = parser.parse_args()
+
+    from store import get_store
+    started = time.perf_counter()
+    report = ops_report(get_store(), since=time.time() - args.days * 86400)
+    print(f"Rollups refreshed in {time.perf_counter() - started:.2f}s")
+    print(json.dumps({key: value for key, value in report.items() if key != "series"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
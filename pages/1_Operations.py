@@ -0,0 +1,126 @@
+import time
+import pandas as pd
+import streamlit as st
+from ops_metrics import ops_report
+from render_backends import get_render_router
+from store import get_store
+
+st.set_page_config(page_title="Operations", page_icon="📊", layout="wide")
+
+# Time window shown, and the period each chart point covers
+WINDOWS = {
+    "Last 24 hours": (86400, 3600),
+    "Last 7 days": (7 * 86400, 6 * 3600),
+    "Last 30 days": (30 * 86400, 86400),
+}
+
+# Stages charted by default (any recorded stage can be picked)
+DEFAULT_STAGES = ["total", "llm", "render"]
+
+
+# Rollups are refreshed incrementally inside ops_report; caching only spares reruns
+@st.cache_data(ttl=30, show_spinner=False)
+def load_report(window, period, now_bucket):
+    return ops_report(get_store(), since=time.time() - window, period=period)
+
+
+def seconds(value):
+    return "-" if value is None else f"{value:.1f}s"
+
+
+def chart_frame(series, columns):
+    frame = pd.DataFrame(series)
+    if frame.empty:
+        return frame
+    frame["time"] = pd.to_datetime(frame["time"], unit="s")
+    return frame.set_index("time").reindex(columns=columns)
+
+
+st.title("📊 Operations")
+window_name = st.radio("Window", list(WINDOWS), horizontal=True, label_visibility="collapsed")
+window, period = WINDOWS[window_name]
+report = load_report(window, period, int(time.time() // 30))
+series = report["series"]
+
+if not report["latency"] and not report["outcomes"]:
+    st.info("No generations recorded in this window yet.")
+    st.stop()
+
+# Headline numbers
+failed = sum(report["failures"].values())
+finished = sum(report["outcomes"].values())
+columns = st.columns(5)
+columns[0].metric("Videos", report["videos"])
+columns[1].metric("Failure rate", f"{failed / finished:.0%}" if finished else "-")
+columns[2].metric("p95 end-to-end", seconds(report["latency"].get("total", {}).get("p95")))
+columns[3].metric("LLM cost / video", f"${report['cost_per_video']:.3f}" if report["cost_per_video"] is not None else "-")
+columns[4].metric("Tokens / video", f"{report['tokens_per_video']:,.0f}" if report["tokens_per_video"] is not None else "-")
+
+# Stage latency percentiles
+st.subheader("Stage latency")
+st.dataframe(
+    pd.DataFrame(report["latency"]).T[["count", "mean", "p50", "p95", "p99"]].round(2),
+    use_container_width=True,
+)
+stages = st.multiselect("Stages", list(report["latency"]),
+                        default=[stage for stage in DEFAULT_STAGES if stage in report["latency"]])
+percentile = st.radio("Percentile", ["p50", "p95", "p99"], index=1, horizontal=True)
+if stages:
+    st.line_chart(chart_frame(series, [f"{stage}_{percentile}" for stage in stages]))
+
+# LLM spend
+st.subheader("LLM tokens and cost per video")
+left, right = st.columns(2)
+left.line_chart(chart_frame(series, ["cost_per_video"]))
+right.line_chart(chart_frame(series, ["tokens_per_video"]))
+
+# Render queue
+st.subheader("Render queue")
+queue = report["latency"].get("render_queue")
+left, right = st.columns(2)
+left.metric("Queue wait p50 / p95 / p99",
+            " / ".join(seconds((queue or {}).get(pct)) for pct in ("p50", "p95", "p99")))
+right.metric("Queue depth mean / p95",
+             f"{report['queue_depth_mean']:.1f} / {report['queue_depth_p95']:.0f}"
+             if report["queue_depth_mean"] is not None else "-")
+left.line_chart(chart_frame(series, ["render_queue_p50", "render_queue_p95", "render_queue_p99"]))
+right.line_chart(chart_frame(series, ["queue_depth_mean", "queue_depth_p95"]))
+
+# Render backends
+backends = {stage[len("render_backend_"):]: stats for stage, stats in report["latency"].items()
+            if stage.startswith("render_backend_")}
+router = get_render_router()
+warmup = report["latency"].get("render_warmup")
+if backends or router or warmup:
+    st.subheader("Render backends")
+    if warmup:
+        st.metric("Cold-start wait hidden by warm-up pings",
+                  f"{warmup['count'] * warmup['mean']:.0f}s over {warmup['count']} renders")
+    if backends:
+        st.dataframe(pd.DataFrame(backends).T[["count", "mean", "p50", "p95", "p99"]].round(2),
+                     use_container_width=True)
+        st.line_chart(chart_frame(series, [f"render_backend_{name}_{percentile}" for name in backends]))
+    if router:
+        live = router.stats()
+        last = live["last_failover"]
+        st.caption(f"Mode: {live['mode']}, failovers since start: {live['failovers']}"
+                   + (f" (last {time.time() - last['at']:.0f}s ago: remote service {last['reason']})" if last else "")
+                   + (f", rendering locally for another {live['remote_down_for']:.0f}s"
+                      if live["remote_down_for"] else ""))
+
+# Cache efficiency
+st.subheader("Cache hit rates")
+if report["caches"]:
+    st.dataframe(pd.DataFrame(report["caches"]).T, use_container_width=True)
+    st.line_chart(chart_frame(series, [f"{name}_hit_rate" for name in report["caches"]]))
+else:
+    st.caption("No cache lookups recorded in this window.")
+
+# Failures
+st.subheader("Failures")
+if report["failures"]:
+    st.bar_chart(chart_frame(series, [f"failure_{name}" for name in sorted(report["failures"])]).fillna(0))
+    st.caption(", ".join(f"{name}: {count}" for name, count in sorted(report["failures"].items())))
+else:
+    st.caption("No failed generations in this window.")
+st.caption("Outcomes: " + ", ".join(f"{status} {count}" for status, count in sorted(report["outcomes"].items())))
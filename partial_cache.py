@@ -0,0 +1,122 @@
+import os
+import re
+import shutil
+import threading
+
+# Persistent store of Manim partial movie files, shared by every render job
+PARTIAL_CACHE_DIR = os.getenv("PARTIAL_CACHE_DIR", os.path.join(os.getcwd(), "partial_cache"))
+PARTIAL_CACHE_MAX_BYTES = int(os.getenv("PARTIAL_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Manim names partial movies after the per-animation hash, e.g. 1185818338_2766307834_223132457.mp4
+PARTIAL_NAME = re.compile(r'^\d+_\d+_\d+\.(mp4|mov|webm)$')
+
+# Manim logs this for every animation it skips because the partial movie already exists
+CACHE_HIT_LOG = re.compile(r'Using cached data \(hash\s*:\s*(\d+_\d+_\d+)\)')
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+# Content-hashed partial movie store. Jobs get the store linked into their own
+# partial_movie_dir before rendering (so Manim skips unchanged animations) and
+# new partial movies are harvested back afterwards. Least recently used files
+# are evicted once the store exceeds max_bytes.
+class PartialMovieCache:
+    def __init__(self, root=PARTIAL_CACHE_DIR, max_bytes=PARTIAL_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _entries(self):
+        return [name for name in os.listdir(self.root) if PARTIAL_NAME.match(name)]
+
+    # Link every cached partial movie into a job's partial movie directory
+    def populate(self, job_dir):
+        os.makedirs(job_dir, exist_ok=True)
+        linked = 0
+        with self._lock:
+            for name in self._entries():
+                destination = os.path.join(job_dir, name)
+                if not os.path.exists(destination):
+                    _link_or_copy(os.path.join(self.root, name), destination)
+                    linked += 1
+        return linked
+
+    # Store partial movies from a finished job; returns how many were new
+    def harvest(self, job_dir):
+        if not os.path.isdir(job_dir):
+            return 0
+        added = 0
+        with self._lock:
+            for name in os.listdir(job_dir):
+                if not PARTIAL_NAME.match(name):
+                    continue
+                cached = os.path.join(self.root, name)
+                if os.path.exists(cached):
+                    continue
+                _link_or_copy(os.path.join(job_dir, name), cached)
+                added += 1
+            self._evict()
+        return added
+
+    # Mark the partial movies a job actually reused as recently used
+    def touch(self, hashes):
+        with self._lock:
+            for name in self._entries():
+                if name.split(".")[0] in hashes:
+                    os.utime(os.path.join(self.root, name))
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in self._entries():
+            path = os.path.join(self.root, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        while entries and total > self.max_bytes:
+            _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            names = self._entries()
+            size = sum(os.path.getsize(os.path.join(self.root, name)) for name in names)
+        return {"files": len(names), "bytes": size, "max_bytes": self.max_bytes}
+
+
+# Hashes of the animations Manim served from the partial movie cache, collected from its
+# output as it streams in. The end of each stream's previous chunk is searched again with
+# the next one, so a log line split across chunks is still found.
+class CacheHitCollector:
+    CARRY_CHARS = 256
+
+    def __init__(self):
+        self.hashes = set()
+        self._carry = {}
+        self._lock = threading.Lock()
+
+    def feed(self, stream, text):
+        with self._lock:
+            window = self._carry.get(stream, "") + text
+            self.hashes.update(CACHE_HIT_LOG.findall(window))
+            self._carry[stream] = window[-self.CARRY_CHARS:]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_partial_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PartialMovieCache()
+        return _cache
@@ -0,0 +1,1210 @@
+import sys
+
+# Same sqlite swap as app.py when used headless (crewai needs a recent sqlite)
+if 'sqlite3' not in sys.modules:
+    try:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    except ImportError:
+        pass
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pydantic import BaseModel, Field, ValidationError
+from crewai import Agent, Task, Crew, Process
+from crewai import LLM
+from rate_limiter import (
+    PRIORITY_INTERACTIVE,
+    estimate_message_tokens,
+    estimate_tokens,
+    get_rate_limiter,
+)
+from llm_config import UsageMeter, load_llm_config, output_token_limit, tier_settings, token_cost
+from hedging import LLM_HEDGE, TaskDeadlines, get_latency_tracker, race
+import replay
+from cancellation import CancelledError, raise_if_cancelled
+from examples_index import EXAMPLES_ENABLED, format_examples, get_example_index
+from topics import canonicalize, get_topic_cache
+from store import get_store
+from sections import get_section_cache, hash_text, parse_sections, stitch_clips, stitch_scene_module
+from manim_render import RENDER_OUTPUT_DIR
+from render_backends import get_render_router
+from render_warmup import get_service_warmer
+
+# Section code generation fan-out (0 disables it and uses the single two-task crew)
+SECTION_CODE_CONCURRENCY = int(os.getenv("SECTION_CODE_CONCURRENCY", "4"))
+
+# Rendering service used unless the user enters another one
+DEFAULT_API_URL = os.getenv("RENDER_API_URL", "https://video-server-dlz7.onrender.com")
+
+# Seconds between render progress polls of the rendering service
+RENDER_PROGRESS_POLL_SECONDS = 1.0
+
+# Define pydantic model for Manim code output
+class ManimCodeOutput(BaseModel):
+    code: str = Field(..., description="The complete Manim Python code")
+    scene_name: str = Field("", description="The name of the main scene class in the code")
+
+# Structured educational content. The content task answers with this as JSON and the
+# code task gets it back in compact form; the markdown shown to users is derived from it.
+class WorkedExampleStep(BaseModel):
+    text: str = Field(..., description="What happens in this step, in one sentence")
+    math: str = Field("", description="LaTeX for the step's result, if any")
+
+# Formula and worked example step lines written by ContentSection.to_markdown
+FORMULA_LINE = re.compile(r'^\$\$(.+)\$\$$')
+STEP_LINE = re.compile(r'^\d+\. (.*?)(?: \$(.+)\$)?$')
+
+class ContentSection(BaseModel):
+    id: str = Field(..., description="Short lowercase identifier, e.g. 'worked-example'")
+    title: str = Field(..., description="Section title")
+    summary: str = Field(..., description="The key explanation in 1-3 sentences")
+    formulas: list[str] = Field(default_factory=list, description="LaTeX formulas introduced here")
+    steps: list[WorkedExampleStep] = Field(default_factory=list, description="Worked example steps, in order")
+    visual_hints: list[str] = Field(default_factory=list, description="How to show this section on screen")
+
+    # Uses the "## [id] Title" headings parse_sections splits on, so sections keep their ids
+    def to_markdown(self):
+        lines = [f"## [{self.id}] {self.title}", "", self.summary]
+        if self.formulas:
+            lines += [""] + [f"$${formula}$$" for formula in self.formulas]
+        if self.steps:
+            lines += [""] + [f"{index}. {step.text}" + (f" ${step.math}$" if step.math else "")
+                             for index, step in enumerate(self.steps, start=1)]
+        if self.visual_hints:
+            lines += ["", "*Visual ideas:*"] + [f"- {hint}" for hint in self.visual_hints]
+        return "\n".join(lines)
+
+    # Inverse of to_markdown for a section body (the text below its heading), or None if
+    # to_markdown would not give that body back exactly (say, after the user edited it)
+    @classmethod
+    def from_markdown(cls, id, title, body):
+        blocks = body.split("\n\n")
+        fields = {"summary": blocks[0]}
+        for block in blocks[1:]:
+            lines = block.split("\n")
+            if lines[0] == "*Visual ideas:*" and all(line.startswith("- ") for line in lines[1:]):
+                fields["visual_hints"] = [line[2:] for line in lines[1:]]
+            elif all(FORMULA_LINE.match(line) for line in lines):
+                fields["formulas"] = [FORMULA_LINE.match(line).group(1) for line in lines]
+            elif all(STEP_LINE.match(line) for line in lines):
+                fields["steps"] = [WorkedExampleStep(text=match.group(1), math=match.group(2) or "")
+                                   for match in map(STEP_LINE.match, lines)]
+            else:
+                return None
+        section = cls(id=id, title=title, **fields)
+        return section if section.to_markdown().partition("\n\n")[2] == body else None
+
+class EducationalContent(BaseModel):
+    topic: str = Field(..., description="The topic as given")
+    sections: list[ContentSection] = Field(..., description="3-6 sections in teaching order")
+
+    def to_markdown(self):
+        return "\n\n".join(section.to_markdown() for section in self.sections)
+
+    # Minimal JSON (no whitespace, empty fields dropped) handed to the code task
+    def to_compact_json(self):
+        return self.model_dump_json(exclude_defaults=True)
+
+# Shape of EducationalContent shown in the content prompt (shorter than its JSON schema)
+CONTENT_JSON_FORMAT = """{"topic": str, "sections": [{"id": str, "title": str, "summary": str,
+        "formulas": [LaTeX str], "steps": [{"text": str, "math": LaTeX str}], "visual_hints": [str]}]}"""
+
+# LaTeX commands that begin like the JSON escapes \b \f \n \r \t (\frac reads as a form feed)
+LATEX_ESCAPE_LOOKALIKES = frozenset("""
+    backslash bar beta bf big Big bigcap bigcup bigg Bigg binom bmod boldsymbol bot boxed bullet
+    flat forall frac frown
+    nabla ne neg neq newline nexists ngeq ni nleq nmid not notin nu
+    rangle rceil rfloor rho right rightarrow rightharpoonup rm rVert rvert
+    tan tanh tau text textbf textit textrm textstyle tfrac therefore theta tilde times tiny to top triangle
+""".split())
+JSON_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|[A-Za-z]+|.?)', re.DOTALL)
+
+# Keep a JSON escape, double the backslash of anything else (LaTeX the model did not escape)
+def _repair_escape(match):
+    escape = match.group(1)
+    if escape in ('"', '\\', '/') or re.fullmatch(r'u[0-9a-fA-F]{4}', escape):
+        return match.group(0)
+    if escape[:1] and escape[0] in "bfnrt" and escape not in LATEX_ESCAPE_LOOKALIKES:
+        return match.group(0)
+    return '\\\\' + escape
+
+def repair_json_escapes(text):
+    return JSON_ESCAPE.sub(_repair_escape, text)
+
+# EducationalContent from a content task answer, or None if it is not the expected JSON.
+# Single backslashes in LaTeX are repaired first (json would read \frac as a form feed
+# and "rac") and raw newlines or tabs inside strings are accepted.
+def parse_educational_content(text):
+    match = re.search(r'\{.*\}', text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        return EducationalContent.model_validate(json.loads(repair_json_escapes(match.group(0)), strict=False))
+    except (ValidationError, ValueError):
+        return None
+
+# Markdown for a content task answer; answers that are not structured pass through
+def content_markdown(text):
+    content = parse_educational_content(text)
+    return content.to_markdown() if content else text
+
+# Task guardrail: hand the code task the compact JSON instead of the model's full answer
+def compact_content_output(task_output):
+    content = parse_educational_content(task_output.raw)
+    return True, content.to_compact_json() if content else task_output.raw
+
+# LLM that waits for the shared rate limiter before every Anthropic call.
+# Once cancel_token is cancelled no further calls are sent (a call already in
+# flight still completes, its answer is dropped by the raised CancelledError).
+# A call slower than the recent p95 of its model and agent is hedged with a duplicate
+# request (to hedge_model if set, metered in hedge_usage) and the first answer wins;
+# every task of this LLM's agent must finish within `deadline` seconds or its next
+# call fails with DeadlineExceeded.
+class RateLimitedLLM(LLM):
+    max_rate_limit_retries = 3
+
+    def __init__(self, *args, session_id="default", priority=PRIORITY_INTERACTIVE, agent="llm",
+                 deadline=None, hedge_model=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_id = session_id
+        self.priority = priority
+        self.queue_wait = 0.0
+        self.call_count = 0
+        self.cancel_token = None
+        self.usage = UsageMeter()
+        self.hedge_usage = UsageMeter()
+        self.agent = agent
+        self.deadlines = TaskDeadlines(deadline)
+        self.hedge_model = hedge_model
+        self._hedge_llm = None
+
+    # Latencies are tracked per model and agent: a code call is not "slow" next to content calls
+    def _latency_tracker(self, model):
+        return get_latency_tracker(f"{model}:{self.agent}")
+
+    # Call `llm` (this LLM or the hedge model), feed its latency to its tracker and meter
+    # its tokens. A hedge race's loser is metered too when its answer arrives, since the
+    # request was billed even though its answer is dropped.
+    def _timed_call(self, llm, messages, args, kwargs):
+        started = time.perf_counter()
+        response = LLM.call(llm, messages, *args, **kwargs)
+        seconds = time.perf_counter() - started
+        self._latency_tracker(llm.model).observe(seconds)
+        if llm is self._hedge_llm:
+            self.hedge_usage.record(seconds, estimate_message_tokens(messages), estimate_tokens(response))
+        else:
+            # The agent's time is the whole race, added by call()
+            self.usage.record(0.0, estimate_message_tokens(messages), estimate_tokens(response))
+        return response
+
+    def _hedge(self, messages, args, kwargs):
+        if self.hedge_model and self._hedge_llm is None:
+            # The primary's max_tokens may be over what the hedge model can return
+            limit = output_token_limit(self.hedge_model)
+            max_tokens = min(self.max_tokens, limit) if self.max_tokens and limit else self.max_tokens or limit
+            self._hedge_llm = LLM(model=self.hedge_model, api_key=self.api_key, temperature=self.temperature,
+                                  max_tokens=max_tokens, timeout=self.timeout)
+        hedge_llm = self._hedge_llm or self
+        estimated_tokens = estimate_message_tokens(messages) + (hedge_llm.max_tokens or 0)
+
+        def hedge(attempt_token):
+            # The duplicate is a request of its own and queues like one
+            self.queue_wait += get_rate_limiter().acquire(estimated_tokens, self.session_id, self.priority,
+                                                          attempt_token)
+            return self._timed_call(hedge_llm, messages, args, kwargs)
+        return hedge
+
+    def call(self, messages, *args, **kwargs):
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_message_tokens(messages) + (self.max_tokens or 0)
+        token = self.cancel_token
+        deadline = self.deadlines.deadline_for(messages)
+        attempt = 0
+        while True:
+            try:
+                self.queue_wait += limiter.acquire(estimated_tokens, self.session_id, self.priority, token)
+            except CancelledError:
+                token.add_reclaimed("llm_calls_avoided", 1)
+                raise
+            self.call_count += 1
+            try:
+                started = time.perf_counter()
+                response, hedged, hedge_won = race(
+                    lambda attempt_token: self._timed_call(self, messages, args, kwargs),
+                    self._hedge(messages, args, kwargs) if LLM_HEDGE else None,
+                    self._latency_tracker(self.model).hedge_after(),
+                    deadline,
+                    token,
+                    label=f"The {self.agent} task ({self.deadlines.seconds:g}s)" if self.deadlines.seconds else "LLM call",
+                )
+                # Tokens were metered per request in _timed_call; the agent waited this long
+                self.usage.record(time.perf_counter() - started, 0, 0, calls=0)
+                if hedged:
+                    self.usage.record_hedge(hedge_won)
+                raise_if_cancelled(token)
+                return response
+            except CancelledError:
+                raise
+            except Exception as e:
+                # Back off the whole process on 429 instead of letting every session retry blindly
+                if "RateLimit" not in type(e).__name__ or attempt >= self.max_rate_limit_retries:
+                    raise
+                limiter.penalize(getattr(e, "retry_after", None))
+                attempt += 1
+
+# The content and code agents' LLMs, configured per tier in llm_config.json. The
+# counters and cancel token span both, so callers can use it like a single LLM.
+class AgentLLMs:
+    def __init__(self, content, code, tier=None):
+        self.content = content
+        self.code = code
+        self.tier = tier
+
+    def _distinct(self):
+        return [self.content] if self.code is self.content else [self.content, self.code]
+
+    def for_agent(self, agent):
+        return self.content if agent == "content" else self.code
+
+    @property
+    def queue_wait(self):
+        return sum(llm.queue_wait for llm in self._distinct())
+
+    @property
+    def call_count(self):
+        return sum(llm.call_count for llm in self._distinct())
+
+    @property
+    def cancel_token(self):
+        return self.content.cancel_token
+
+    @cancel_token.setter
+    def cancel_token(self, token):
+        for llm in self._distinct():
+            llm.cancel_token = token
+
+# The LLM an agent runs on, for both AgentLLMs and a single shared LLM
+def agent_llm(llm, agent):
+    return llm.for_agent(agent) if isinstance(llm, AgentLLMs) else llm
+
+# Per-agent model, calls, seconds, estimated tokens and cost so far ("shared" when one LLM
+# serves both). Requests to an agent's hedge model are reported as "<agent>_hedge", at
+# that model's prices.
+def llm_usage(llm):
+    config = load_llm_config()
+    content, code = agent_llm(llm, "content"), agent_llm(llm, "code")
+    usage = {}
+    for agent, instance in ({"shared": content} if content is code else {"content": content, "code": code}).items():
+        if not hasattr(instance, "usage"):
+            continue
+        meters = [(agent, instance.usage, instance.model)]
+        hedge_usage = getattr(instance, "hedge_usage", None)
+        if hedge_usage is not None and hedge_usage.calls:
+            meters.append((f"{agent}_hedge", hedge_usage, instance.hedge_model))
+        for name, meter, model in meters:
+            stats = meter.snapshot()
+            stats["model"] = model
+            stats["cost"] = token_cost(model, stats["prompt_tokens"], stats["completion_tokens"], config)
+            usage[name] = stats
+    return usage
+
+# Set up the LLMs of one tier (live, recording or replaying depending on PIPELINE_MODE)
+def get_llm(api_key=None, session_id="default", priority=PRIORITY_INTERACTIVE, tier=None):
+    if replay.PIPELINE_MODE == "replay":
+        return replay.ReplayLLM(replay.get_fixture_store())
+    tier, settings = tier_settings(tier)
+    llms = {}
+    for agent, agent_settings in settings.items():
+        llm = RateLimitedLLM(
+            api_key=api_key or os.getenv('ANTHROPIC_API_KEY'),
+            session_id=session_id,
+            priority=priority,
+            agent=agent,
+            **agent_settings
+        )
+        if replay.PIPELINE_MODE == "record":
+            replay.record_llm(llm, replay.get_fixture_store())
+        llms[agent] = llm
+    return AgentLLMs(llms["content"], llms["code"], tier)
+
+# Define the agents
+def create_agents(llm):
+    # Agent 1: Content Generator Agent
+    content_generator_agent = Agent(
+        role="Educational Content Creator",
+        goal="Generate comprehensive educational content on mathematical topics",
+        backstory="""You are an expert mathematics educator with deep understanding of 
+        various mathematical concepts. You excel at explaining complex topics in clear, 
+        structured ways that make them accessible to students. You're known for your 
+        ability to break down difficult concepts into digestible chunks and for creating 
+        content that flows logically from introduction to advanced applications.""",
+        verbose=False,
+        llm=agent_llm(llm, "content")
+    )
+
+    # Agent 2: Manim Developer Agent
+    manim_developer_agent = Agent(
+        role="Manim Animation Developer",
+        goal="""Transform educational content into beautiful animated visualizations using Manim""",
+        backstory="""You are a Python developer specializing in mathematical animations 
+        using the Manim library (version 0.19.0). You have extensive experience translating mathematical 
+        concepts into visually stunning animations. You're skilled at writing clean, efficient 
+        Manim code that brings abstract mathematical concepts to life through animation.
+        You are known for creating perfectly timed animations with NO OVERLAPPING elements and
+        clear transitions between concepts.""",
+        verbose=False,
+        llm=agent_llm(llm, "code")
+    )
+
+    return content_generator_agent, manim_developer_agent
+
+# Manim rules shared by every code generation prompt
+MANIM_COMPATIBILITY_RULES = """
+        COMPATIBILITY REQUIREMENTS:
+        1. ONLY use standard Manim classes (v0.19.0):
+           - For geometric shapes, use: Circle, Square, Rectangle, Polygon, Line, Arrow, etc.
+           - For text, use: Text, Tex, or MathTex
+           - DO NOT use custom classes like 'RightAngleTriangle'
+           
+        2. For a right-angled triangle, use Polygon:
+           ```python
+           triangle = Polygon(
+               ORIGIN, 
+               RIGHT * 4, 
+               UP * 3,
+               color=WHITE
+           )
+           ```
+           
+        3. For right angle marks, use Square:
+           ```python
+           right_angle = Square(side_length=0.5, color=WHITE).move_to(
+               triangle.get_vertices()[0] + (RIGHT * 0.25 + UP * 0.25)
+           )
+           ```
+          
+        4. DO NOT use print statements or comments with special Unicode characters
+        5. Use simple ASCII characters only in strings and comments
+        6. Use self.play() for all animations, not Transform() on its own
+        7. Break long animations into shorter sequences
+"""
+
+# Define the tasks
+def create_tasks(content_generator_agent, manim_developer_agent, topic, examples=None):
+    # Task 1: Generate educational content
+    content_generation_task = Task(
+        name="generate_math_content",
+        description=f"""
+        Create comprehensive educational content about {topic} with the following:
+        
+        1. Clear introduction to the concept
+        2. Step-by-step explanation of the key principles
+        3. Mathematical notation and formulas
+        4. At least one worked example demonstrating the concept
+        5. Suggestions for visual representations that would help illustrate the concept
+        
+        Your content should be well-structured, engaging, and suitable for transformation 
+        into an animated video. Focus on both clarity and accuracy. Keep it concise: short
+        summaries, the formulas themselves and the worked example as steps.
+        
+        FORMAT: Answer with a single JSON object and nothing else (no code fences), of the form
+        {CONTENT_JSON_FORMAT}
+        Use 3-6 sections. Section ids are short lowercase identifiers such as "introduction" or
+        "worked-example". Write every formula and step result in LaTeX, and double every LaTeX
+        backslash inside the JSON strings, e.g. "\\\\frac{{a}}{{b}}", "a \\\\times b", "\\\\sqrt{{x}}".
+        """,
+        agent=content_generator_agent,
+        expected_output="""A JSON object with the content sections, their formulas, the worked
+        example steps and visual hints for the requested mathematical topic.""",
+        guardrail=compact_content_output,
+    )
+
+    # Task 2: Develop Manim code based on content
+    manim_code_development_task = Task(
+        name="develop_manim_code",
+        description=f"""
+        Using the provided educational content about {topic} (JSON: sections with summaries,
+        LaTeX formulas, worked example steps and visual hints), create a Python script using 
+        the Manim library (version 0.19.0) that:
+        
+        1. Implements all the key explanations from the content
+        2. Creates a SINGLE scene class named "MainScene" that inherits from Scene
+        3. Includes proper mathematical notation and formulas
+        4. Animates the worked examples with clear transitions
+        5. Uses color, movement, and timing effectively
+        
+        CRITICAL REQUIREMENTS:
+        1. Create ONLY ONE scene class named "MainScene" - this is essential for proper rendering
+        2. Ensure your code follows these strict timing rules:
+           - Use self.wait() after each animation to provide breathing room
+           - NEVER have overlapping animations unless explicitly using AnimationGroup
+           - Always FadeOut or Transform old elements before introducing new ones in the same area
+           - Position text and equations with careful spacing (use buffers of at least 0.5)
+           - For text elements, use font_size parameter to control size
+        3. Start your response with: ```python
+        4. End your response with: ```
+        5. Include ONLY these two imports at the top:
+           ```
+           from manim import *
+           import numpy as np
+           ```
+        6. Your code must be complete and executable with no missing components
+        
+{MANIM_COMPATIBILITY_RULES}
+{format_examples(examples)}
+        """,
+        agent=manim_developer_agent,
+        expected_output="""A complete, well-structured Python script using Manim to animate
+        the educational content provided, with a single MainScene class and careful timing.""",
+        context=[content_generation_task]
+    )
+    return content_generation_task, manim_code_development_task
+
+# A section as its code task sees it: compact JSON when its markdown is what
+# ContentSection.to_markdown wrote, else the markdown (unstructured or edited content)
+def section_brief(section):
+    content_section = ContentSection.from_markdown(section.id, section.title, section.body)
+    if content_section is None:
+        return section.body
+    return content_section.model_dump_json(exclude_defaults=True, exclude={"id", "title"})
+
+# Code task for a single content section: one Scene subclass named after the section
+def create_section_task(manim_developer_agent, topic, section, examples=None):
+    return Task(
+        name=f"develop_section_{section.id}",
+        description=f"""
+        You are animating one section of an educational video about {topic}.
+        Create a Python script using the Manim library (version 0.19.0) for this section only
+        (given as JSON with its summary, LaTeX formulas, worked example steps and visual hints,
+        or as markdown):
+        
+        SECTION: {section.title}
+        {section_brief(section)}
+        
+        CRITICAL REQUIREMENTS:
+        1. Create ONLY ONE scene class named "{section.class_name}" that inherits from Scene
+        2. The scene must start from an empty screen and FadeOut everything at the end
+        3. Use self.wait() after each animation and NEVER overlap elements
+        4. Start your response with: ```python
+        5. End your response with: ```
+        6. Include ONLY these two imports at the top:
+           ```
+           from manim import *
+           import numpy as np
+           ```
+{MANIM_COMPATIBILITY_RULES}
+{format_examples(examples)}
+        """,
+        agent=manim_developer_agent,
+        expected_output=f"""A complete Manim script with a single {section.class_name} scene
+        animating the given section.""",
+    )
+
+# Run the content task on its own and return the markdown
+def generate_content(content_generator_agent, manim_developer_agent, topic):
+    content_generation_task, _ = create_tasks(content_generator_agent, manim_developer_agent, topic)
+    crew = Crew(
+        agents=[content_generator_agent],
+        tasks=[content_generation_task],
+        verbose=False,
+        process=Process.sequential
+    )
+    return content_markdown(crew.kickoff().raw)
+
+# Generate the code for one section and name its scene after the section
+def generate_section_code(manim_developer_agent, topic, section, examples=None):
+    crew = Crew(
+        agents=[manim_developer_agent],
+        tasks=[create_section_task(manim_developer_agent, topic, section, examples)],
+        verbose=False,
+        process=Process.sequential
+    )
+    manim_code = extract_manim_code(crew.kickoff())
+    if not manim_code:
+        return None
+    return manim_code.code.replace("class MainScene(Scene)", f"class {section.class_name}(Scene)")
+
+# Generate every section's code with concurrent LLM calls (cached sections are reused).
+# Each worker gets its own agent since crewai agents keep per-run state.
+# on_progress(fraction) is called from the calling thread as sections complete.
+def generate_section_codes(llm, topic, sections, on_progress=None, examples=None, cancel_token=None):
+    cache = get_section_cache()
+    codes = [None] * len(sections)
+    reused = 0
+
+    def generate(section):
+        code = cache.get_code(section)
+        if code:
+            return code, True
+        raise_if_cancelled(cancel_token)
+        _, manim_developer_agent = create_agents(llm)
+        code = generate_section_code(manim_developer_agent, topic, section, examples)
+        if code:
+            cache.put_code(section, code)
+        return code, False
+
+    workers = max(1, min(SECTION_CODE_CONCURRENCY, len(sections)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate, section): index for index, section in enumerate(sections)}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            codes[futures[future]], hit = future.result()
+            reused += hit
+            if on_progress:
+                on_progress(completed / len(sections))
+    return codes, reused
+
+# Extract all scene class names from the code (kept for utility)
+def extract_scene_classes(code):
+    scene_classes = []
+    pattern = r'class\s+(\w+)\s*\(\s*Scene\s*\)'
+    matches = re.finditer(pattern, code)
+    
+    for match in matches:
+        scene_classes.append(match.group(1))
+    
+    return scene_classes
+
+# Extract Manim code (minimal debugging messages)
+def extract_manim_code(result):
+    try:
+        result_str = str(result)
+        
+        # Case 1: Standard code block with ```python ... ```
+        start_marker = "```python"
+        end_marker = "```"
+        
+        start_pos = result_str.find(start_marker)
+        if start_pos != -1:
+            code_start = start_pos + len(start_marker)
+            end_pos = result_str.find(end_marker, code_start)
+            
+            if end_pos != -1:
+                code = result_str[code_start:end_pos].strip()
+            else:
+                code = result_str[code_start:].strip()
+        
+        # Case 2: No start marker, but contains "from manim import"
+        elif "from manim import" in result_str:
+            code_start = result_str.find("from manim import")
+            code = result_str[code_start:].strip()
+        
+        # Case 3: No markers at all, but contains "class" and "Scene"
+        elif "class" in result_str and "Scene" in result_str:
+            scene_class_match = re.search(r'class\s+\w+\s*\(\s*Scene\s*\)', result_str)
+            if scene_class_match:
+                import_pos = result_str.rfind("import", 0, scene_class_match.start())
+                if import_pos != -1:
+                    code_start = import_pos
+                else:
+                    code_start = scene_class_match.start()
+                
+                code = result_str[code_start:].strip()
+            else:
+                return None
+        else:
+            return None
+        
+        # Ensure the code has proper imports
+        imports_to_add = []
+        if "from manim import" not in code and "import manim" not in code:
+            imports_to_add.append("from manim import *")
+        
+        if "import numpy as np" not in code and "numpy" in code:
+            imports_to_add.append("import numpy as np")
+            
+        if imports_to_add:
+            code = "\n".join(imports_to_add) + "\n\n" + code
+        
+        # Ensure it uses MainScene class - rename if necessary
+        if "class MainScene(Scene)" not in code:
+            scene_class_match = re.search(r'class\s+(\w+)\s*\(\s*Scene\s*\)', code)
+            if scene_class_match:
+                original_name = scene_class_match.group(1)
+                code = code.replace(f"class {original_name}(Scene)", "class MainScene(Scene)")
+                code = code.replace(f"{original_name}()", "MainScene()")
+        
+        # Clean the code of any potentially problematic characters
+        cleaned_lines = []
+        for line in code.split('\n'):
+            if '#' in line:
+                comment_pos = line.find('#')
+                code_part = line[:comment_pos]
+                comment_part = line[comment_pos:]
+                cleaned_comment = ''.join(c if ord(c) < 128 else ' ' for c in comment_part)
+                cleaned_lines.append(code_part + cleaned_comment)
+            else:
+                cleaned_lines.append(line)
+        
+        code = '\n'.join(cleaned_lines)
+        
+        # Setting scene_name to "MainScene" to ensure only one scene is rendered
+        scene_name = "MainScene"
+        
+        return ManimCodeOutput(code=code, scene_name=scene_name)
+        
+    except Exception as e:
+        return None
+
+# Function to send code to the rendering API.
+# While it renders, on_progress(progress) gets the job's percent complete and ETA.
+# Returns {"video_id", "scenes_rendered", "job", "warmup"}, {"error", "violation", "job",
+# "warmup"} if the service reports why the render failed, or None. "job" is the service's
+# job status, "warmup" the cold start a warm-up ping took off this render (see render_warmup.py).
+# Cancelling cancel_token asks the service to drop the job (POST /cancel/{job_id}),
+# which unblocks this call; the reclaimed render time is added to the token.
+# client_id (the app's session id) is sent as X-Client-Id, so the service queues each
+# session's jobs separately instead of lumping every user of this app into one client.
+def render_manim_code(manim_code: ManimCodeOutput, api_url: str, cancel_token=None, on_progress=None,
+                      client_id=None):
+    raise_if_cancelled(cancel_token)
+    unregister = lambda: None
+    cancel_requests = []
+    rendered = threading.Event()
+    try:
+        if api_url.endswith('/'):
+            api_url = api_url[:-1]
+        
+        # Create payload with the extracted code
+        job_id = uuid.uuid4().hex
+        warmup = get_service_warmer().render_started(api_url)
+        payload = {
+            "code": manim_code.code,
+            "scene_name": manim_code.scene_name,
+            "job_id": job_id
+        }
+        if cancel_token is not None:
+            # Cancel from a thread of its own so whoever cancels is not held up by the request
+            def request_cancel():
+                thread = threading.Thread(target=cancel_render, args=(api_url, job_id, cancel_token), daemon=True)
+                cancel_requests.append(thread)
+                thread.start()
+            unregister = cancel_token.on_cancel(request_cancel)
+        if on_progress is not None:
+            threading.Thread(target=poll_render_progress, args=(api_url, job_id, on_progress, rendered),
+                             daemon=True).start()
+        
+        # Send to API
+        response = requests.post(
+            f"{api_url}/render",
+            json=payload,
+            headers=client_headers(client_id)
+        )
+        raise_if_cancelled(cancel_token)
+        
+        if response.status_code != 200:
+            return None
+            
+        data = response.json()
+        
+        if data.get("success", False):
+            if "video_id" in data:
+                return {"video_id": data["video_id"], "scenes_rendered": data.get("scenes_rendered", []),
+                        "partials_reused": data.get("partials_reused"), "job": data.get("job"), "warmup": warmup}
+            else:
+                return None
+        elif data.get("violation"):
+            # e.g. "latex" when the preflight caught invalid LaTeX; the error names the formulas
+            return {"error": data.get("error"), "violation": data["violation"], "job": data.get("job"),
+                    "warmup": warmup}
+        else:
+            return None
+    
+    except CancelledError:
+        # Let the cancel request report how much render time it freed
+        for thread in cancel_requests:
+            thread.join(timeout=10)
+        raise
+    except Exception as e:
+        return None
+    finally:
+        rendered.set()
+        unregister()
+
+# Headers naming the client a render request is queued under (none: the service uses our address)
+def client_headers(client_id):
+    return {"X-Client-Id": str(client_id)} if client_id else None
+
+# Report the render job's progress from the service's /status endpoint until `done` is set.
+# Services without the endpoint (or with the job not yet submitted) are polled quietly.
+def poll_render_progress(api_url, job_id, on_progress, done, interval=RENDER_PROGRESS_POLL_SECONDS):
+    while not done.wait(interval):
+        try:
+            response = requests.get(f"{api_url}/status/{job_id}", timeout=5)
+            if response.status_code != 200:
+                continue
+            job = response.json().get("job") or {}
+            if job.get("progress") and not done.is_set():
+                on_progress(job["progress"])
+        except Exception:
+            pass
+
+# Cancel a queued or running job on the rendering service and credit the freed render time
+def cancel_render(api_url, job_id, cancel_token):
+    try:
+        response = requests.post(f"{api_url.rstrip('/')}/cancel/{job_id}", timeout=10)
+        if response.status_code == 200:
+            cancel_token.add_reclaimed("render_cpu_seconds", response.json().get("reclaimed_cpu_seconds", 0.0))
+    except Exception:
+        pass
+
+# Ask the rendering service for a storyboard (one still per animation) instead of a video.
+# Returns {"storyboard_id", "frames": [image URLs], "error", "warmup"} or None if the service
+# has no storyboard endpoint. Not available when replaying. Storyboards skip the
+# animation frames, so they report no render progress.
+def render_storyboard(manim_code: ManimCodeOutput, api_url: str, cancel_token=None, on_progress=None,
+                      client_id=None):
+    raise_if_cancelled(cancel_token)
+    if replay.PIPELINE_MODE == "replay":
+        return None
+    api_url = api_url.rstrip('/')
+    warmup = get_service_warmer().render_started(api_url)
+    try:
+        response = requests.post(
+            f"{api_url}/storyboard",
+            json={"code": manim_code.code, "scene_name": manim_code.scene_name},
+            headers=client_headers(client_id)
+        )
+        if response.status_code != 200:
+            return None
+        data = response.json()
+    except Exception:
+        return None
+    storyboard_id = data.get("storyboard_id")
+    return {
+        "storyboard_id": storyboard_id,
+        "frames": [f"{api_url}/storyboard/{storyboard_id}/{name}" for name in data.get("frames", [])],
+        "error": data.get("error"),
+        "warmup": warmup,
+    }
+
+# Render function for the current PIPELINE_MODE; live renders go through the
+# RENDER_BACKEND router (see render_backends.py)
+def get_render_function():
+    if replay.PIPELINE_MODE == "replay":
+        return replay.ReplayRenderer(replay.get_fixture_store()).render
+    render = get_render_router(render_manim_code).render
+    if replay.PIPELINE_MODE == "record":
+        return replay.record_render(render, replay.get_fixture_store())
+    return render
+
+# URL (or fixture file when replaying, or local file when a local backend rendered it)
+# the video can be played from
+def video_source(api_url, video_id):
+    if replay.PIPELINE_MODE == "replay":
+        return replay.replay_video_source(api_url, video_id, replay.get_fixture_store())
+    local_path = os.path.join(RENDER_OUTPUT_DIR, f"{video_id}.mp4")
+    if re.fullmatch(r'[0-9a-f]{8,64}', video_id or "") and os.path.exists(local_path):
+        return local_path
+    return f"{api_url.rstrip('/')}/video/{video_id}"
+
+# Whether a previously rendered video can still be served
+def video_available(api_url, video_id):
+    source = video_source(api_url, video_id)
+    if os.path.exists(source):
+        return True
+    try:
+        return requests.head(source, timeout=5).status_code == 200
+    except Exception:
+        return False
+
+# Pull the educational content out of the crew result
+def extract_content(result):
+    try:
+        if hasattr(result, 'tasks_output') and result.tasks_output:
+            for task_output in result.tasks_output:
+                if getattr(task_output, 'name', None) == "generate_math_content":
+                    return content_markdown(task_output.raw)
+                if hasattr(task_output, 'task') and task_output.task.name == "generate_math_content":
+                    return task_output.output
+    except Exception:
+        pass
+    return None
+
+# Nearest previously successful generations, used as few-shot examples.
+# Skipped when replaying so prompts keep matching the recorded fixtures.
+def find_examples(topic, content=""):
+    if not EXAMPLES_ENABLED or replay.PIPELINE_MODE == "replay":
+        return []
+    return get_example_index().search(topic, content)
+
+# Track first-pass success and LLM calls per video, and keep code that rendered as an example
+def record_generation_outcome(topic, content, manim_code, rendered, llm, examples):
+    if not EXAMPLES_ENABLED or replay.PIPELINE_MODE == "replay":
+        return
+    index = get_example_index()
+    index.record_outcome(bool(examples), rendered, getattr(llm, "call_count", 0))
+    if rendered and manim_code:
+        index.add(topic, content, manim_code.code)
+
+# Full render of code the user approved from its storyboard
+def render_approved(topic, content, manim_code, api_url, render=None, cancel_token=None, on_progress=None,
+                    client_id=None):
+    response = (render or render_manim_code)(manim_code, api_url, cancel_token=cancel_token, on_progress=on_progress,
+                                             client_id=client_id)
+    if response and "video_id" in response and EXAMPLES_ENABLED and replay.PIPELINE_MODE != "replay":
+        get_example_index().add(topic, content, manim_code.code)
+    return response
+
+# Run the generate flow without any UI: content -> code -> render.
+# With SECTION_CODE_CONCURRENCY > 0 the code is generated per content section in
+# parallel and stitched into one MainScene; otherwise one crew runs both tasks.
+# on_event(stage, payload) lets the Streamlit UI or a benchmark follow the stages.
+# With storyboard=True the render stage produces a storyboard instead of a video
+# (result["render"] holds it) and the outcome is left for render_approved.
+# Cancelling cancel_token stops the run at the next LLM call or stage boundary
+# (and aborts a running render) by raising CancelledError. Renders are queued on the
+# rendering service under client_id (see render_manim_code).
+def run_generation(topic, llm, api_url, render=None, on_event=None, storyboard=False, cancel_token=None,
+                   client_id=None):
+    if SECTION_CODE_CONCURRENCY > 0:
+        return run_parallel_generation(topic, llm, api_url, render=render, on_event=on_event,
+                                       storyboard=storyboard, cancel_token=cancel_token, client_id=client_id)
+
+    render = render_storyboard if storyboard else render or render_manim_code
+    llm.cancel_token = cancel_token
+    notify = on_event or (lambda stage, payload=None: None)
+    timings = {}
+    started = time.perf_counter()
+
+    content_generator_agent, manim_developer_agent = create_agents(llm)
+    examples = find_examples(topic)
+    content_generation_task, manim_code_development_task = create_tasks(
+        content_generator_agent, manim_developer_agent, topic, examples
+    )
+    crew = Crew(
+        agents=[content_generator_agent, manim_developer_agent],
+        tasks=[content_generation_task, manim_code_development_task],
+        verbose=False,
+        process=Process.sequential
+    )
+
+    notify("crew_started")
+    stage_started = time.perf_counter()
+    result = crew.kickoff()
+    timings["llm"] = time.perf_counter() - stage_started
+    content = extract_content(result)
+    notify("crew_finished", content)
+
+    stage_started = time.perf_counter()
+    manim_code = extract_manim_code(result)
+    timings["extract"] = time.perf_counter() - stage_started
+    notify("code_extracted", manim_code)
+
+    raise_if_cancelled(cancel_token)
+    response = None
+    if manim_code:
+        notify("render_started", manim_code)
+        stage_started = time.perf_counter()
+        response = render(manim_code, api_url, cancel_token=cancel_token, client_id=client_id,
+                          on_progress=lambda progress: notify("render_progress", progress))
+        timings["render"] = time.perf_counter() - stage_started
+        notify("render_finished", response)
+
+    rendered = bool(response and "video_id" in response)
+    if not storyboard:
+        record_generation_outcome(topic, content, manim_code, rendered, llm, examples)
+    timings["total"] = time.perf_counter() - started
+    return {
+        "content": content,
+        "manim_code": manim_code,
+        "render": response,
+        "timings": timings,
+        "queue_wait": getattr(llm, "queue_wait", 0.0),
+        "llm_usage": llm_usage(llm),
+        "tier": getattr(llm, "tier", None),
+    }
+
+# Content first, then concurrent per-section code generation stitched into one scene,
+# so LLM wall time is the content call plus the slowest section instead of one long call
+def run_parallel_generation(topic, llm, api_url, render=None, on_event=None, storyboard=False, cancel_token=None,
+                            client_id=None):
+    render = render_storyboard if storyboard else render or render_manim_code
+    llm.cancel_token = cancel_token
+    notify = on_event or (lambda stage, payload=None: None)
+    timings = {}
+    started = time.perf_counter()
+
+    content_generator_agent, manim_developer_agent = create_agents(llm)
+    notify("crew_started")
+    stage_started = time.perf_counter()
+    content = generate_content(content_generator_agent, manim_developer_agent, topic)
+    timings["content"] = time.perf_counter() - stage_started
+    notify("crew_finished", content)
+
+    sections = parse_sections(content)
+    examples = find_examples(topic, content)
+    stage_started = time.perf_counter()
+    raise_if_cancelled(cancel_token)
+    codes, code_reused = generate_section_codes(
+        llm, topic, sections, lambda fraction: notify("section_code", fraction), examples, cancel_token
+    )
+    timings["code"] = time.perf_counter() - stage_started
+    timings["llm"] = timings["content"] + timings["code"]
+
+    stage_started = time.perf_counter()
+    manim_code = None
+    if all(codes):
+        try:
+            manim_code = ManimCodeOutput(code=stitch_scene_module(sections, codes), scene_name="MainScene")
+        except SyntaxError:
+            manim_code = None
+    timings["extract"] = time.perf_counter() - stage_started
+    notify("code_extracted", manim_code)
+
+    raise_if_cancelled(cancel_token)
+    response = None
+    if manim_code:
+        notify("render_started", manim_code)
+        stage_started = time.perf_counter()
+        response = render(manim_code, api_url, cancel_token=cancel_token, client_id=client_id,
+                          on_progress=lambda progress: notify("render_progress", progress))
+        timings["render"] = time.perf_counter() - stage_started
+        notify("render_finished", response)
+
+    rendered = bool(response and "video_id" in response)
+    if not storyboard:
+        record_generation_outcome(topic, content, manim_code, rendered, llm, examples)
+    timings["total"] = time.perf_counter() - started
+    return {
+        "content": content,
+        "manim_code": manim_code,
+        "render": response,
+        "timings": timings,
+        "stats": {"sections": len(sections), "code_reused": code_reused},
+        "queue_wait": getattr(llm, "queue_wait", 0.0),
+        "llm_usage": llm_usage(llm),
+        "tier": getattr(llm, "tier", None),
+    }
+
+# Download a rendered video from the /video endpoint (or the replay fixtures)
+def fetch_video(api_url, video_id):
+    source = video_source(api_url, video_id)
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            return f.read()
+    response = requests.get(source)
+    if response.status_code != 200:
+        return None
+    return response.content
+
+# Section-level generation: only sections whose content changed are regenerated and
+# re-rendered; the rest come from the section cache and the video is re-stitched.
+# Pass `content` to skip the content task (e.g. after the user edited it).
+def run_incremental_generation(topic, llm, api_url, content=None, render=None, on_event=None, cancel_token=None,
+                               client_id=None):
+    render = render or render_manim_code
+    llm.cancel_token = cancel_token
+    notify = on_event or (lambda stage, payload=None: None)
+    cache = get_section_cache()
+    timings = {}
+    started = time.perf_counter()
+
+    content_generator_agent, manim_developer_agent = create_agents(llm)
+
+    if content is None:
+        notify("crew_started")
+        stage_started = time.perf_counter()
+        content = generate_content(content_generator_agent, manim_developer_agent, topic)
+        timings["content"] = time.perf_counter() - stage_started
+    notify("crew_finished", content)
+
+    sections = parse_sections(content)
+    stats = {"sections": len(sections), "code_reused": 0, "clips_reused": 0}
+
+    # Section code: cached by section content, missing sections generated concurrently
+    stage_started = time.perf_counter()
+    examples = find_examples(topic, content)
+    raise_if_cancelled(cancel_token)
+    section_codes, stats["code_reused"] = generate_section_codes(
+        llm, topic, sections, lambda fraction: notify("section_code", fraction), examples, cancel_token
+    )
+    timings["llm"] = time.perf_counter() - stage_started
+    if not all(section_codes):
+        notify("code_extracted", None)
+        return {"content": content, "manim_code": None, "video_path": None,
+                "timings": timings, "stats": stats, "queue_wait": getattr(llm, "queue_wait", 0.0),
+                "llm_usage": llm_usage(llm), "tier": getattr(llm, "tier", None)}
+
+    combined = ManimCodeOutput(code="\n\n".join(section_codes), scene_name=sections[0].class_name)
+    notify("code_extracted", combined)
+
+    # Section clips: cached by section code
+    notify("render_started", combined)
+    stage_started = time.perf_counter()
+    clip_paths = []
+    for index, (section, code) in enumerate(zip(sections, section_codes)):
+        clip_path = cache.get_clip(code)
+        if clip_path:
+            stats["clips_reused"] += 1
+        else:
+            response = render(ManimCodeOutput(code=code, scene_name=section.class_name), api_url,
+                              cancel_token=cancel_token, client_id=client_id,
+                              on_progress=lambda progress, section=index + 1: notify(
+                                  "render_progress", {**progress, "section": section, "sections": len(sections)}))
+            data = fetch_video(api_url, response["video_id"]) if response and "video_id" in response else None
+            if not data:
+                notify("render_finished", None)
+                return {"content": content, "manim_code": combined, "video_path": None,
+                        "timings": timings, "stats": stats, "queue_wait": getattr(llm, "queue_wait", 0.0),
+                        "llm_usage": llm_usage(llm), "tier": getattr(llm, "tier", None)}
+            clip_path = cache.put_clip(code, data)
+        clip_paths.append(clip_path)
+        notify("section_render", (index + 1) / len(sections))
+
+    video_path = os.path.join(cache.video_dir, hash_text("".join(clip_paths)) + ".mp4")
+    if not os.path.exists(video_path):
+        stitch_clips(clip_paths, video_path)
+    timings["render"] = time.perf_counter() - stage_started
+    notify("render_finished", {"video_path": video_path})
+    record_generation_outcome(
+        topic, content, ManimCodeOutput(code=stitch_scene_module(sections, section_codes), scene_name="MainScene"),
+        True, llm, examples
+    )
+
+    timings["total"] = time.perf_counter() - started
+    return {
+        "content": content,
+        "manim_code": combined,
+        "video_path": video_path,
+        "timings": timings,
+        "stats": stats,
+        "queue_wait": getattr(llm, "queue_wait", 0.0),
+        "llm_usage": llm_usage(llm),
+        "tier": getattr(llm, "tier", None),
+    }
+
+# Earlier generation for the same or a near-duplicate topic whose video can still be served
+def lookup_cached_generation(topic, api_url):
+    cache = get_topic_cache()
+    entry = cache.get(topic)
+    if not entry:
+        return None
+    if entry.get("video_path"):
+        available = os.path.exists(entry["video_path"])
+    else:
+        available = entry.get("api_url") == api_url and video_available(api_url, entry["video_id"])
+    if not available:
+        if entry.get("video_path") or entry.get("api_url") == api_url:
+            cache.invalidate(entry["canonical"])
+        return None
+    entry["manim_code"] = ManimCodeOutput(code=entry["code"], scene_name=entry.get("scene_name", "MainScene"))
+    return entry
+
+# Remember a finished generation under its canonical topic
+def store_cached_generation(topic, content, manim_code, api_url, video_id=None, video_path=None):
+    get_topic_cache().put(topic, {
+        "content": content,
+        "code": manim_code.code,
+        "scene_name": manim_code.scene_name,
+        "api_url": api_url,
+        "video_id": video_id,
+        "video_path": video_path,
+    })
+
+# Persist a generation job and its stage timings in the shared store. Call once with
+# status "running" when it starts and again with the result (or error) when it ends.
+# reclaimed is the compute a cancelled job's token saved (see cancellation.CancelToken).
+def record_generation(job_id, session_id, topic, mode, api_url, status, result=None, error=None, reclaimed=None):
+    store = get_store()
+    if reclaimed is not None:
+        store.record_stage(job_id, "cancelled", **reclaimed)
+    fields = {"session_id": session_id, "topic": topic, "canonical_topic": canonicalize(topic),
+              "mode": mode, "status": status, "api_url": api_url, "error": error}
+    if result:
+        manim_code = result.get("manim_code")
+        response = result.get("render") or {}
+        fields.update(content=result.get("content"), video_id=response.get("video_id"),
+                      video_path=result.get("video_path"))
+        if manim_code:
+            fields.update(code=manim_code.code, scene_name=manim_code.scene_name, code_hash=hash_text(manim_code.code))
+        for stage, duration in result.get("timings", {}).items():
+            store.record_stage(job_id, stage, duration)
+        if "queue_wait" in result:
+            store.record_stage(job_id, "queue_wait", result["queue_wait"])
+        # One "llm_<agent>" stage per agent: its time in LLM calls, tokens and cost, by tier
+        for agent, usage in result.get("llm_usage", {}).items():
+            store.record_stage(job_id, f"llm_{agent}", usage["seconds"], tier=result.get("tier"),
+                               **{key: value for key, value in usage.items() if key != "seconds"})
+        if fields.get("video_id"):
+            store.record_artifact(job_id, "video", fields["video_id"], fields.get("code_hash"))
+        elif fields.get("video_path"):
+            store.record_artifact(job_id, "video_file", fields["video_path"], fields.get("code_hash"))
+        # A "render_warmup" stage when a warm-up ping ran into the service's cold start:
+        # its duration is the part of the cold start that passed before the render needed it
+        warmup = response.get("warmup")
+        if warmup:
+            store.record_stage(job_id, "render_warmup", warmup["hidden_seconds"],
+                               **{key: value for key, value in warmup.items() if key != "hidden_seconds"})
+        # One "render_backend_<name>" stage per render: which backend served it, and how long it took
+        if response.get("backend"):
+            store.record_stage(job_id, f"render_backend_{response['backend']}", response.get("backend_seconds"))
+        render_job = response.get("job") or {}
+        if render_job:
+            store.record_stage(job_id, "render_queue", render_job.get("queue_wait"),
+                               depth=render_job.get("queue_depth"))
+    if status != "running":
+        record_outcome(store, job_id, mode, status, result, error)
+    store.record_job(job_id, **{key: value for key, value in fields.items() if value is not None})
+
+# Why a generation failed, for the operations page
+def failure_category(status, result, error):
+    if status == "error":
+        return "deadline" if error and "exceeded its deadline" in error else "exception"
+    if status != "failed":
+        return None
+    if not (result or {}).get("manim_code"):
+        return "no_code"
+    return ((result or {}).get("render") or {}).get("violation") or "render"
+
+# Hits and lookups of each cache a generation went through, as {cache: [hits, lookups]}
+def cache_usage(mode, result):
+    usage = {}
+    if mode == "cached":
+        usage["topic"] = [1, 1]
+    elif "timings" in result and mode != "warm":
+        usage["topic"] = [0, 1]
+    stats = result.get("stats") or {}
+    if stats.get("sections"):
+        usage["section_code"] = [stats.get("code_reused", 0), stats["sections"]]
+        if "clips_reused" in stats:
+            usage["section_clip"] = [stats["clips_reused"], stats["sections"]]
+    response = result.get("render") or {}
+    preflight = (response.get("job") or {}).get("preflight") or {}
+    if preflight.get("expressions") and not preflight.get("skipped"):
+        usage["tex"] = [max(0, preflight["expressions"] - preflight.get("compiled", 0)), preflight["expressions"]]
+    if response.get("partials_reused") is not None and response.get("job"):
+        estimate = response["job"].get("estimate") or {}
+        animations = (estimate.get("plays") or 0) + (estimate.get("waits") or 0)
+        if animations:
+            usage["partial_movie"] = [min(response["partials_reused"], animations), animations]
+    return usage
+
+# One "outcome" stage per finished generation: status, failure category, LLM cost and
+# cache use. The operations page aggregates these (see ops_metrics.py).
+def record_outcome(store, job_id, mode, status, result, error):
+    result = result or {}
+    usage = result.get("llm_usage", {}).values()
+    store.record_stage(
+        job_id, "outcome", mode=mode, status=status, category=failure_category(status, result, error),
+        cost=sum(agent.get("cost", 0.0) for agent in usage),
+        tokens=sum(agent.get("prompt_tokens", 0) + agent.get("completion_tokens", 0) for agent in usage),
+        caches=cache_usage(mode, result),
+    )
+
+# Finished generations of a session, newest first, ready to show again
+def generation_history(session_id, limit=10):
+    history = []
+    for job in get_store().recent_jobs(session_id=session_id, status="done", limit=limit):
+        if job.get("video_path") and not os.path.exists(job["video_path"]):
+            continue
+        job["manim_code"] = ManimCodeOutput(code=job["code"], scene_name=job.get("scene_name") or "MainScene") \
+            if job.get("code") else None
+        history.append(job)
+    return history
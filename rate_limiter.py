@@ -0,0 +1,162 @@
+import heapq
+import os
+import threading
+import time
+from collections import deque
+
+# Priorities for queued LLM calls (lower value is served first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Anthropic account limits shared by every session in this process
+REQUESTS_PER_MINUTE = int(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50"))
+TOKENS_PER_MINUTE = int(os.getenv("ANTHROPIC_TOKENS_PER_MINUTE", "80000"))
+
+# How often queued calls with a cancel token check it
+CANCEL_POLL_SECONDS = 0.5
+
+# Rough characters-per-token ratio used for estimates
+CHARS_PER_TOKEN = 4
+
+
+# Estimate the token count of a prompt string
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return len(str(text)) // CHARS_PER_TOKEN + 1
+
+
+# Estimate the tokens of a chat message list (or a raw prompt string)
+def estimate_message_tokens(messages):
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    total = 0
+    for message in messages or []:
+        content = message.get("content", "") if isinstance(message, dict) else message
+        total += estimate_tokens(content)
+    return total
+
+
+# Classic token bucket refilled continuously
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated = now
+
+    # Seconds until `amount` tokens are available (0 if available now)
+    def time_until(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+# Process-wide limiter for requests/minute and tokens/minute with a fair priority queue.
+# Within a priority level, sessions are served in start-time fair order so one busy
+# session cannot starve the others.
+class RateLimiter:
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = 0
+        self._virtual_clock = 0
+        self._session_clock = {}
+        self._backoff_until = 0.0
+        self.wait_times = deque(maxlen=1000)
+
+    # Block until the call may be sent; returns the seconds spent waiting in the queue.
+    # A cancelled cancel_token leaves the queue early by raising CancelledError.
+    def acquire(self, estimated_tokens, session_id="default", priority=PRIORITY_INTERACTIVE, cancel_token=None):
+        enqueued = time.monotonic()
+        # Waiters with a token wake up periodically to notice cancellation
+        poll = CANCEL_POLL_SECONDS if cancel_token is not None else None
+        with self._cond:
+            virtual_start = max(self._virtual_clock, self._session_clock.get(session_id, 0))
+            self._session_clock[session_id] = virtual_start + 1
+            self._sequence += 1
+            ticket = (priority, virtual_start, self._sequence)
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    if self._queue[0] != ticket:
+                        self._cond.wait(poll)
+                        continue
+                    now = time.monotonic()
+                    delay = max(
+                        self.request_bucket.time_until(1, now),
+                        self.token_bucket.time_until(estimated_tokens, now),
+                        self._backoff_until - now,
+                    )
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, poll) if poll else delay)
+                self.request_bucket.consume(1, now)
+                self.token_bucket.consume(estimated_tokens, now)
+                self._virtual_clock = max(self._virtual_clock, virtual_start)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+        waited = time.monotonic() - enqueued
+        self.wait_times.append(waited)
+        return waited
+
+    # Pause every queued call after the API answered 429
+    def penalize(self, retry_after=None):
+        with self._cond:
+            pause = retry_after if retry_after else 60.0 / max(self.request_bucket.capacity, 1)
+            self._backoff_until = max(self._backoff_until, time.monotonic() + pause)
+            self.token_bucket.tokens = min(self.token_bucket.tokens, 0)
+            self._cond.notify_all()
+
+    # Snapshot of the queue for status displays
+    def stats(self):
+        with self._cond:
+            waits = sorted(self.wait_times)
+            queued = len(self._queue)
+        if not waits:
+            return {"queued": queued, "calls": 0, "avg_wait": 0.0, "p95_wait": 0.0}
+        return {
+            "queued": queued,
+            "calls": len(waits),
+            "avg_wait": sum(waits) / len(waits),
+            "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+        }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+# Shared limiter for the whole process (all Streamlit sessions)
+def get_rate_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+# Replace the shared limiter, e.g. with time-scaled limits for load tests
+def configure_rate_limiter(requests_per_minute, tokens_per_minute):
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiter
@@ -0,0 +1,253 @@
+import importlib.util
+import os
+import threading
+import time
+import requests
+from cancellation import CancelledError, raise_if_cancelled
+from hedging import get_latency_tracker
+from manim_render import RENDER_OUTPUT_DIR, WARM_POOL_SIZE, WarmProcessPool, render_manim_locally
+from render_cost import estimate_render_cost
+from render_progress import RenderProgress
+
+# Where renders go: "remote" (the rendering service), "local" (a Manim subprocess per
+# render), "pool" (local, in pre-started Manim processes) or "auto" (remote, failing
+# over to the local pool while the service is cold, slow or erroring)
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "remote")
+
+# Local renders that may run at once in this process, and how long one may take
+LOCAL_RENDER_WORKERS = int(os.getenv("LOCAL_RENDER_WORKERS", "1"))
+LOCAL_RENDER_TIMEOUT = float(os.getenv("LOCAL_RENDER_TIMEOUT", "600"))
+
+# A service that does not answer /health within this is treated as cold
+RENDER_HEALTH_TIMEOUT = float(os.getenv("RENDER_HEALTH_TIMEOUT", "3"))
+# Health probe results are reused this long
+HEALTH_CACHE_SECONDS = 30
+# A remote render slower than this marks the service as slow
+REMOTE_SLOW_SECONDS = float(os.getenv("REMOTE_SLOW_SECONDS", "300"))
+# How long renders stay local after the service was found cold, slow or erroring,
+# before it is probed again
+RENDER_FAILOVER_SECONDS = float(os.getenv("RENDER_FAILOVER_SECONDS", "300"))
+
+# How often a local render reports progress
+LOCAL_PROGRESS_SECONDS = 1.0
+
+
+# Whether a rendering service is up. The service's documented contract is only /render
+# and /video/{id}, so /health is asked but any answer below 500 (a 404 included) counts:
+# it took a running server to send it. A timeout, a refused connection or a 5xx from the
+# host's proxy (e.g. while an instance boots) does not.
+def service_alive(api_url, timeout):
+    try:
+        return requests.get(f"{api_url.rstrip('/')}/health", timeout=timeout).status_code < 500
+    except Exception:
+        return False
+
+
+# The rendering service over HTTP. `render` is pipeline.render_manim_code (passed in,
+# since the pipeline imports this module).
+class RemoteBackend:
+    name = "remote"
+
+    def __init__(self, render, health_timeout=RENDER_HEALTH_TIMEOUT):
+        self._render = render
+        self.health_timeout = health_timeout
+        self._lock = threading.Lock()
+        self._health = {}
+
+    def available(self):
+        return True
+
+    # Whether the service answered in time (see service_alive); fresh=False reuses a recent probe
+    def healthy(self, api_url, fresh=False):
+        api_url = api_url.rstrip('/')
+        now = time.monotonic()
+        with self._lock:
+            checked = self._health.get(api_url)
+        if checked and not fresh and now - checked[0] < HEALTH_CACHE_SECONDS:
+            return checked[1]
+        healthy = service_alive(api_url, self.health_timeout)
+        with self._lock:
+            self._health[api_url] = (time.monotonic(), healthy)
+        return healthy
+
+    def render(self, manim_code, api_url, cancel_token=None, on_progress=None, client_id=None):
+        return self._render(manim_code, api_url, cancel_token=cancel_token, on_progress=on_progress,
+                            client_id=client_id)
+
+
+# Manim in a sandboxed subprocess of this process (see manim_render.py), optionally
+# in pre-started processes that already imported Manim. Videos land in
+# RENDER_OUTPUT_DIR, where pipeline.video_source finds them.
+class LocalBackend:
+    def __init__(self, warm_pool=None, workers=LOCAL_RENDER_WORKERS, timeout=LOCAL_RENDER_TIMEOUT,
+                 output_dir=RENDER_OUTPUT_DIR):
+        self.warm_pool = warm_pool
+        self.name = "pool" if warm_pool else "local"
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self._slots = threading.BoundedSemaphore(workers)
+
+    # Manim has to be installed for a local render
+    def available(self):
+        return importlib.util.find_spec("manim") is not None
+
+    def healthy(self, api_url, fresh=False):
+        return self.available()
+
+    # Returns {"video_id", "video_path", "scenes_rendered", "partials_reused", "job"} like the
+    # service, {"error", "violation"} if Manim failed for a reason worth showing, or None.
+    # client_id is accepted for the common signature; local renders share one queue.
+    def render(self, manim_code, api_url, cancel_token=None, on_progress=None, client_id=None):
+        raise_if_cancelled(cancel_token)
+        estimate = estimate_render_cost(manim_code.code, manim_code.scene_name)
+        progress = RenderProgress(estimate.plays + estimate.waits if estimate else None,
+                                  estimate.render_cpu_seconds if estimate else None)
+        cancel_event = threading.Event()
+        unregister = cancel_token.on_cancel(cancel_event.set) if cancel_token is not None else (lambda: None)
+        done = threading.Event()
+        if on_progress is not None:
+            threading.Thread(target=self._report_progress, args=(progress, on_progress, done), daemon=True).start()
+        queued = time.monotonic()
+        try:
+            with self._slots:
+                raise_if_cancelled(cancel_token)
+                queue_wait = time.monotonic() - queued
+                result = render_manim_locally(manim_code.code, manim_code.scene_name, self.output_dir,
+                                              timeout=self.timeout, cancel_event=cancel_event, progress=progress,
+                                              warm_pool=self.warm_pool)
+        finally:
+            done.set()
+            unregister()
+        raise_if_cancelled(cancel_token)
+        job = {"estimate": estimate.to_dict() if estimate else None, "progress": progress.snapshot(),
+               "queue_wait": queue_wait}
+        if result.get("success"):
+            return {"video_id": result["video_id"], "video_path": result["video_path"],
+                    "scenes_rendered": [manim_code.scene_name or "MainScene"],
+                    "partials_reused": result.get("partials_reused"), "job": job}
+        if result.get("violation") not in (None, "error"):
+            return {"error": result.get("error"), "violation": result["violation"], "job": job}
+        return None
+
+    @staticmethod
+    def _report_progress(progress, on_progress, done):
+        while not done.wait(LOCAL_PROGRESS_SECONDS):
+            try:
+                on_progress(progress.snapshot())
+            except Exception:
+                pass
+
+
+# Sends each render to the configured backend and keeps per-backend latency. In "auto"
+# the remote service is used while it is healthy; when its health probe fails, a render
+# errors out while the service is unreachable, or a render takes longer than
+# REMOTE_SLOW_SECONDS, renders go to the local backend for RENDER_FAILOVER_SECONDS and
+# the service is probed again after that.
+class RenderRouter:
+    def __init__(self, remote_render, mode=RENDER_BACKEND, warm_pool_size=WARM_POOL_SIZE):
+        self.mode = mode
+        self.backends = {"remote": RemoteBackend(remote_render)}
+        if mode in ("local", "pool", "auto"):
+            local = LocalBackend()
+            if mode != "local" and warm_pool_size and local.available():
+                local = LocalBackend(warm_pool=WarmProcessPool(warm_pool_size))
+            self.backends[local.name] = local
+        self._lock = threading.Lock()
+        self._remote_down_until = 0.0
+        self.failovers = 0
+        # {"reason", "at"} of the most recent failover, for the operations page
+        self.last_failover = None
+        self.counts = {name: {"renders": 0, "failures": 0} for name in self.backends}
+
+    @property
+    def local(self):
+        return self.backends.get("pool") or self.backends.get("local")
+
+    def _mark_remote_down(self, reason):
+        with self._lock:
+            self._remote_down_until = time.monotonic() + RENDER_FAILOVER_SECONDS
+            self.failovers += 1
+            self.last_failover = {"reason": reason, "at": time.time()}
+
+    def _remote_usable(self, api_url):
+        with self._lock:
+            down = time.monotonic() < self._remote_down_until
+        if down:
+            return False
+        if not self.backends["remote"].healthy(api_url):
+            self._mark_remote_down("is cold or unreachable")
+            return False
+        return True
+
+    # Backend for the next render
+    def choose(self, api_url):
+        if self.mode == "remote":
+            return self.backends["remote"]
+        if self.mode in ("local", "pool"):
+            return self.local
+        if not self.local.available() or self._remote_usable(api_url):
+            return self.backends["remote"]
+        return self.local
+
+    def _timed(self, backend, manim_code, api_url, cancel_token, on_progress, client_id):
+        started = time.perf_counter()
+        try:
+            response = backend.render(manim_code, api_url, cancel_token=cancel_token, on_progress=on_progress,
+                                      client_id=client_id)
+        except CancelledError:
+            raise
+        except Exception:
+            response = None
+        seconds = time.perf_counter() - started
+        get_latency_tracker(f"render:{backend.name}").observe(seconds)
+        with self._lock:
+            self.counts[backend.name]["renders"] += 1
+            if not (response and "video_id" in response):
+                self.counts[backend.name]["failures"] += 1
+        if response is not None:
+            response["backend"] = backend.name
+            response["backend_seconds"] = seconds
+        return response, seconds
+
+    # Same signature and response as pipeline.render_manim_code, plus "backend" (which
+    # backend rendered) and "backend_seconds"
+    def render(self, manim_code, api_url, cancel_token=None, on_progress=None, client_id=None):
+        backend = self.choose(api_url)
+        response, seconds = self._timed(backend, manim_code, api_url, cancel_token, on_progress, client_id)
+        if self.mode != "auto" or backend.name != "remote" or not self.local.available():
+            return response
+        if response is None and not self.backends["remote"].healthy(api_url, fresh=True):
+            # Failed because the service went away rather than because of the scene: render it here
+            self._mark_remote_down("is erroring")
+            raise_if_cancelled(cancel_token)
+            response, _ = self._timed(self.local, manim_code, api_url, cancel_token, on_progress, client_id)
+        elif seconds > REMOTE_SLOW_SECONDS:
+            self._mark_remote_down(f"took {seconds:.0f}s to render")
+        return response
+
+    # Renders, failures and latency percentiles per backend
+    def stats(self):
+        stats = {}
+        for name, counts in self.counts.items():
+            tracker = get_latency_tracker(f"render:{name}")
+            stats[name] = {**counts, "p50": tracker.percentile(50), "p95": tracker.percentile(95)}
+            pool = getattr(self.backends[name], "warm_pool", None)
+            if pool:
+                stats[name]["warm_pool"] = pool.stats()
+        with self._lock:
+            return {"mode": self.mode, "failovers": self.failovers, "last_failover": self.last_failover,
+                    "remote_down_for": max(0.0, self._remote_down_until - time.monotonic()), "backends": stats}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+# The process-wide router (its warm pool and health state are shared by every session).
+# Without remote_render, the router if one was created, else None.
+def get_render_router(remote_render=None):
+    global _router
+    with _router_lock:
+        if _router is None and remote_render is not None:
+            _router = RenderRouter(remote_render)
+        return _router
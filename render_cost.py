@@ -0,0 +1,222 @@
+import ast
+import os
+
+# Manim defaults: self.play lasts 1s unless run_time is given, self.wait() lasts 1s
+DEFAULT_PLAY_SECONDS = 1.0
+DEFAULT_WAIT_SECONDS = 1.0
+
+# Loops with a bound we cannot read statically are assumed to run this often
+UNKNOWN_LOOP_ITERATIONS = 3
+
+# Cost model (medium quality, 30 fps), tuned from local renders
+FRAME_RATE = 30
+SECONDS_PER_FRAME = 0.02
+SECONDS_PER_FRAME_PER_MOBJECT = 0.002
+SECONDS_PER_TEX = 1.5
+RENDER_OVERHEAD_SECONDS = 5.0
+
+# Admission limits for the render queue
+MAX_VIDEO_SECONDS = float(os.getenv("MAX_VIDEO_SECONDS", "600"))
+MAX_RENDER_CPU_SECONDS = float(os.getenv("MAX_RENDER_CPU_SECONDS", "1800"))
+
+TEX_CLASSES = {"Tex", "MathTex", "SingleStringMathTex", "BulletedList", "Title", "DecimalMatrix",
+               "IntegerMatrix", "Matrix", "MathTable"}
+TEXT_CLASSES = {"Text", "MarkupText", "Paragraph", "Code"}
+ANIMATION_CLASSES = {
+    "Write", "Create", "Uncreate", "FadeIn", "FadeOut", "Transform", "ReplacementTransform",
+    "TransformMatchingTex", "TransformMatchingShapes", "GrowFromCenter", "GrowArrow",
+    "DrawBorderThenFill", "Indicate", "Circumscribe", "Flash", "Wiggle", "ShowPassingFlash",
+    "AnimationGroup", "LaggedStart", "Succession", "Rotate", "MoveAlongPath", "ApplyMethod",
+    "FocusOn", "Unwrite", "SpinInFromNothing", "ShrinkToCenter", "FadeTransform", "Wait",
+}
+
+
+# Static cost summary for one scene
+class CostEstimate:
+    def __init__(self):
+        self.video_seconds = 0.0
+        self.plays = 0
+        self.waits = 0
+        self.tex_objects = 0
+        self.text_objects = 0
+        self.mobjects = 0
+
+    @property
+    def render_cpu_seconds(self):
+        frames = self.video_seconds * FRAME_RATE
+        per_frame = SECONDS_PER_FRAME + SECONDS_PER_FRAME_PER_MOBJECT * self.mobjects
+        return RENDER_OVERHEAD_SECONDS + frames * per_frame + self.tex_objects * SECONDS_PER_TEX
+
+    # Storyboards skip animation frames and encoding: one still per play plus LaTeX
+    @property
+    def storyboard_cpu_seconds(self):
+        return RENDER_OVERHEAD_SECONDS + self.plays * SECONDS_PER_FRAME + self.tex_objects * SECONDS_PER_TEX
+
+    def to_dict(self):
+        return {
+            "video_seconds": round(self.video_seconds, 1),
+            "render_cpu_seconds": round(self.render_cpu_seconds, 1),
+            "plays": self.plays,
+            "waits": self.waits,
+            "tex_objects": self.tex_objects,
+            "text_objects": self.text_objects,
+            "mobjects": self.mobjects,
+        }
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def _is_self_call(node, method):
+    return (isinstance(node.func, ast.Attribute) and node.func.attr == method
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == "self")
+
+
+def _number(node, default):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return float(node.value)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mult, ast.Add, ast.Sub, ast.Div)):
+        left, right = _number(node.left, None), _number(node.right, None)
+        if left is None or right is None:
+            return default
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        return left / right if right else default
+    return default
+
+
+def _keyword(node, name):
+    for keyword in node.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+# Statically read iteration counts of `for ... in range(...)` / literal sequences
+def _loop_iterations(node):
+    iterable = node.iter
+    if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+        return len(iterable.elts)
+    if isinstance(iterable, ast.Call) and _call_name(iterable) == "range":
+        numbers = [_number(arg, None) for arg in iterable.args]
+        if numbers and all(n is not None for n in numbers):
+            start, stop, step = (0.0, numbers[0], 1.0) if len(numbers) == 1 else (
+                numbers[0], numbers[1], numbers[2] if len(numbers) > 2 else 1.0)
+            if step:
+                return max(0, int((stop - start) / step))
+    if isinstance(iterable, ast.Call) and _call_name(iterable) == "enumerate" and iterable.args:
+        inner = ast.For(target=node.target, iter=iterable.args[0], body=[], orelse=[])
+        return _loop_iterations(inner)
+    return UNKNOWN_LOOP_ITERATIONS
+
+
+class _SceneWalker:
+    def __init__(self, methods):
+        self.methods = methods
+        self.estimate = CostEstimate()
+        self._stack = []
+
+    def walk_method(self, name, multiplier=1):
+        if name not in self.methods or name in self._stack:
+            return
+        self._stack.append(name)
+        self.walk_body(self.methods[name].body, multiplier)
+        self._stack.pop()
+
+    def walk_body(self, statements, multiplier):
+        for statement in statements:
+            self.walk(statement, multiplier)
+
+    def walk(self, node, multiplier):
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            self.walk_body(node.body, multiplier * _loop_iterations(node))
+            self.walk_body(node.orelse, multiplier)
+            return
+        if isinstance(node, ast.While):
+            self.walk_body(node.body, multiplier * UNKNOWN_LOOP_ITERATIONS)
+            return
+        if isinstance(node, ast.Call):
+            self.visit_call(node, multiplier)
+        for child in ast.iter_child_nodes(node):
+            self.walk(child, multiplier)
+
+    def visit_call(self, node, multiplier):
+        estimate = self.estimate
+        name = _call_name(node)
+        if _is_self_call(node, "play"):
+            estimate.plays += multiplier
+            run_time = _keyword(node, "run_time")
+            estimate.video_seconds += multiplier * _number(run_time, DEFAULT_PLAY_SECONDS)
+        elif _is_self_call(node, "wait"):
+            estimate.waits += multiplier
+            duration = node.args[0] if node.args else _keyword(node, "duration")
+            estimate.video_seconds += multiplier * _number(duration, DEFAULT_WAIT_SECONDS)
+        elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) \
+                and node.func.value.id == "self" and name in self.methods:
+            self.walk_method(name, multiplier)
+        elif name in TEX_CLASSES:
+            estimate.tex_objects += multiplier
+            estimate.mobjects += multiplier
+        elif name in TEXT_CLASSES:
+            estimate.text_objects += multiplier
+            estimate.mobjects += multiplier
+        elif name and name[0].isupper() and name not in ANIMATION_CLASSES:
+            estimate.mobjects += multiplier
+
+
+# Predict video length and render CPU seconds of a scene from its source code.
+# Returns None when the code does not parse or has no such scene.
+def estimate_render_cost(code, scene_name="MainScene"):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    scene = classes.get(scene_name or "MainScene")
+    if scene is None:
+        return None
+
+    # Methods visible on the scene, including those inherited from scenes in this module
+    methods = {}
+    pending = [scene]
+    while pending:
+        cls = pending.pop(0)
+        for item in cls.body:
+            if isinstance(item, ast.FunctionDef):
+                methods.setdefault(item.name, item)
+        pending.extend(classes[base.id] for base in cls.bases
+                       if isinstance(base, ast.Name) and base.id in classes)
+
+    walker = _SceneWalker(methods)
+    # Stitched scenes call each section's construct explicitly: Section_x.construct(self)
+    for statement in ast.walk(methods.get("construct", ast.Module(body=[], type_ignores=[]))):
+        if isinstance(statement, ast.Call) and isinstance(statement.func, ast.Attribute) \
+                and statement.func.attr == "construct" and isinstance(statement.func.value, ast.Name) \
+                and statement.func.value.id in classes:
+            section = classes[statement.func.value.id]
+            for item in section.body:
+                if isinstance(item, ast.FunctionDef) and item.name == "construct":
+                    methods[f"{section.name}.construct"] = item
+                    walker.walk_method(f"{section.name}.construct")
+    walker.walk_method("construct")
+    return walker.estimate
+
+
+# Admission check: None if the job may be queued, otherwise the reason it is rejected
+def admission_error(estimate, max_video_seconds=MAX_VIDEO_SECONDS, max_cpu_seconds=MAX_RENDER_CPU_SECONDS):
+    if estimate is None:
+        return None
+    if estimate.video_seconds > max_video_seconds:
+        return f"Predicted video length {estimate.video_seconds:.0f}s exceeds the {max_video_seconds:.0f}s limit"
+    if estimate.render_cpu_seconds > max_cpu_seconds:
+        return f"Predicted render time {estimate.render_cpu_seconds:.0f}s exceeds the {max_cpu_seconds:.0f}s budget"
+    return None
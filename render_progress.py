@@ -0,0 +1,81 @@
+import re
+import threading
+import time
+
+# Manim's progress lines on stderr. Each self.play draws a tqdm bar
+# "Animation 3: Write(MathTex('a^2')):  45%|####5     | 27/60 [00:01<00:01, 21.3it/s]",
+# each self.wait one described "Waiting 4", and animations served from the partial
+# movie cache log "Animation 5 : Using cached data (hash : ...)" instead.
+BAR_PATTERN = re.compile(r'(?:Animation|Waiting)\s+(\d+)\b.*?\|\s*(\d+)/(\d+)')
+CACHED_PATTERN = re.compile(r'Animation\s+(\d+)\s*:\s*Using cached data')
+
+# Below this fraction done, the ETA comes from the predicted cost rather than the pace so far
+MIN_PACE_FRACTION = 0.05
+
+# Longest unterminated line kept between chunks (a bar line is well under this)
+MAX_PARTIAL_CHARS = 4096
+
+
+# Percent complete and ETA of one render, built from Manim's output as it streams in.
+# `total_animations` (plays plus waits of the static estimate) is raised if the scene
+# turns out to have more; `predicted_seconds` bounds the ETA before there is a pace.
+class RenderProgress:
+    def __init__(self, total_animations=None, predicted_seconds=None):
+        self.total_animations = total_animations
+        self.predicted_seconds = predicted_seconds
+        self.animation = None
+        self.frame = 0
+        self.frames = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._partial = ""
+
+    # Feed a chunk of stdout or stderr; tqdm redraws with "\r", the log with "\n"
+    def feed(self, text):
+        with self._lock:
+            lines = re.split(r'[\r\n]', self._partial + text)
+            self._partial = lines.pop()[-MAX_PARTIAL_CHARS:]
+            for line in lines:
+                self._parse(line)
+            # A redrawn bar has no line end until the next redraw, so read the tail as well
+            self._parse(self._partial)
+
+    def _parse(self, line):
+        cached = CACHED_PATTERN.search(line)
+        if cached:
+            self.animation, self.frame, self.frames = int(cached.group(1)), 1, 1
+            return
+        # Output written without a line end can run two bars together; the last one is current
+        bars = BAR_PATTERN.findall(line)
+        if bars:
+            self.animation, self.frame, self.frames = (int(value) for value in bars[-1])
+
+    # Fraction of the render done: finished animations plus the share of the current one
+    def fraction(self):
+        if self.animation is None:
+            return 0.0
+        total = max(self.total_animations or 0, self.animation + 1)
+        current = self.frame / self.frames if self.frames else 0.0
+        return min(1.0, (self.animation + current) / total)
+
+    def snapshot(self):
+        with self._lock:
+            done = self.fraction()
+            elapsed = time.monotonic() - self.started
+            if done >= MIN_PACE_FRACTION:
+                eta = elapsed * (1.0 - done) / done
+            elif self.predicted_seconds:
+                eta = max(0.0, self.predicted_seconds - elapsed)
+            else:
+                eta = None
+            animations = self.total_animations
+            if self.animation is not None:
+                animations = max(animations or 0, self.animation + 1)
+            return {
+                "animation": None if self.animation is None else self.animation + 1,
+                "animations": animations,
+                "frame": self.frame,
+                "frames": self.frames,
+                "percent": round(100.0 * done, 1),
+                "eta_seconds": None if eta is None else round(eta, 1),
+            }
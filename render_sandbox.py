@@ -0,0 +1,221 @@
+import codecs
+import os
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, only the wall-clock timeout applies
+    resource = None
+
+# Per-render resource caps (0 disables a cap)
+RENDER_CPU_SECONDS = int(os.getenv("RENDER_CPU_SECONDS", "900"))
+RENDER_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", "4096"))
+RENDER_MAX_FILE_MB = int(os.getenv("RENDER_MAX_FILE_MB", "1024"))
+# Counted per user, not per render, so it must leave room for everything else the user runs
+RENDER_MAX_PROCESSES = int(os.getenv("RENDER_MAX_PROCESSES", "512"))
+# Output a render may write to stdout and stderr together; only the tail of each is kept
+RENDER_MAX_OUTPUT_MB = int(os.getenv("RENDER_MAX_OUTPUT_MB", "64"))
+OUTPUT_TAIL_CHARS = 64 * 1024
+
+# Violation categories reported for failed runs
+VIOLATION_TIMEOUT = "timeout"
+VIOLATION_CPU = "cpu"
+VIOLATION_MEMORY = "memory"
+VIOLATION_FILE_SIZE = "file_size"
+VIOLATION_PROCESSES = "nproc"
+VIOLATION_OUTPUT = "output"
+VIOLATION_ERROR = "error"
+VIOLATION_CANCELLED = "cancelled"
+
+# How often a run with a cancel event checks it
+CANCEL_POLL_SECONDS = 0.25
+# How long to wait for output still buffered after the process exited
+READER_JOIN_SECONDS = 5
+
+VIOLATION_MESSAGES = {
+    VIOLATION_TIMEOUT: "Render timed out after {timeout}s",
+    VIOLATION_CPU: "Render exceeded the CPU limit of {cpu_seconds}s",
+    VIOLATION_MEMORY: "Render exceeded the memory limit of {memory_mb} MB",
+    VIOLATION_FILE_SIZE: "Render tried to write a file larger than {max_file_mb} MB",
+    VIOLATION_PROCESSES: "Render exceeded the process limit of {max_processes}",
+    VIOLATION_OUTPUT: "Render wrote more than {max_output_mb} MB of output",
+    VIOLATION_CANCELLED: "Render cancelled",
+}
+
+
+class SandboxLimits:
+    def __init__(self, cpu_seconds=RENDER_CPU_SECONDS, memory_mb=RENDER_MEMORY_MB,
+                 max_file_mb=RENDER_MAX_FILE_MB, max_processes=RENDER_MAX_PROCESSES,
+                 max_output_mb=RENDER_MAX_OUTPUT_MB):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_file_mb = max_file_mb
+        self.max_processes = max_processes
+        # Not an rlimit (pipes have none): run_sandboxed counts the output itself
+        self.max_output_mb = max_output_mb
+
+    # Runs in the child between fork and exec. The CPU hard limit sits a little above the
+    # soft one so the child gets SIGXCPU first and a SIGKILL only if it ignores that.
+    def apply(self):
+        if self.cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 5))
+        if self.memory_mb:
+            limit = self.memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if self.max_file_mb:
+            limit = self.max_file_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_FSIZE, (limit, limit))
+        if self.max_processes:
+            resource.setrlimit(resource.RLIMIT_NPROC, (self.max_processes, self.max_processes))
+
+
+# Name the limit a finished process ran into, or None if it exited cleanly
+def classify_exit(returncode, stderr, limits):
+    if returncode == 0:
+        return None
+    if returncode in (-signal.SIGXCPU, -signal.SIGKILL) and limits.cpu_seconds and "MemoryError" not in stderr:
+        # A SIGKILL we did not send is the CPU hard limit (the OOM killer aside)
+        return VIOLATION_CPU
+    if returncode == -signal.SIGXFSZ or "File too large" in stderr:
+        return VIOLATION_FILE_SIZE
+    if "MemoryError" in stderr or "Cannot allocate memory" in stderr or "std::bad_alloc" in stderr:
+        return VIOLATION_MEMORY
+    if "Resource temporarily unavailable" in stderr or "can't start new thread" in stderr:
+        return VIOLATION_PROCESSES
+    return VIOLATION_ERROR
+
+
+# Run a command in its own process group under rlimits and a wall-clock timeout.
+# On timeout the whole group (Manim plus any latex/ffmpeg children) is killed, so
+# the caller is freed at once instead of waiting on pipes held open by stragglers.
+# Output is read as it is produced and passed to on_output(stream, text) if given; only
+# the last OUTPUT_TAIL_CHARS of each stream are returned, and a run whose output passes
+# max_output_mb is killed. Returns {"returncode", "stdout", "stderr", "violation",
+# "message", "wall_seconds"}.
+# A process already started by spawn_sandboxed (e.g. a warm one, see manim_render.py)
+# can be passed as `process` instead of args; limits must be the ones it was spawned with.
+def run_sandboxed(args, cwd=None, env=None, timeout=None, limits=None, cancel_event=None, on_output=None,
+                  process=None):
+    limits = limits or SandboxLimits()
+    started = time.perf_counter()
+    process = process or spawn_sandboxed(args, cwd, env, limits)
+    output = _OutputCapture(process, limits.max_output_mb * 1024 * 1024)
+    readers = [
+        threading.Thread(target=_read_stream, args=(getattr(process, name), name, output, on_output),
+                         name=f"sandbox-{name}", daemon=True)
+        for name in output.tails
+    ]
+    for reader in readers:
+        reader.start()
+
+    deadline = started + timeout if timeout is not None else None
+    violation = None
+    while True:
+        wait = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        if cancel_event is not None:
+            wait = CANCEL_POLL_SECONDS if wait is None else min(wait, CANCEL_POLL_SECONDS)
+        try:
+            process.wait(timeout=wait)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                violation = VIOLATION_CANCELLED
+            elif deadline is not None and time.perf_counter() >= deadline:
+                violation = VIOLATION_TIMEOUT
+            else:
+                continue
+            kill_process_group(process)
+            process.wait()
+            break
+    for reader in readers:
+        reader.join(timeout=READER_JOIN_SECONDS)
+    stdout, stderr = output.tails["stdout"], output.tails["stderr"]
+    if violation is None and output.exceeded:
+        violation = VIOLATION_OUTPUT
+    violation = violation or classify_exit(process.returncode, stderr, limits)
+
+    # Stragglers left behind by a failed run must not keep burning CPU
+    if violation:
+        kill_process_group(process)
+
+    message = None
+    if violation and violation in VIOLATION_MESSAGES:
+        message = VIOLATION_MESSAGES[violation].format(timeout=timeout, **vars(limits))
+    return {
+        "returncode": process.returncode,
+        "stdout": stdout,
+        "stderr": stderr,
+        "violation": violation,
+        "message": message,
+        "wall_seconds": time.perf_counter() - started,
+    }
+
+
+# Start a command in its own process group under rlimits, with piped output (and stdin if asked)
+def spawn_sandboxed(args, cwd=None, env=None, limits=None, stdin=False):
+    limits = limits or SandboxLimits()
+    posix = os.name == "posix"
+    return subprocess.Popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE if stdin else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=posix,
+        preexec_fn=limits.apply if posix and resource else None,
+    )
+
+
+# The tail of a run's stdout and stderr, and the total bytes written to both. Once the
+# total passes max_bytes (0: no cap) the process group is killed.
+class _OutputCapture:
+    def __init__(self, process, max_bytes):
+        self.process = process
+        self.max_bytes = max_bytes
+        self.tails = {"stdout": "", "stderr": ""}
+        self.total_bytes = 0
+        self.exceeded = False
+        self._lock = threading.Lock()
+
+    # Returns False once the output cap was passed (the rest is drained and dropped)
+    def add(self, name, size, text):
+        with self._lock:
+            self.total_bytes += size
+            if self.exceeded:
+                return False
+            self.tails[name] = (self.tails[name] + text)[-OUTPUT_TAIL_CHARS:]
+            self.exceeded = bool(self.max_bytes) and self.total_bytes > self.max_bytes
+        if self.exceeded:
+            kill_process_group(self.process)
+        return not self.exceeded
+
+
+# Collect a pipe's output chunk by chunk as the child writes it
+def _read_stream(stream, name, output, on_output):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        while True:
+            data = stream.read1(65536)
+            text = decoder.decode(data, final=not data)
+            if output.add(name, len(data), text) and text and on_output:
+                on_output(name, text)
+            if not data:
+                break
+    except (OSError, ValueError):
+        pass
+    finally:
+        stream.close()
+
+
+def kill_process_group(process):
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
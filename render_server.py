@@ -0,0 +1,442 @@
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from manim_render import RENDER_OUTPUT_DIR, render_manim_locally, render_storyboard_locally
+from render_cost import admission_error, estimate_render_cost
+from render_progress import RenderProgress
+from tex_preflight import TEX_PREFLIGHT, invalid_tex_message, preflight_tex
+from video_postprocess import faststart_path, hls_dir, postprocess_video
+
+# Pool and queue sizing
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "32"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "600"))
+
+# Predicted CPU seconds a queued job is credited per second of waiting, so long
+# jobs still get their turn under shortest-job-first
+SJF_AGING_RATE = float(os.getenv("SJF_AGING_RATE", "1.0"))
+
+# Finished jobs remembered for status lookups
+MAX_FINISHED_JOBS = 1000
+
+VIDEO_ID_PATTERN = re.compile(r'^[0-9a-f]{8,64}$')
+HLS_FILE_PATTERN = re.compile(r'^(index\.m3u8|segment_\d+\.ts)$')
+FRAME_FILE_PATTERN = re.compile(r'^frame_\d+\.png$')
+CHUNK_SIZE = 256 * 1024
+
+
+class QueueFull(Exception):
+    pass
+
+
+# The job's predicted cost is over the admission budget
+class JobRejected(Exception):
+    pass
+
+
+# A render (kind "video") or storyboard (kind "storyboard") request waiting in or running on the pool
+class RenderJob:
+    def __init__(self, client_id, code, scene_name, estimate=None, kind="video", job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.client_id = client_id
+        self.code = code
+        self.scene_name = scene_name or "MainScene"
+        self.kind = kind
+        self.estimate = estimate
+        # Unparseable code fails within seconds, so it is treated as cheap
+        self.predicted_cost = 0.0
+        if estimate:
+            self.predicted_cost = estimate.storyboard_cpu_seconds if kind == "storyboard" else estimate.render_cpu_seconds
+        self.status = "queued"
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        # Set by RenderScheduler.cancel; the sandbox kills the running render when it sees it
+        self.cancel_event = threading.Event()
+        # Parsed from Manim's output while a video renders
+        self.progress = None
+        # LaTeX compiled ahead of the render (see tex_preflight.py)
+        self.preflight = None
+        # Jobs already queued when this one was submitted
+        self.queue_depth = 0
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "queue_wait": (self.started or time.time()) - self.submitted,
+            "queue_depth": self.queue_depth,
+            "render_time": (self.finished - self.started) if self.finished and self.started else None,
+            "estimate": self.estimate.to_dict() if self.estimate else None,
+            "violation": (self.result or {}).get("violation"),
+            "progress": self.progress.snapshot() if self.progress else None,
+            "preflight": self.preflight,
+        }
+
+
+# Bounded job queue served by a fixed pool of render workers. Jobs are costed statically
+# on submit; those over the budget are rejected before they take a slot. Each client has
+# its own queue ordered by predicted cost, and workers take the cheapest client head
+# (less an aging credit for time waited), with ties going round-robin over clients.
+# Each worker runs one sandboxed Manim subprocess at a time (see render_sandbox.py),
+# after compiling the scene's LaTeX in parallel; jobs with invalid LaTeX fail there.
+class RenderScheduler:
+    def __init__(self, workers=RENDER_WORKERS, queue_size=RENDER_QUEUE_SIZE,
+                 timeout=RENDER_TIMEOUT, output_dir=RENDER_OUTPUT_DIR, aging_rate=SJF_AGING_RATE,
+                 preflight=TEX_PREFLIGHT):
+        self.workers = workers
+        self.preflight = preflight
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self.aging_rate = aging_rate
+        self._clients = OrderedDict()
+        self._sequence = itertools.count()
+        self.rejected = 0
+        self.violations = Counter()
+        self.cancelled = 0
+        self.reclaimed_cpu_seconds = 0.0
+        self._cond = threading.Condition()
+        self._queued = 0
+        self.running = 0
+        self.jobs = OrderedDict()
+        for index in range(workers):
+            threading.Thread(target=self._worker, name=f"render-worker-{index}", daemon=True).start()
+
+    def submit(self, client_id, code, scene_name, kind="video", job_id=None):
+        estimate = estimate_render_cost(code, scene_name)
+        # Storyboards encode no video, so only full renders are held to the budget
+        reason = admission_error(estimate) if kind == "video" else None
+        if reason:
+            with self._cond:
+                self.rejected += 1
+            raise JobRejected(reason)
+        job = RenderJob(client_id, code, scene_name, estimate, kind, job_id)
+        with self._cond:
+            if job.id in self.jobs:
+                raise ValueError(f"Duplicate job id {job.id}")
+            if self._queued >= self.queue_size:
+                raise QueueFull()
+            job.queue_depth = self._queued
+            queue = self._clients.setdefault(client_id, [])
+            heapq.heappush(queue, (job.predicted_cost, next(self._sequence), job))
+            self._queued += 1
+            self.jobs[job.id] = job
+            self._cond.notify()
+        return job
+
+    # Cheapest aged client head; the served client moves to the back (caller holds the lock)
+    def _next_job(self):
+        now = time.time()
+        best_client, best_score = None, None
+        for client_id, queue in self._clients.items():
+            head = queue[0][2]
+            score = head.predicted_cost - self.aging_rate * (now - head.submitted)
+            if best_score is None or score < best_score:
+                best_client, best_score = client_id, score
+        queue = self._clients.pop(best_client)
+        job = heapq.heappop(queue)[2]
+        if queue:
+            self._clients[best_client] = queue
+        self._queued -= 1
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                job = self._next_job()
+                job.status = "running"
+                job.started = time.time()
+                self.running += 1
+            try:
+                if self.preflight:
+                    job.preflight = preflight_tex(job.code, cancel_event=job.cancel_event)
+                if job.preflight and job.preflight["invalid"]:
+                    job.result = {"success": False, "error": invalid_tex_message(job.preflight), "violation": "latex"}
+                elif job.kind == "storyboard":
+                    job.result = render_storyboard_locally(job.code, job.scene_name, self.output_dir,
+                                                           cancel_event=job.cancel_event)
+                else:
+                    job.progress = RenderProgress(
+                        job.estimate.plays + job.estimate.waits if job.estimate else None, job.predicted_cost or None)
+                    job.result = render_manim_locally(job.code, job.scene_name, self.output_dir, timeout=self.timeout,
+                                                      cancel_event=job.cancel_event, progress=job.progress)
+                if job.kind == "video" and job.result.get("success"):
+                    job.result.update(postprocess_video(job.result["video_path"]))
+            except Exception as e:
+                job.result = {"success": False, "error": str(e)}
+            with self._cond:
+                self.running -= 1
+                job.finished = time.time()
+                job.status = "done" if job.result.get("success") else "failed"
+                if job.cancel_event.is_set():
+                    job.status = "cancelled"
+                elif job.result.get("violation"):
+                    self.violations[job.result["violation"]] += 1
+                self._forget_old_jobs()
+            job.done.set()
+
+    # Drop a queued job or kill a running one so its worker slot frees up at once.
+    # Returns (status, reclaimed_cpu_seconds) with the predicted render time saved,
+    # or None for an unknown job id.
+    def cancel(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                queue = self._clients[job.client_id]
+                queue[:] = [item for item in queue if item[2] is not job]
+                heapq.heapify(queue)
+                if not queue:
+                    del self._clients[job.client_id]
+                self._queued -= 1
+                job.status = "cancelled"
+                job.finished = time.time()
+                job.result = {"success": False, "error": "Render cancelled", "violation": "cancelled"}
+                reclaimed = job.predicted_cost
+            elif job.status == "running" and not job.cancel_event.is_set():
+                reclaimed = max(0.0, job.predicted_cost - (time.time() - job.started))
+            else:
+                return job.status, 0.0
+            job.cancel_event.set()
+            self.cancelled += 1
+            self.reclaimed_cpu_seconds += reclaimed
+        if job.status == "cancelled":
+            job.done.set()
+        return "cancelled", reclaimed
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self._cond:
+            queued_cost = sum(item[0] for queue in self._clients.values() for item in queue)
+            return {"workers": self.workers, "running": self.running, "queued": self._queued,
+                    "queue_size": self.queue_size, "clients": len(self._clients),
+                    "queued_cpu_seconds": round(queued_cost, 1), "rejected": self.rejected,
+                    "violations": dict(self.violations), "cancelled": self.cancelled,
+                    "reclaimed_cpu_seconds": round(self.reclaimed_cpu_seconds, 1)}
+
+
+# Parse a single "bytes=" range against a file size; None if absent, False if unsatisfiable
+def parse_range(header, size):
+    if not header:
+        return None
+    match = re.match(r'^bytes=(\d*)-(\d*)$', header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return False
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    scheduler = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _client_id(self):
+        return self.headers.get("X-Client-Id") or self.client_address[0]
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path.startswith("/cancel/"):
+            return self._cancel(path[len("/cancel/"):])
+        if path not in ("/render", "/storyboard"):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            code = payload["code"]
+        except (ValueError, KeyError):
+            return self._send_json(400, {"success": False, "error": "Expected JSON with 'code'"})
+        # Clients may name the job so they can cancel it while this request is still waiting
+        job_id = payload.get("job_id")
+        if job_id is not None and not VIDEO_ID_PATTERN.match(str(job_id)):
+            return self._send_json(400, {"success": False, "error": "Invalid job_id"})
+
+        kind = "storyboard" if path == "/storyboard" else "video"
+        try:
+            job = self.scheduler.submit(self._client_id(), code, payload.get("scene_name"), kind, job_id)
+        except ValueError as e:
+            return self._send_json(409, {"success": False, "error": str(e)})
+        except QueueFull:
+            return self._send_json(503, {"success": False, "error": "Render queue is full"})
+        except JobRejected as e:
+            return self._send_json(413, {"success": False, "error": str(e)})
+
+        job.done.wait()
+        if kind == "storyboard":
+            return self._send_json(200, {
+                "success": job.result.get("success", False),
+                "storyboard_id": job.result.get("storyboard_id"),
+                "frames": job.result.get("frames", []),
+                "error": job.result.get("error"),
+                "violation": job.result.get("violation"),
+                "job": job.to_dict(),
+            })
+        if job.result.get("success"):
+            video_id = job.result["video_id"]
+            return self._send_json(200, {
+                "success": True,
+                "video_id": video_id,
+                "scenes_rendered": [job.scene_name],
+                "hls_url": f"/hls/{video_id}/index.m3u8" if job.result.get("hls_playlist") else None,
+                "partials_reused": job.result.get("partials_reused"),
+                "job": job.to_dict(),
+            })
+        return self._send_json(200, {
+            "success": False,
+            "error": job.result.get("error"),
+            "violation": job.result.get("violation"),
+            "job": job.to_dict(),
+        })
+
+    def _cancel(self, job_id):
+        outcome = self.scheduler.cancel(job_id)
+        if outcome is None:
+            return self._send_json(404, {"success": False, "error": "Job not found"})
+        status, reclaimed = outcome
+        return self._send_json(200, {"success": status == "cancelled", "status": status,
+                                     "reclaimed_cpu_seconds": round(reclaimed, 1)})
+
+    def do_GET(self):
+        self._handle_get(send_body=True)
+
+    def do_HEAD(self):
+        self._handle_get(send_body=False)
+
+    def _handle_get(self, send_body):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            return self._send_json(200, {"status": "ok", **self.scheduler.stats()})
+        if path.startswith("/status/"):
+            return self._send_status(path[len("/status/"):])
+        if path.startswith("/video/"):
+            return self._send_video(path[len("/video/"):], send_body)
+        if path.startswith("/hls/"):
+            return self._send_hls(path[len("/hls/"):], send_body)
+        if path.startswith("/storyboard/"):
+            return self._send_frame(path[len("/storyboard/"):], send_body)
+        return self._send_json(404, {"success": False, "error": "Not found"})
+
+    # Status of a queued, running or recently finished job, with render progress
+    def _send_status(self, job_id):
+        job = self.scheduler.jobs.get(job_id)
+        if job is None:
+            return self._send_json(404, {"success": False, "error": "Job not found"})
+        return self._send_json(200, {"success": True, "job": job.to_dict()})
+
+    # Serve a rendered video (its faststart remux when there is one) with single-range Range support
+    def _send_video(self, video_id, send_body):
+        video_path = os.path.join(self.scheduler.output_dir, f"{video_id}.mp4")
+        if not VIDEO_ID_PATTERN.match(video_id) or not os.path.exists(video_path):
+            return self._send_json(404, {"success": False, "error": "Video not found"})
+        if os.path.exists(faststart_path(video_path)):
+            video_path = faststart_path(video_path)
+        self._send_file(video_path, "video/mp4", send_body)
+
+    def _send_hls(self, rest, send_body):
+        video_id, _, name = rest.partition("/")
+        if not VIDEO_ID_PATTERN.match(video_id) or not HLS_FILE_PATTERN.match(name):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+        path = os.path.join(hls_dir(os.path.join(self.scheduler.output_dir, f"{video_id}.mp4")), name)
+        if not os.path.exists(path):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+        content_type = "application/vnd.apple.mpegurl" if name.endswith(".m3u8") else "video/mp2t"
+        self._send_file(path, content_type, send_body)
+
+    def _send_frame(self, rest, send_body):
+        storyboard_id, _, name = rest.partition("/")
+        if not VIDEO_ID_PATTERN.match(storyboard_id) or not FRAME_FILE_PATTERN.match(name):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+        path = os.path.join(self.scheduler.output_dir, "storyboards", storyboard_id, name)
+        if not os.path.exists(path):
+            return self._send_json(404, {"success": False, "error": "Not found"})
+        self._send_file(path, "image/png", send_body)
+
+    def _send_file(self, video_path, content_type, send_body):
+        size = os.path.getsize(video_path)
+        byte_range = parse_range(self.headers.get("Range"), size)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(video_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+def create_server(host="0.0.0.0", port=8000, scheduler=None):
+    handler = type("BoundRenderRequestHandler", (RenderRequestHandler,), {"scheduler": scheduler or RenderScheduler()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Manim render server (/render, /storyboard, /cancel/{id}, /status/{id}, /video/{id}, /health)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=RENDER_QUEUE_SIZE)
+    parser.add_argument("--timeout", type=float, default=RENDER_TIMEOUT)
+    parser.add_argument("--output-dir", default=RENDER_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    scheduler = RenderScheduler(args.workers, args.queue_size, args.timeout, args.output_dir)
+    server = create_server(args.host, args.port, scheduler)
+    print(f"Render server on http://{args.host}:{args.port} with {args.workers} workers")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import replay
+from render_backends import service_alive
+
+# Ping the rendering service ahead of the first render ("off" disables it)
+RENDER_WARMUP = os.getenv("RENDER_WARMUP", "on") != "off"
+# Long enough for a sleeping free instance to boot; the request itself wakes it up
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("RENDER_WARMUP_TIMEOUT", "120"))
+# A ping answered slower than this ran into a cold start
+COLD_START_SECONDS = 2.0
+# A service that answered this recently is taken to be warm and not pinged again
+WARM_TTL_SECONDS = 60
+# While a session was active within SESSION_ACTIVE_SECONDS, its service is pinged this
+# often so it does not spin down (free onrender.com instances sleep after 15 idle minutes)
+KEEPALIVE_SECONDS = float(os.getenv("RENDER_KEEPALIVE_SECONDS", "300"))
+SESSION_ACTIVE_SECONDS = 900
+
+
+# One /health request: when it was sent, when it was answered and whether the service was up
+class WarmupPing:
+    def __init__(self, reason):
+        self.reason = reason
+        self.started = time.monotonic()
+        self.finished = None
+        self.ok = None
+        self.claimed = False
+
+    @property
+    def seconds(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def cold(self):
+        return self.seconds >= COLD_START_SECONDS
+
+    # Whether a render submitted now still waited on (or was spared) this ping's cold start
+    def claimable(self, now):
+        if self.claimed or self.ok is False:
+            return False
+        return self.finished is None or (self.cold and now - self.finished < SESSION_ACTIVE_SECONDS)
+
+
+# Wakes rendering services up before they get a render, so a cold start overlaps
+# LLM generation instead of following it, and keeps them awake while sessions use them
+class ServiceWarmer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pings = {}
+        # Cold starts no render has claimed yet, kept when a newer ping replaces them
+        self._unclaimed = {}
+        self._sessions = {}
+        self._keeper = None
+
+    # Ping api_url in the background unless it is warm or already being woken up, and
+    # note the session as active for the keep-alive
+    def warm(self, api_url, session_id=None, reason="page"):
+        if not RENDER_WARMUP or replay.PIPELINE_MODE == "replay" or not api_url:
+            return
+        api_url = api_url.rstrip('/')
+        with self._lock:
+            if session_id is not None:
+                self._sessions[session_id] = (time.monotonic(), api_url)
+                if self._keeper is None:
+                    self._keeper = threading.Thread(target=self._keep_alive, name="render-keepalive", daemon=True)
+                    self._keeper.start()
+            last = self._pings.get(api_url)
+            if last and (last.finished is None or (last.ok and time.monotonic() - last.finished < WARM_TTL_SECONDS)):
+                return
+            if last and last.cold and not last.claimed:
+                self._unclaimed[api_url] = last
+            ping = self._pings[api_url] = WarmupPing(reason)
+        threading.Thread(target=self._ping, args=(api_url, ping), name="render-warmup", daemon=True).start()
+
+    # Any HTTP answer means the service is up, even a 404 from one without /health
+    @staticmethod
+    def _ping(api_url, ping):
+        ping.ok = service_alive(api_url, WARMUP_TIMEOUT_SECONDS)
+        ping.finished = time.monotonic()
+
+    # Ping the services of recently active sessions until there are none left
+    def _keep_alive(self):
+        while True:
+            time.sleep(KEEPALIVE_SECONDS)
+            now = time.monotonic()
+            with self._lock:
+                self._sessions = {session: seen for session, seen in self._sessions.items()
+                                  if now - seen[0] < SESSION_ACTIVE_SECONDS}
+                urls = {api_url for _, api_url in self._sessions.values()}
+                if not urls:
+                    self._keeper = None
+                    return
+            for api_url in urls:
+                self.warm(api_url, reason="keepalive")
+
+    # Called as a render is submitted. If a recent ping ran into a cold start (or is still
+    # waiting for an answer) and no render has claimed it yet, returns {"cold_start_seconds",
+    # "hidden_seconds", "reason", "warming"}: how long the service took (or has taken so
+    # far) to wake up and how much of that passed before this render needed it. Otherwise None.
+    def render_started(self, api_url):
+        api_url = api_url.rstrip('/')
+        now = time.monotonic()
+        with self._lock:
+            candidates = [self._pings.get(api_url), self._unclaimed.pop(api_url, None)]
+            ping = next((ping for ping in candidates if ping and ping.claimable(now)), None)
+            if ping is None:
+                return None
+            ping.claimed = True
+        return {
+            "cold_start_seconds": ping.seconds,
+            "hidden_seconds": min(now, ping.finished or now) - ping.started,
+            "reason": ping.reason,
+            "warming": ping.finished is None,
+        }
+
+
+_warmer = ServiceWarmer()
+
+
+def get_service_warmer():
+    return _warmer
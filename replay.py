@@ -0,0 +1,294 @@
+import sys
+
+# Same sqlite swap as app.py when used headless (crewai needs a recent sqlite)
+if 'sqlite3' not in sys.modules:
+    try:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    except ImportError:
+        pass
+
+import os
+import tempfile
+
+# Run as the benchmark: measure the pipeline, not the caches (runs after the first would
+# hit them), and keep its jobs out of the real store. Set before crewai is imported.
+if __name__ == "__main__":
+    os.environ.setdefault("SECTION_CACHE", "off")
+    os.environ.setdefault("EXAMPLE_INDEX", "off")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    _scratch = tempfile.TemporaryDirectory(prefix="replay-benchmark-", ignore_cleanup_errors=True)
+    os.environ["STORE_PATH"] = os.path.join(_scratch.name, "studio.db")
+
+import argparse
+import glob
+import hashlib
+import json
+import random
+import threading
+import time
+import requests
+from crewai import LLM
+from cancellation import CancelledError
+from hedging import LLM_HEDGE, TaskDeadlines, get_latency_tracker, race
+from llm_config import UsageMeter
+from rate_limiter import estimate_message_tokens, estimate_tokens
+from render_cost import estimate_render_cost
+
+# Pipeline backend mode: "live" (default), "record" (live + capture fixtures) or "replay" (offline)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "live")
+FIXTURE_DIR = os.getenv("PIPELINE_FIXTURE_DIR", os.path.join(os.getcwd(), "fixtures", "default"))
+
+# Replay latency: recorded latency times REPLAY_LATENCY_SCALE, unless REPLAY_LATENCY fixes it
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1.0"))
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY")
+
+
+# Stable key for a prompt or a piece of generated code
+def fixture_key(payload):
+    data = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+# Resolve the delay to inject for a replayed call.
+# `latency` may be None (use recording), a number of seconds, or a callable returning seconds.
+def injected_delay(latency, recorded):
+    if callable(latency):
+        return max(0.0, latency())
+    if latency is not None:
+        return max(0.0, float(latency))
+    if REPLAY_LATENCY is not None:
+        return max(0.0, float(REPLAY_LATENCY))
+    return max(0.0, recorded * REPLAY_LATENCY_SCALE)
+
+
+# Latency distribution helper: lognormal around a median with the given spread
+def lognormal_latency(median, sigma=0.5):
+    return lambda: median * random.lognormvariate(0.0, sigma)
+
+
+# Fixture files on disk: llm/<seq>_<key>.json, render/<key>.json, video/<video_id>.mp4
+class FixtureStore:
+    def __init__(self, root=FIXTURE_DIR):
+        self.root = root
+        for sub in ("llm", "render", "video"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+        self._lock = threading.Lock()
+        self._sequence = len(glob.glob(os.path.join(root, "llm", "*.json")))
+
+    def save_llm(self, messages, response, latency, model):
+        key = fixture_key(messages)
+        with self._lock:
+            sequence = self._sequence
+            self._sequence += 1
+        record = {"key": key, "sequence": sequence, "model": model, "messages": messages,
+                  "response": response, "latency": latency}
+        path = os.path.join(self.root, "llm", f"{sequence:04d}_{key[:16]}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, default=str)
+
+    def load_llm_calls(self):
+        calls = []
+        for path in sorted(glob.glob(os.path.join(self.root, "llm", "*.json"))):
+            with open(path, encoding="utf-8") as f:
+                calls.append(json.load(f))
+        return sorted(calls, key=lambda c: c["sequence"])
+
+    def save_render(self, code, scene_name, response, latency):
+        key = fixture_key(code)
+        record = {"key": key, "scene_name": scene_name, "response": response,
+                  "latency": latency, "recorded_at": time.time()}
+        with open(os.path.join(self.root, "render", f"{key}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+
+    def load_render(self, code):
+        path = os.path.join(self.root, "render", f"{fixture_key(code)}.json")
+        if not os.path.exists(path):
+            # Fall back to the latest recording so edited code still replays
+            paths = glob.glob(os.path.join(self.root, "render", "*.json"))
+            if not paths:
+                return None
+            path = max(paths, key=os.path.getmtime)
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_video(self, video_id, data):
+        with open(self.video_path(video_id), "wb") as f:
+            f.write(data)
+
+    def video_path(self, video_id):
+        return os.path.join(self.root, "video", f"{video_id}.mp4")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_fixture_store(root=FIXTURE_DIR):
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = FixtureStore(root)
+        return _stores[root]
+
+
+# Capture every LLM call of a live llm instance into the fixture store
+def record_llm(llm, store):
+    live_call = llm.call
+
+    def call(messages, *args, **kwargs):
+        started = time.perf_counter()
+        response = live_call(messages, *args, **kwargs)
+        store.save_llm(messages, response, time.perf_counter() - started, llm.model)
+        return response
+
+    llm.call = call
+    return llm
+
+
+# Stand-in for the Anthropic LLM that answers from recorded fixtures.
+# Calls are matched by prompt; unmatched prompts fall back to recording order.
+# Hedging and task deadlines work as on the live LLM: a hedged call draws a fresh
+# injected delay for the same recorded answer.
+class ReplayLLM(LLM):
+    def __init__(self, store, latency=None, model="anthropic/replay", hedge=LLM_HEDGE, deadline=None, **kwargs):
+        super().__init__(model=model, api_key="replay", **kwargs)
+        self.store = store
+        self.latency = latency
+        self.hedge = hedge
+        self.deadlines = TaskDeadlines(deadline)
+        self.queue_wait = 0.0
+        self.call_count = 0
+        self.cancel_token = None
+        self.tier = "replay"
+        self.usage = UsageMeter()
+        self._calls = store.load_llm_calls()
+        self._by_key = {c["key"]: c for c in self._calls}
+        self._next = 0
+        self._replay_lock = threading.Lock()
+
+    def call(self, messages, *args, **kwargs):
+        token = self.cancel_token
+        if token is not None and token.cancelled:
+            token.add_reclaimed("llm_calls_avoided", 1)
+            token.raise_if_cancelled()
+        with self._replay_lock:
+            record = self._by_key.get(fixture_key(messages))
+            if record is None:
+                if not self._calls:
+                    raise RuntimeError(f"No LLM fixtures recorded in {self.store.root}")
+                record = self._calls[self._next % len(self._calls)]
+            self._next += 1
+            self.call_count += 1
+        tracker = get_latency_tracker(f"{self.model}:{self.store.root}")
+
+        # Simulated latency is interrupted by cancellation, like an aborted live request.
+        # The drawn delay is what the request would have taken, so it counts even for a loser.
+        def attempt(attempt_token):
+            delay = injected_delay(self.latency, record["latency"])
+            tracker.observe(delay)
+            attempt_token.sleep(delay)
+            return record["response"]
+
+        started = time.perf_counter()
+        response, hedged, hedge_won = race(
+            attempt, attempt if self.hedge else None, tracker.hedge_after(), self.deadlines.deadline_for(messages),
+            token, label="Replayed task",
+        )
+        self.usage.record(time.perf_counter() - started, estimate_message_tokens(messages), estimate_tokens(response))
+        if hedged:
+            self.usage.record_hedge(hedge_won)
+        return response
+
+
+# Wrap a live render function so responses and videos are saved as fixtures
+def record_render(render, store):
+    def recording_render(manim_code, api_url, cancel_token=None, on_progress=None, client_id=None):
+        started = time.perf_counter()
+        response = render(manim_code, api_url, cancel_token=cancel_token, on_progress=on_progress,
+                          client_id=client_id)
+        latency = time.perf_counter() - started
+        store.save_render(manim_code.code, manim_code.scene_name, response, latency)
+        if response and "video_id" in response:
+            try:
+                video = requests.get(f"{api_url.rstrip('/')}/video/{response['video_id']}")
+                if video.status_code == 200:
+                    store.save_video(response["video_id"], video.content)
+            except Exception:
+                pass
+        return response
+
+    return recording_render
+
+
+# Stand-in for the /render endpoint
+class ReplayRenderer:
+    def __init__(self, store, latency=None):
+        self.store = store
+        self.latency = latency
+
+    def render(self, manim_code, api_url, cancel_token=None, on_progress=None, client_id=None):
+        record = self.store.load_render(manim_code.code)
+        if record is None:
+            return None
+        delay = injected_delay(self.latency, record["latency"])
+        started = time.perf_counter()
+        try:
+            if on_progress is None:
+                _sleep(delay, cancel_token)
+            else:
+                self._report_progress(manim_code, delay, cancel_token, on_progress)
+        except CancelledError:
+            cancel_token.add_reclaimed("render_cpu_seconds", delay - (time.perf_counter() - started))
+            raise
+        return record["response"]
+
+    # Simulated render progress: the delay split evenly over the scene's animations
+    def _report_progress(self, manim_code, delay, cancel_token, on_progress):
+        estimate = estimate_render_cost(manim_code.code, manim_code.scene_name)
+        animations = max(1, estimate.plays + estimate.waits) if estimate else 1
+        for index in range(animations):
+            on_progress({"animation": index + 1, "animations": animations, "frame": 0, "frames": 0,
+                         "percent": round(100.0 * index / animations, 1),
+                         "eta_seconds": round(delay * (animations - index) / animations, 1)})
+            _sleep(delay / animations, cancel_token)
+
+
+# Sleep that wakes early (raising CancelledError) when cancel_token is cancelled
+def _sleep(seconds, cancel_token=None):
+    if cancel_token is None:
+        time.sleep(seconds)
+    else:
+        cancel_token.sleep(seconds)
+
+
+# Where to play a video from: the /video endpoint, or the fixture file when replaying
+def replay_video_source(api_url, video_id, store):
+    path = store.video_path(video_id)
+    if os.path.exists(path):
+        return path
+    return f"{api_url.rstrip('/')}/video/{video_id}"
+
+
+# Offline benchmark: run the whole pipeline against fixtures and print stage timings
+def main():
+    parser = argparse.ArgumentParser(description="Replay the generation pipeline from fixtures")
+    parser.add_argument("topic")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=None)
+    parser.add_argument("--render-latency", type=float, default=None)
+    args = parser.parse_args()
+
+    from pipeline import run_generation
+
+    store = get_fixture_store(args.fixtures)
+    for run in range(args.runs):
+        llm = ReplayLLM(store, latency=args.llm_latency)
+        renderer = ReplayRenderer(store, latency=args.render_latency)
+        result = run_generation(args.topic, llm, "replay://", render=renderer.render)
+        timings = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in result["timings"].items())
+        print(f"run {run + 1}: {timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from pydantic import BaseModel, Field
+from store import get_store
+
+SECTION_CACHE_DIR = os.getenv("SECTION_CACHE_DIR", os.path.join(os.getcwd(), "section_cache"))
+SECTION_CACHE_ENABLED = os.getenv("SECTION_CACHE", "on") != "off"
+
+# Bump when the section code prompt changes so old generations are not reused
+SECTION_PROMPT_VERSION = "2"
+
+# Section headings look like: ## [worked-example] Worked Example
+SECTION_HEADING = re.compile(r'^##\s*\[([A-Za-z0-9_-]+)\]\s*(.*)$', re.MULTILINE)
+
+
+# One addressable part of the educational content
+class Section(BaseModel):
+    id: str = Field(..., description="Stable short identifier, e.g. 'worked-example'")
+    title: str = Field("", description="Human readable section title")
+    body: str = Field("", description="Markdown content of the section")
+
+    @property
+    def class_name(self):
+        return "Section_" + re.sub(r'\W', '_', self.id)
+
+    @property
+    def content_hash(self):
+        return hash_text(SECTION_PROMPT_VERSION + "\n" + self.title.strip() + "\n" + self.body.strip())
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Split content into sections on "## [id] Title" headings.
+# Content without any tagged heading becomes a single "main" section.
+def parse_sections(content):
+    content = content or ""
+    matches = list(SECTION_HEADING.finditer(content))
+    if not matches:
+        return [Section(id="main", title="", body=content.strip())]
+
+    sections = []
+    seen = set()
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(content)
+        section_id = match.group(1).lower()
+        # Keep ids unique so class names never collide
+        while section_id in seen:
+            section_id += "-2"
+        seen.add(section_id)
+        sections.append(Section(id=section_id, title=match.group(2).strip(), body=content[match.end():end].strip()))
+    return sections
+
+
+# Drop the "[id]" tags from headings for display
+def strip_section_ids(content):
+    return SECTION_HEADING.sub(lambda m: f"## {m.group(2)}", content or "")
+
+
+# Cache of generated section code (by section content hash, in the shared store)
+# and rendered clips (by section code hash, on disk)
+class SectionCache:
+    NAMESPACE = "section_code"
+
+    def __init__(self, root=SECTION_CACHE_DIR, store=None):
+        self.root = root
+        self.store = store or get_store()
+        self.code_dir = os.path.join(root, "code")
+        self.clip_dir = os.path.join(root, "clips")
+        self.video_dir = os.path.join(root, "videos")
+        for path in (self.code_dir, self.clip_dir, self.video_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def get_code(self, section):
+        if not SECTION_CACHE_ENABLED:
+            return None
+        entry = self.store.cache_get(self.NAMESPACE, section.content_hash)
+        if entry is None:
+            # Code cached as JSON files before the store existed
+            path = os.path.join(self.code_dir, f"{section.content_hash}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            self.store.cache_put(self.NAMESPACE, section.content_hash, entry)
+        return entry["code"]
+
+    def put_code(self, section, code):
+        self.store.cache_put(self.NAMESPACE, section.content_hash, {"id": section.id, "title": section.title, "code": code})
+
+    def clip_path(self, code):
+        return os.path.join(self.clip_dir, f"{hash_text(code)}.mp4")
+
+    def get_clip(self, code):
+        if not SECTION_CACHE_ENABLED:
+            return None
+        path = self.clip_path(code)
+        return path if os.path.exists(path) else None
+
+    def put_clip(self, code, data):
+        path = self.clip_path(code)
+        _write_atomic(path, data)
+        return path
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_section_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SectionCache()
+        return _cache
+
+
+# Concatenate cached clips (same codec settings) into one video without re-encoding,
+# with the moov atom in front so playback can start before the download finishes
+def stitch_clips(clip_paths, output_path):
+    if len(clip_paths) == 1:
+        shutil.copyfile(clip_paths[0], output_path)
+        return output_path
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in clip_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+        list_file = f.name
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_file, "-c", "copy", "-movflags", "+faststart", output_path],
+            check=True,
+            capture_output=True
+        )
+    finally:
+        os.remove(list_file)
+    return output_path
+
+
+# Prefix a section's helper methods (and the self.<name> references to them) so
+# helpers with the same name in different sections cannot collide in MainScene
+class _HelperRenamer(ast.NodeTransformer):
+    def __init__(self, names, prefix):
+        self.names = names
+        self.prefix = prefix
+
+    def visit_FunctionDef(self, node):
+        if node.name in self.names:
+            node.name = self.prefix + node.name
+        self.generic_visit(node)
+        return node
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if isinstance(node.value, ast.Name) and node.value.id == "self" and node.attr in self.names:
+            node.attr = self.prefix + node.attr
+        return node
+
+
+# Names a section's module defines at top level, other than its scene class and imports
+def _module_names(tree, class_name):
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name != class_name:
+                names.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            for target in node.targets if isinstance(node, ast.Assign) else [node.target]:
+                names.update(name.id for name in ast.walk(target) if isinstance(name, ast.Name))
+    return names
+
+
+# Names bound by these statements in their own scope (not in nested functions or classes)
+def _bound_names(statements):
+    names = set()
+    declared_global = set()
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        if isinstance(node, ast.Lambda):
+            continue
+        if isinstance(node, ast.Global):
+            declared_global.update(node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        stack.extend(ast.iter_child_nodes(node))
+    return names - declared_global
+
+
+def _argument_names(args):
+    names = {arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs}
+    names.update(arg.arg for arg in (args.vararg, args.kwarg) if arg)
+    return names
+
+
+# Prefix a section's module-level functions, classes and constants, and every reference
+# to them, so top-level names that several sections define cannot collide in the stitched
+# module. Locals that shadow one of the names are left alone. Each scope holds the names
+# bound in its own body and the ones its nested functions see (class bodies are skipped).
+class _GlobalRenamer(ast.NodeTransformer):
+    def __init__(self, names, prefix):
+        self.names = names
+        self.prefix = prefix
+        self.scopes = [(set(), set())]
+
+    def _rename(self, name):
+        return self.prefix + name if name in self.names and name not in self.scopes[-1][0] else name
+
+    def _visit_all(self, nodes):
+        for node in nodes:
+            if node is not None:
+                self.visit(node)
+
+    def _visit_function(self, node, body):
+        local = self.scopes[-1][1] | _argument_names(node.args) | _bound_names(body)
+        args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs + [node.args.vararg, node.args.kwarg]
+        self._visit_all([arg.annotation for arg in args if arg] + [getattr(node, "returns", None)])
+        self._visit_all(node.args.defaults + node.args.kw_defaults)
+        self.scopes.append((local, local))
+        self._visit_all(body)
+        self.scopes.pop()
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self._rename(node.name)
+        self._visit_all(node.decorator_list)
+        return self._visit_function(node, node.body)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        return self._visit_function(node, [node.body])
+
+    def visit_ClassDef(self, node):
+        node.name = self._rename(node.name)
+        self._visit_all(node.decorator_list + node.bases + node.keywords)
+        enclosing = self.scopes[-1][1]
+        self.scopes.append((enclosing | _bound_names(node.body), enclosing))
+        self._visit_all(node.body)
+        self.scopes.pop()
+        return node
+
+    def visit_Global(self, node):
+        node.names = [self.prefix + name if name in self.names else name for name in node.names]
+        return node
+
+    def visit_Name(self, node):
+        node.id = self._rename(node.id)
+        return node
+
+
+# Combine per-section scene code into one module whose MainScene plays every
+# section in order. Output depends only on the inputs, so identical sections
+# always stitch to identical code (and hit the render caches).
+def stitch_scene_module(sections, codes):
+    imports = []
+    body = []
+    for section, code in zip(sections, codes):
+        tree = ast.parse(code)
+        names = _module_names(tree, section.class_name)
+        if names:
+            tree = _GlobalRenamer(names, f"_{section.class_name}_").visit(tree)
+        for node in tree.body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                line = ast.unparse(node)
+                if line not in imports:
+                    imports.append(line)
+                continue
+            if isinstance(node, ast.ClassDef) and node.name == section.class_name:
+                helpers = {
+                    item.name for item in node.body
+                    if isinstance(item, ast.FunctionDef) and item.name != "construct"
+                }
+                node = _HelperRenamer(helpers, f"_{section.class_name}_").visit(node)
+            body.append(ast.unparse(node))
+
+    for required in ("from manim import *", "import numpy as np"):
+        if required not in imports:
+            imports.append(required)
+
+    class_names = [section.class_name for section in sections]
+    main_scene = [f"class MainScene({', '.join(class_names + ['Scene'])}):", "", "    def construct(self):"]
+    for class_name in class_names:
+        main_scene.append(f"        {class_name}.construct(self)")
+        main_scene.append("        self.clear()")
+
+    return "\n".join(imports) + "\n\n" + "\n\n".join(body + ["\n".join(main_scene)]) + "\n"
@@ -0,0 +1,327 @@
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+# One SQLite database for job history, stage metrics, artifacts and small caches
+STORE_PATH = os.getenv("STORE_PATH", os.path.join(os.getcwd(), "studio.db"))
+
+# Queued writes are committed together, at most this many per transaction
+WRITE_BATCH_SIZE = 200
+WRITE_BATCH_SECONDS = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT,
+    topic TEXT,
+    canonical_topic TEXT,
+    mode TEXT,
+    status TEXT NOT NULL,
+    code_hash TEXT,
+    scene_name TEXT,
+    content TEXT,
+    code TEXT,
+    video_id TEXT,
+    video_path TEXT,
+    api_url TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_topic ON jobs (canonical_topic);
+CREATE INDEX IF NOT EXISTS jobs_code_hash ON jobs (code_hash);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, created);
+
+CREATE TABLE IF NOT EXISTS stages (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    duration REAL,
+    details TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stages_job ON stages (job_id);
+CREATE INDEX IF NOT EXISTS stages_stage ON stages (stage, created);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT,
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    code_hash TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_job ON artifacts (job_id);
+CREATE INDEX IF NOT EXISTS artifacts_code_hash ON artifacts (code_hash, kind);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    histogram TEXT,
+    PRIMARY KEY (bucket, metric)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+JOB_COLUMNS = {
+    "session_id", "topic", "canonical_topic", "mode", "status", "code_hash", "scene_name",
+    "content", "code", "video_id", "video_path", "api_url", "error",
+}
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+# SQLite in WAL mode: any number of threads read through their own connections while
+# one background thread applies queued writes in batched transactions, so callers
+# (the Streamlit script thread included) never wait on disk I/O to record something.
+# Cache values written but not yet committed are served from memory.
+class Store:
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=30000")
+        return connection
+
+    # Per-thread read connection
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._reader().execute(sql, params).fetchall()]
+
+    def _write(self, sql, params=(), pending_key=None):
+        self._queue.put((sql, params, pending_key))
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_BATCH_SECONDS
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    for sql, params, _ in batch:
+                        if isinstance(sql, list):
+                            for statement, statement_params in sql:
+                                connection.execute(statement, statement_params)
+                        elif sql is not None:
+                            connection.execute(sql, params)
+            except sqlite3.Error as e:
+                print(f"store: dropped {len(batch)} writes: {e}", file=sys.stderr)
+            with self._pending_lock:
+                for _, params, pending_key in batch:
+                    if pending_key and self._pending.get(pending_key) is params:
+                        del self._pending[pending_key]
+            for sql, params, _ in batch:
+                if sql is None:
+                    params.set()
+                self._queue.task_done()
+
+    # Several writes committed in the same transaction
+    def _write_all(self, statements):
+        self._queue.put((list(statements), (), None))
+
+    # Block until every write queued so far is committed
+    def flush(self, timeout=None):
+        done = threading.Event()
+        self._queue.put((None, done, None))
+        return done.wait(timeout)
+
+    # --- jobs -------------------------------------------------------------
+
+    # Insert or update a job; only the given columns change on update
+    def record_job(self, job_id, **fields):
+        fields = {key: value for key, value in fields.items() if key in JOB_COLUMNS}
+        now = time.time()
+        columns = ["id", "created", "updated"] + list(fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in ["updated"] + list(fields))
+        self._write(
+            f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            (job_id, now, now, *fields.values()),
+        )
+
+    def record_stage(self, job_id, stage, duration=None, **details):
+        self._write(
+            "INSERT INTO stages (job_id, stage, duration, details, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, stage, duration, json.dumps(details) if details else None, time.time()),
+        )
+
+    def record_artifact(self, job_id, kind, ref, code_hash=None):
+        self._write(
+            "INSERT INTO artifacts (job_id, kind, ref, code_hash, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, ref, code_hash, time.time()),
+        )
+
+    def get_job(self, job_id):
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def recent_jobs(self, session_id=None, status=None, limit=20):
+        sql, params = "SELECT * FROM jobs WHERE 1 = 1", []
+        if session_id:
+            sql += " AND session_id = ?"
+            params.append(session_id)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        return self._query(sql + " ORDER BY created DESC LIMIT ?", (*params, limit))
+
+    def jobs_for_code(self, code_hash, status="done"):
+        return self._query(
+            "SELECT * FROM jobs WHERE code_hash = ? AND status = ? ORDER BY updated DESC", (code_hash, status)
+        )
+
+    def job_stages(self, job_id):
+        return self._query("SELECT stage, duration, details, created FROM stages WHERE job_id = ? ORDER BY id",
+                           (job_id,))
+
+    # Durations of one stage since a timestamp, oldest first
+    def stage_durations(self, stage, since=0.0):
+        rows = self._query(
+            "SELECT duration FROM stages WHERE stage = ? AND created >= ? AND duration IS NOT NULL ORDER BY created",
+            (stage, since),
+        )
+        return [row["duration"] for row in rows]
+
+    # Stages matching a LIKE pattern since a timestamp, with their job's status
+    def stage_records(self, stage_pattern, since=0.0):
+        return self._query(
+            "SELECT s.job_id, s.stage, s.duration, s.details, s.created, j.status FROM stages s "
+            "JOIN jobs j ON j.id = s.job_id WHERE s.stage LIKE ? AND s.created >= ? ORDER BY s.created",
+            (stage_pattern, since),
+        )
+
+    # Stage rows after an id, oldest first (for incremental aggregation)
+    def stages_after(self, last_id, limit=100000):
+        return self._query(
+            "SELECT id, job_id, stage, duration, details, created FROM stages WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit),
+        )
+
+    # --- rollups ----------------------------------------------------------
+
+    def rollup_watermark(self, name):
+        rows = self._query("SELECT last_id FROM rollup_state WHERE name = ?", (name,))
+        return rows[0]["last_id"] if rows else 0
+
+    def rollup_rows(self, since_bucket=0, metric_pattern="%"):
+        return self._query(
+            "SELECT bucket, metric, count, total, histogram FROM rollups WHERE bucket >= ? AND metric LIKE ? "
+            "ORDER BY bucket", (since_bucket, metric_pattern),
+        )
+
+    # Replace rollup rows and move the watermark in one transaction, so a crash
+    # between the two can never count a stage row twice
+    def save_rollups(self, name, last_id, rows):
+        statements = [(
+            "INSERT INTO rollups (bucket, metric, count, total, histogram) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(bucket, metric) DO UPDATE SET count = excluded.count, total = excluded.total, "
+            "histogram = excluded.histogram",
+            (row["bucket"], row["metric"], row["count"], row["total"], row["histogram"]),
+        ) for row in rows]
+        statements.append((
+            "INSERT INTO rollup_state (name, last_id) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id", (name, last_id),
+        ))
+        self._write_all(statements)
+
+    # --- cache entries ----------------------------------------------------
+
+    def cache_get(self, namespace, key):
+        with self._pending_lock:
+            pending = self._pending.get((namespace, key))
+        if pending is not None:
+            # Decoded again so callers never share (or mutate) the value being written
+            return json.loads(pending[2])
+        rows = self._query("SELECT value FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+        if not rows:
+            return None
+        self._write(
+            "UPDATE cache_entries SET hits = hits + 1, last_used = ? WHERE namespace = ? AND key = ?",
+            (time.time(), namespace, key),
+        )
+        return json.loads(rows[0]["value"])
+
+    def cache_put(self, namespace, key, value):
+        now = time.time()
+        params = (namespace, key, json.dumps(value), now, now)
+        with self._pending_lock:
+            self._pending[(namespace, key)] = params
+        self._write(
+            "INSERT INTO cache_entries (namespace, key, value, created, last_used) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+            params,
+            pending_key=(namespace, key),
+        )
+
+    def cache_delete(self, namespace, key):
+        with self._pending_lock:
+            self._pending.pop((namespace, key), None)
+        self._write("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def cache_keys(self, namespace):
+        keys = {row["key"] for row in self._query("SELECT key FROM cache_entries WHERE namespace = ?", (namespace,))}
+        with self._pending_lock:
+            keys.update(key for pending_namespace, key in self._pending if pending_namespace == namespace)
+        return keys
+
+    def cache_count(self, namespace):
+        return len(self.cache_keys(namespace))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = Store()
+        return _store
@@ -0,0 +1,26 @@
+import json
+import cache_warming
+import store as store_module
+from ops_metrics import ops_report
+
+
+def test_failed_background_run_is_recorded(monkeypatch, tmp_path, capsys):
+    store = store_module.Store(str(tmp_path / "studio.db"))
+    monkeypatch.setattr(store_module, "_store", store)
+    monkeypatch.setattr(cache_warming, "_warmer", None)
+    monkeypatch.setattr(cache_warming, "load_warm_config", lambda: {**cache_warming.DEFAULT_WARM_CONFIG,
+                                                                  "topics": ["Derivatives"]})
+
+    def run_warming(config, api_key):
+        raise RuntimeError("render service unreachable")
+    monkeypatch.setattr(cache_warming, "run_warming", run_warming)
+
+    cache_warming.start_cache_warming("startup")
+    cache_warming._warmer.join(10)
+    store.flush()
+
+    rows = [row for row in store.stages_after(0) if row["stage"] == "cache_warming"]
+    assert len(rows) == 1
+    assert json.loads(rows[0]["details"]) == {"status": "error", "error": "render service unreachable"}
+    assert ops_report(store=store)["failures"] == {"exception": 1}
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,54 @@
+import json
+import pipeline
+from pipeline import content_markdown, parse_educational_content, section_brief
+from sections import parse_sections
+
+# What the content task tends to answer: LaTeX with single backslashes, which JSON reads
+# as \f, \t and invalid escapes, and a raw newline inside a string
+SINGLE_ESCAPED = r"""Thought: done
+Final Answer: {"topic": "Fractions", "sections": [
+{"id": "introduction", "title": "Introduction", "summary": "Dividing by a fraction
+multiplies by its reciprocal.", "formulas": ["\frac{a}{b} \div \frac{c}{d} = \frac{a}{b} \times \frac{d}{c}"]},
+{"id": "worked-example", "title": "Worked Example", "summary": "A square root of a fraction.",
+ "steps": [{"text": "Take the root of both parts", "math": "\sqrt{\frac{4}{9}} = \frac{2}{3}"}],
+ "visual_hints": ["Flip the second fraction"]}]}"""
+
+
+def test_single_backslashes_in_latex_are_repaired():
+    content = parse_educational_content(SINGLE_ESCAPED)
+    assert content is not None
+    assert content.sections[0].formulas == [r"\frac{a}{b} \div \frac{c}{d} = \frac{a}{b} \times \frac{d}{c}"]
+    assert content.sections[0].summary == "Dividing by a fraction\nmultiplies by its reciprocal."
+    assert content.sections[1].steps[0].math == r"\sqrt{\frac{4}{9}} = \frac{2}{3}"
+
+
+def test_double_backslashes_and_json_escapes_are_kept():
+    text = json.dumps({"topic": "t", "sections": [
+        {"id": "intro", "title": "Intro", "summary": 'A "quoted"\nline', "formulas": [r"\frac{1}{2} \times \sqrt{x}"]}]})
+    content = parse_educational_content(text)
+    assert content.sections[0].summary == 'A "quoted"\nline'
+    assert content.sections[0].formulas == [r"\frac{1}{2} \times \sqrt{x}"]
+
+
+def test_unstructured_answer_passes_through():
+    assert parse_educational_content("## Introduction\nNo JSON here") is None
+    assert content_markdown("## Introduction\nNo JSON here") == "## Introduction\nNo JSON here"
+
+
+def test_section_code_task_gets_compact_json():
+    content = parse_educational_content(SINGLE_ESCAPED)
+    sections = parse_sections(content.to_markdown())
+    assert [section.id for section in sections] == ["introduction", "worked-example"]
+    brief = json.loads(section_brief(sections[1]))
+    assert brief == {"summary": "A square root of a fraction.",
+                     "steps": [{"text": "Take the root of both parts", "math": r"\sqrt{\frac{4}{9}} = \frac{2}{3}"}],
+                     "visual_hints": ["Flip the second fraction"]}
+    task = pipeline.create_section_task(None, "Fractions", sections[1])
+    assert section_brief(sections[1]) in task.description
+    assert "*Visual ideas:*" not in task.description
+
+
+def test_edited_section_keeps_its_markdown():
+    content = parse_educational_content(SINGLE_ESCAPED)
+    section = parse_sections(content.to_markdown() + "\n\nA note the user added.")[1]
+    assert section_brief(section) == section.body
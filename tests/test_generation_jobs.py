@@ -0,0 +1,60 @@
+import threading
+import time
+import pytest
+from generation_jobs import ABANDONED_JOB_SECONDS, UNPOLLED_JOB_SECONDS, cancel_abandoned, start_job
+
+
+# Work that runs until its job is cancelled (or a few seconds pass)
+def wait_for_cancel(job):
+    job.cancel_token.sleep(5)
+
+
+@pytest.fixture
+def jobs():
+    started = []
+
+    def start(alive):
+        job = start_job(f"job-{len(started)}-{time.monotonic()}", wait_for_cancel, alive=alive)
+        started.append(job)
+        return job
+    yield start
+    for job in started:
+        job.cancel("test over")
+
+
+def test_navigating_away_keeps_the_job(jobs):
+    # The user switched to the Operations page: no polls, but the session is still connected
+    job = jobs(alive=lambda: True)
+    job.last_polled -= 3600
+    assert job not in cancel_abandoned(time.monotonic() + UNPOLLED_JOB_SECONDS)
+    assert not job.cancel_token.cancelled
+
+
+def test_closed_tab_is_cancelled_after_the_grace_period(jobs):
+    connected = threading.Event()
+    job = jobs(alive=connected.is_set)
+    job.last_polled -= 3600
+    now = time.monotonic()
+    assert job not in cancel_abandoned(now)
+    assert job not in cancel_abandoned(now + ABANDONED_JOB_SECONDS / 2)
+    assert job in cancel_abandoned(now + ABANDONED_JOB_SECONDS + 1)
+    assert job.cancel_token.reason == "abandoned"
+
+
+def test_reconnect_within_the_grace_period_keeps_the_job(jobs):
+    connected = threading.Event()
+    job = jobs(alive=connected.is_set)
+    job.last_polled -= 3600
+    now = time.monotonic()
+    cancel_abandoned(now)
+    connected.set()
+    assert job not in cancel_abandoned(now + ABANDONED_JOB_SECONDS + 1)
+    connected.clear()
+    assert job not in cancel_abandoned(now + ABANDONED_JOB_SECONDS + 2)
+
+
+def test_unwatched_job_needs_a_long_silence(jobs):
+    job = jobs(alive=None)
+    now = time.monotonic()
+    assert job not in cancel_abandoned(now + 60)
+    assert job in cancel_abandoned(now + UNPOLLED_JOB_SECONDS + 1)
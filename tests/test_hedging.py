@@ -0,0 +1,50 @@
+import time
+import pytest
+import pipeline
+from hedging import HEDGE_MIN_SAMPLES, LatencyTracker, get_latency_tracker
+
+PRIMARY = "anthropic/claude-3-7-sonnet-20250219"
+HEDGE = "anthropic/claude-3-5-haiku-20241022"
+
+
+def test_no_hedge_before_min_samples():
+    tracker = LatencyTracker()
+    for _ in range(HEDGE_MIN_SAMPLES - 1):
+        tracker.observe(1.0)
+    assert tracker.hedge_after() is None
+    tracker.observe(1.0)
+    assert tracker.hedge_after() == 1.0
+
+
+@pytest.fixture
+def slow_primary(monkeypatch):
+    # The primary answers after 0.5s, the hedge model at once
+    def call(llm, messages, *args, **kwargs):
+        if llm.model == PRIMARY:
+            time.sleep(0.5)
+        return f"answer from {llm.model}"
+    monkeypatch.setattr(pipeline.LLM, "call", call)
+
+
+def test_hedge_is_clamped_and_metered_separately(slow_primary):
+    llm = pipeline.RateLimitedLLM(model=PRIMARY, api_key="test", max_tokens=10000, agent="hedge-test",
+                                  hedge_model=HEDGE)
+    tracker = get_latency_tracker(f"{PRIMARY}:hedge-test")
+    for _ in range(HEDGE_MIN_SAMPLES):
+        tracker.observe(0.05)
+
+    assert llm.call([{"role": "user", "content": "integrate x"}]) == f"answer from {HEDGE}"
+    assert llm._hedge_llm.max_tokens == 8192
+    time.sleep(0.6)  # the losing primary request still completes and is billed
+
+    usage = pipeline.llm_usage(llm)
+    assert usage["shared"]["model"] == PRIMARY and usage["shared"]["calls"] == 1
+    assert usage["shared_hedge"]["model"] == HEDGE and usage["shared_hedge"]["calls"] == 1
+    assert usage["shared"]["hedges"] == 1 and usage["shared"]["hedge_wins"] == 1
+
+
+def test_latency_is_tracked_per_agent(slow_primary):
+    content = pipeline.RateLimitedLLM(model=HEDGE, api_key="test", agent="tracked-content")
+    content.call([{"role": "user", "content": "explain"}])
+    assert get_latency_tracker(f"{HEDGE}:tracked-content").count == 1
+    assert get_latency_tracker(f"{HEDGE}:tracked-code").count == 0
@@ -0,0 +1,12 @@
+from partial_cache import CacheHitCollector
+
+
+def test_cache_hits_split_across_chunks_are_collected():
+    log = ("Animation 0 : Using cached data (hash : 111_222_333)\n"
+           + "x" * 100000 + "\n"
+           + "Animation 1 : Using cached data (hash : 444_555_666)\n")
+    collector = CacheHitCollector()
+    for start in range(0, len(log), 37):
+        collector.feed("stderr", log[start:start + 37])
+    collector.feed("stdout", "Animation 2 : Using cached data (hash : 777_888_999)")
+    assert collector.hashes == {"111_222_333", "444_555_666", "777_888_999"}
@@ -0,0 +1,31 @@
+import pytest
+import render_backends
+from render_backends import RemoteBackend, RenderRouter, service_alive
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("answer, alive", [(200, True), (404, True), (405, True), (502, False), (503, False)])
+def test_any_answer_below_500_means_the_service_is_up(monkeypatch, answer, alive):
+    monkeypatch.setattr(render_backends.requests, "get", lambda url, timeout: Response(answer))
+    assert service_alive("http://render/", 1) is alive
+
+
+def test_unreachable_service_is_down(monkeypatch):
+    def get(url, timeout):
+        raise render_backends.requests.ConnectionError("refused")
+    monkeypatch.setattr(render_backends.requests, "get", get)
+    assert not RemoteBackend(render=None).healthy("http://render")
+
+
+def test_failover_is_recorded_in_the_stats(capsys):
+    router = RenderRouter(remote_render=None, mode="remote")
+    router._mark_remote_down("is erroring")
+    stats = router.stats()
+    assert stats["failovers"] == 1
+    assert stats["last_failover"]["reason"] == "is erroring"
+    assert stats["remote_down_for"] > 0
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,10 @@
+from render_progress import MAX_PARTIAL_CHARS, RenderProgress
+
+
+def test_unterminated_output_is_not_kept_whole():
+    progress = RenderProgress(total_animations=2)
+    for _ in range(1000):
+        progress.feed("x" * 1000)
+    assert len(progress._partial) <= MAX_PARTIAL_CHARS
+    progress.feed("\rAnimation 1: Write(Text('a')):  50%|#####     | 30/60 [00:01<00:01, 21.3it/s]")
+    assert (progress.animation, progress.frame, progress.frames) == (1, 30, 60)
@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from render_sandbox import (OUTPUT_TAIL_CHARS, VIOLATION_CANCELLED, VIOLATION_CPU, VIOLATION_ERROR,
+                            VIOLATION_FILE_SIZE, VIOLATION_MEMORY, VIOLATION_OUTPUT, VIOLATION_TIMEOUT,
+                            SandboxLimits, resource, run_sandboxed)
+
+pytestmark = pytest.mark.skipif(os.name != "posix" or resource is None, reason="rlimits need a POSIX system")
+
+# Only the cap a test is about is set (plus a CPU backstop), so no other limit trips first
+TEST_LIMITS = dict(cpu_seconds=60, memory_mb=0, max_file_mb=0, max_processes=0, max_output_mb=0)
+
+
+def run_script(source, tmp_path, timeout=30, cancel_event=None, **limits):
+    return run_sandboxed([sys.executable, "-c", source], cwd=tmp_path, timeout=timeout, cancel_event=cancel_event,
+                         limits=SandboxLimits(**{**TEST_LIMITS, **limits}))
+
+
+# Whether pid still names a process that has not exited (a zombie waiting to be reaped has)
+def process_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_clean_exit_has_no_violation(tmp_path):
+    result = run_script("print('done')", tmp_path)
+    assert result["violation"] is None
+    assert result["message"] is None
+    assert result["stdout"] == "done\n"
+
+
+def test_sleep_loop_times_out(tmp_path):
+    result = run_script("import time\nwhile True: time.sleep(0.1)", tmp_path, timeout=1)
+    assert result["violation"] == VIOLATION_TIMEOUT
+    assert result["message"] == "Render timed out after 1s"
+    assert result["wall_seconds"] < 10
+
+
+def test_timeout_kills_orphaned_children(tmp_path):
+    # The script starts a child (as Manim starts latex/ffmpeg) that outlives it unless the group is killed
+    pid_file = tmp_path / "child.pid"
+    source = (
+        "import subprocess, sys, time\n"
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+        "time.sleep(60)\n"
+    )
+    result = run_script(source, tmp_path, timeout=2)
+    assert result["violation"] == VIOLATION_TIMEOUT
+    child = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while process_running(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not process_running(child)
+
+
+def test_busy_loop_hits_the_cpu_limit(tmp_path):
+    result = run_script("while True: pass", tmp_path, cpu_seconds=1)
+    assert result["violation"] == VIOLATION_CPU
+    assert result["message"] == "Render exceeded the CPU limit of 1s"
+
+
+def test_large_allocation_hits_the_memory_limit(tmp_path):
+    result = run_script("data = bytearray(2 * 1024 ** 3)", tmp_path, memory_mb=256)
+    assert result["violation"] == VIOLATION_MEMORY
+    assert result["message"] == "Render exceeded the memory limit of 256 MB"
+
+
+def test_oversized_write_hits_the_file_size_limit(tmp_path):
+    source = "with open('big.bin', 'wb') as out:\n    out.write(b'0' * (4 * 1024 * 1024))"
+    result = run_script(source, tmp_path, max_file_mb=1)
+    assert result["violation"] == VIOLATION_FILE_SIZE
+    assert result["message"] == "Render tried to write a file larger than 1 MB"
+    assert (tmp_path / "big.bin").stat().st_size <= 1024 * 1024
+
+
+def test_raised_exception_is_an_error(tmp_path):
+    result = run_script("raise ValueError('bad scene')", tmp_path)
+    assert result["violation"] == VIOLATION_ERROR
+    assert result["message"] is None
+    assert "ValueError: bad scene" in result["stderr"]
+
+
+def test_cancel_event_stops_the_run(tmp_path):
+    cancel_event = threading.Event()
+    threading.Timer(0.5, cancel_event.set).start()
+    result = run_script("import time\ntime.sleep(60)", tmp_path, timeout=30, cancel_event=cancel_event)
+    assert result["violation"] == VIOLATION_CANCELLED
+    assert result["message"] == "Render cancelled"
+    assert result["wall_seconds"] < 10
+
+
+def test_runaway_printer_hits_the_output_limit(tmp_path):
+    result = run_script("while True: print('x' * 1000)", tmp_path, max_output_mb=4)
+    assert result["violation"] == VIOLATION_OUTPUT
+    assert result["message"] == "Render wrote more than 4 MB of output"
+    # Only a bounded tail of the output is kept
+    assert 0 < len(result["stdout"]) <= OUTPUT_TAIL_CHARS
+    assert result["wall_seconds"] < 10
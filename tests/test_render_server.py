@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+import pipeline
+import render_server
+from pipeline import ManimCodeOutput, render_manim_code
+from render_server import RenderScheduler, create_server
+
+SCENE = """from manim import *
+
+class MainScene(Scene):
+    def construct(self):
+        self.wait(1)
+# {tag}
+"""
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Renders wait for `gate` and log the order they ran in
+    gate = threading.Event()
+    ran = []
+
+    def render(code, scene_name, output_dir, **kwargs):
+        gate.wait(10)
+        ran.append(code.rsplit("# ", 1)[1].strip())
+        return {"success": True, "video_id": "0" * 32, "video_path": "unused.mp4"}
+
+    monkeypatch.setattr(render_server, "render_manim_locally", render)
+    monkeypatch.setattr(render_server, "postprocess_video", lambda path: {})
+    scheduler = RenderScheduler(workers=1, aging_rate=0.0, preflight=False)
+    httpd = create_server("127.0.0.1", 0, scheduler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", scheduler, gate, ran
+    gate.set()
+    httpd.shutdown()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 10
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_jobs_from_two_sessions_are_interleaved(server):
+    api_url, scheduler, gate, ran = server
+    threads = []
+
+    def submit(tag, client_id, queued):
+        thread = threading.Thread(target=render_manim_code, daemon=True, kwargs={
+            "manim_code": ManimCodeOutput(code=SCENE.format(tag=tag), scene_name="MainScene"),
+            "api_url": api_url, "client_id": client_id})
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()["queued"] == queued)
+
+    # A job of a third session holds the only worker while both sessions queue up,
+    # the first one all its jobs before the second
+    submit("busy", "session-c", 0)
+    wait_until(lambda: scheduler.stats()["running"] == 1)
+    for index, tag in enumerate(["a1", "a2", "a3", "b1", "b2", "b3"], start=1):
+        submit(tag, f"session-{tag[0]}", index)
+    assert scheduler.stats()["clients"] == 2
+
+    gate.set()
+    for thread in threads:
+        thread.join(10)
+    assert ran == ["busy", "a1", "b1", "a2", "b2", "a3", "b3"]
+
+
+def test_storyboards_name_their_client(monkeypatch):
+    sent = {}
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {"storyboard_id": "s", "frames": []}
+
+    def post(url, json=None, headers=None, **kwargs):
+        sent["headers"] = headers
+        return Response()
+
+    monkeypatch.setattr(pipeline.requests, "post", post)
+    pipeline.render_storyboard(ManimCodeOutput(code=SCENE, scene_name="MainScene"), "http://render", client_id="s1")
+    assert sent["headers"] == {"X-Client-Id": "s1"}
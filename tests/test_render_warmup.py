@@ -0,0 +1,24 @@
+import time
+import render_backends
+import render_warmup
+from render_warmup import ServiceWarmer
+
+
+class Response:
+    status_code = 404
+
+
+def test_cold_start_of_a_service_without_health_endpoint_is_counted(monkeypatch):
+    # The service wakes up within 0.3s and then answers /health with a 404
+    def get(url, timeout):
+        time.sleep(0.3)
+        return Response()
+    monkeypatch.setattr(render_backends.requests, "get", get)
+    monkeypatch.setattr(render_warmup, "COLD_START_SECONDS", 0.2)
+    warmer = ServiceWarmer()
+    warmer.warm("http://render/")
+    time.sleep(0.5)
+    claimed = warmer.render_started("http://render")
+    assert claimed is not None and not claimed["warming"]
+    assert 0.3 <= claimed["hidden_seconds"] < 0.5
+    assert warmer.render_started("http://render") is None
@@ -0,0 +1,93 @@
+import ast
+import sys
+import types
+import pytest
+from sections import Section, stitch_scene_module
+
+INTRO_CODE = '''from manim import *
+
+SCALE = 1
+
+class Marker:
+    def __init__(self, text):
+        self.text = f"intro {text}"
+
+def label(text, scale=SCALE):
+    return Marker(text).text + f" x{scale}"
+
+class Section_intro(Scene):
+    def construct(self):
+        self.played.append(label("a"))
+        self.played.append(self.describe())
+
+    def describe(self):
+        return "intro helper"
+'''
+
+EXAMPLE_CODE = '''from manim import *
+import numpy as np
+
+SCALE = 2
+
+class Marker:
+    def __init__(self, text):
+        self.text = f"example {text}"
+
+def label(text):
+    SCALE = 10  # a local that shadows the module constant
+    return Marker(text).text + f" x{SCALE}"
+
+def scaled():
+    global SCALE
+    SCALE += 1
+    return SCALE
+
+class Section_example(Scene):
+    def construct(self):
+        self.played.append(label("b"))
+        self.played.append(scaled())
+        self.played.append([SCALE * n for n in range(2)])
+        self.played.append(self.describe())
+
+    def describe(self):
+        return "example helper"
+'''
+
+
+@pytest.fixture
+def fake_manim(monkeypatch):
+    # Just enough of Manim for the stitched MainScene to run
+    class Scene:
+        def __init__(self):
+            self.played = []
+
+        def clear(self):
+            self.played.append("clear")
+
+    manim = types.ModuleType("manim")
+    manim.Scene = Scene
+    manim.__all__ = ["Scene"]
+    monkeypatch.setitem(sys.modules, "manim", manim)
+
+
+def test_sections_with_the_same_top_level_names_do_not_collide(fake_manim):
+    sections = [Section(id="intro"), Section(id="example")]
+    code = stitch_scene_module(sections, [INTRO_CODE, EXAMPLE_CODE])
+
+    top_level = [node.name for node in ast.parse(code).body if isinstance(node, (ast.FunctionDef, ast.ClassDef))]
+    assert len(top_level) == len(set(top_level))
+
+    namespace = {}
+    exec(compile(code, "stitched", "exec"), namespace)
+    scene = namespace["MainScene"]()
+    scene.construct()
+    assert scene.played == [
+        "intro a x1", "intro helper", "clear",
+        "example b x10", 3, [0, 3], "example helper", "clear",
+    ]
+
+
+def test_stitching_is_deterministic():
+    sections = [Section(id="intro"), Section(id="example")]
+    assert stitch_scene_module(sections, [INTRO_CODE, EXAMPLE_CODE]) == \
+        stitch_scene_module(sections, [INTRO_CODE, EXAMPLE_CODE])
@@ -0,0 +1,17 @@
+from store import Store
+
+
+def test_cache_get_returns_a_copy(tmp_path):
+    store = Store(str(tmp_path / "studio.db"))
+    value = {"canonical": "pythagorean theorem", "jobs": ["a"]}
+    store.cache_put("topics", "key", value)
+
+    # Served from the pending write, then from the database
+    for _ in range(2):
+        entry = store.cache_get("topics", "key")
+        assert entry == value and entry is not value
+        entry["confidence"] = 0.5
+        entry["jobs"].append("b")
+        assert value == {"canonical": "pythagorean theorem", "jobs": ["a"]}
+        store.flush()
+    assert store.cache_get("topics", "key") == value
@@ -0,0 +1,22 @@
+from topics import canonicalize, topic_similarity
+
+
+def test_word_order_and_synonyms_share_a_key():
+    assert canonicalize("Pythagorean Theorem") == canonicalize("the pythagoras theorem?")
+
+
+def test_math_is_kept_in_order():
+    assert canonicalize("integrate 1/(x^2+1)") != canonicalize("integrate 1/(x+1)^2")
+    assert canonicalize("integrate 1/(x^2+1)") == "integral | 1/(x^2+1)"
+
+
+def test_single_letter_variables_are_not_stop_words():
+    assert canonicalize("a^2+b^2=c^2") != canonicalize("b^2=c^2")
+    assert canonicalize("a^2 + b^2 = c^2") == canonicalize("a^2+b^2=c^2")
+    assert canonicalize("solve x + 1 = 0") == "solve | x+1=0"
+
+
+def test_different_math_never_matches_fuzzily():
+    left, right = canonicalize("integrate 1/(x^2+1)"), canonicalize("integrate 1/(x+1)^2")
+    assert topic_similarity(left, right) == 0.0
+    assert topic_similarity(canonicalize("pythagorean theorm"), canonicalize("pythagoras theorem")) >= 0.85
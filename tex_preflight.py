@@ -0,0 +1,163 @@
+import ast
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from render_sandbox import run_sandboxed
+
+# Compiled LaTeX (.tex/.dvi/.svg named by content hash) shared by every render job
+TEX_CACHE_DIR = os.getenv("TEX_CACHE_DIR", os.path.join(os.getcwd(), "tex_cache"))
+
+# Compile a scene's LaTeX up front ("off" leaves it to the render)
+TEX_PREFLIGHT = os.getenv("TEX_PREFLIGHT", "on") != "off"
+TEX_PREFLIGHT_WORKERS = int(os.getenv("TEX_PREFLIGHT_WORKERS", str(min(4, os.cpu_count() or 1))))
+TEX_PREFLIGHT_TIMEOUT = float(os.getenv("TEX_PREFLIGHT_TIMEOUT", "120"))
+
+# Mobjects whose string arguments are compiled as they are written
+PREFLIGHT_CLASSES = {"Tex", "MathTex", "SingleStringMathTex"}
+# Keyword arguments that change the compiled document (and so the cache entry)
+TEX_KEYWORDS = {"arg_separator", "substrings_to_isolate", "tex_to_color_map", "tex_environment"}
+
+# Build each mobject the way the scene would, with the shared cache as Manim's tex_dir,
+# and write {"index": error or None} to the result file
+PREFLIGHT_RUNNER_TEMPLATE = """
+import json
+import re
+import manim
+from manim import config
+
+config.tex_dir = r"{tex_dir}"
+
+with open(r"{items_file}", encoding="utf-8") as f:
+    items = json.load(f)
+
+# The "! ..." lines of the LaTeX log named in Manim's error, or the error itself
+def latex_error(error):
+    match = re.search(r"(\\S+\\.log)", str(error))
+    try:
+        with open(match.group(1), encoding="utf-8", errors="replace") as f:
+            lines = [line.strip() for line in f if line.startswith("!")]
+        if lines:
+            return " ".join(lines[:3])
+    except (AttributeError, OSError):
+        pass
+    return str(error).splitlines()[0] if str(error) else type(error).__name__
+
+results = {{}}
+for index, item in items:
+    try:
+        getattr(manim, item["cls"])(*item["args"], **item["kwargs"])
+        results[index] = None
+    except Exception as e:
+        # Only LaTeX failures count; anything else is left for the render to report
+        is_latex = "converting to" in str(e) or "latex" in type(e).__name__.lower()
+        results[index] = latex_error(e) if is_latex else None
+
+with open(r"{result_file}", "w", encoding="utf-8") as f:
+    json.dump(results, f)
+"""
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+# Keyword value as the compile would see it, or raise ValueError if it cannot be read statically.
+# Only tex_to_color_map's keys matter (they split the formula), so its colors are replaced.
+def _keyword_value(keyword):
+    if keyword.arg == "tex_to_color_map" and isinstance(keyword.value, ast.Dict):
+        return {ast.literal_eval(key): "#FFFFFF" for key in keyword.value.keys}
+    return ast.literal_eval(keyword.value)
+
+
+# Every Tex/MathTex call with string literal arguments, as {"cls", "args", "kwargs"} (deduplicated).
+# Calls built from variables or f-strings are left to the render.
+def collect_tex(code):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    items = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or _call_name(node) not in PREFLIGHT_CLASSES or not node.args:
+            continue
+        if not all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in node.args):
+            continue
+        try:
+            kwargs = {keyword.arg: _keyword_value(keyword) for keyword in node.keywords
+                      if keyword.arg in TEX_KEYWORDS}
+        except ValueError:
+            continue
+        item = {"cls": _call_name(node), "args": [arg.value for arg in node.args], "kwargs": kwargs}
+        items.setdefault(json.dumps(item, sort_keys=True), item)
+    return list(items.values())
+
+
+def _cache_entries(cache_dir):
+    try:
+        return sum(name.endswith(".svg") for name in os.listdir(cache_dir))
+    except OSError:
+        return 0
+
+
+# Compile one batch in a sandboxed Manim process. Returns {index: error or None}, or
+# None if the batch could not run (no Manim, timeout, cancelled).
+def _compile_batch(batch, cache_dir, timeout, cancel_event):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        items_file = os.path.join(temp_dir, "items.json")
+        result_file = os.path.join(temp_dir, "results.json")
+        runner_file = os.path.join(temp_dir, "preflight.py")
+        with open(items_file, "w", encoding="utf-8") as f:
+            json.dump(batch, f)
+        with open(runner_file, "w", encoding="utf-8") as f:
+            f.write(PREFLIGHT_RUNNER_TEMPLATE.format(tex_dir=cache_dir, items_file=items_file,
+                                                     result_file=result_file))
+        process = run_sandboxed([sys.executable, runner_file], cwd=temp_dir, timeout=timeout,
+                                cancel_event=cancel_event)
+        if process["violation"] or not os.path.exists(result_file):
+            return None
+        with open(result_file, encoding="utf-8") as f:
+            return {int(index): error for index, error in json.load(f).items()}
+
+
+# Compile every literal Tex/MathTex of a scene into the shared Tex cache, in parallel
+# processes, so the render only hits warm entries and bad LaTeX fails in seconds.
+# Returns {"expressions", "compiled", "invalid": [{"tex", "error"}], "seconds", "skipped"}:
+# "compiled" counts new cache entries, "skipped" says why a batch did not run.
+def preflight_tex(code, cache_dir=TEX_CACHE_DIR, workers=TEX_PREFLIGHT_WORKERS, timeout=TEX_PREFLIGHT_TIMEOUT,
+                  cancel_event=None):
+    started = time.perf_counter()
+    items = collect_tex(code)
+    report = {"expressions": len(items), "compiled": 0, "invalid": [], "seconds": 0.0, "skipped": None}
+    if not items:
+        return report
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_before = _cache_entries(cache_dir)
+
+    indexed = list(enumerate(items))
+    batches = [indexed[start::workers] for start in range(min(workers, len(indexed)))]
+    with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+        outcomes = list(pool.map(lambda batch: _compile_batch(batch, cache_dir, timeout, cancel_event), batches))
+
+    for outcome in outcomes:
+        if outcome is None:
+            report["skipped"] = "LaTeX preflight did not finish; the render compiles the rest"
+            continue
+        for index, error in sorted(outcome.items()):
+            if error:
+                report["invalid"].append({"tex": " ".join(items[index]["args"]), "error": error})
+    report["compiled"] = max(0, _cache_entries(cache_dir) - cached_before)
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+# One-line summary of a preflight's invalid formulas, for render errors
+def invalid_tex_message(report):
+    formulas = "; ".join(f"`{' '.join(entry['tex'].split())[:80]}`: {entry['error']}" for entry in report["invalid"])
+    return f"Invalid LaTeX in {len(report['invalid'])} formula(s): {formulas}"
@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from store import get_store
+
+# Raw topic log (cached generations themselves live in the shared store)
+TOPIC_CACHE_DIR = os.getenv("TOPIC_CACHE_DIR", os.path.join(os.getcwd(), "topic_cache"))
+TOPIC_LOG_PATH = os.getenv("TOPIC_LOG_PATH", os.path.join(TOPIC_CACHE_DIR, "topic_log.jsonl"))
+
+# A fuzzy match must be at least this similar to reuse a cached generation
+TOPIC_MATCH_THRESHOLD = float(os.getenv("TOPIC_MATCH_THRESHOLD", "0.85"))
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "we", "what", "with", "you", "your",
+    "about", "explain", "explained", "introduction", "intro", "basics", "concept", "concepts",
+    "understanding", "understand", "learn", "video", "animation", "please", "show", "me",
+}
+
+# Words whose plural/variant forms the suffix rules below would get wrong
+IRREGULAR_LEMMAS = {
+    "matrices": "matrix", "vertices": "vertex", "indices": "index", "radii": "radius",
+    "axes": "axis", "bases": "basis", "hypotheses": "hypothesis", "analyses": "analysis",
+    "series": "series", "calculus": "calculus", "minus": "minus",
+    "focus": "focus", "foci": "focus", "loci": "locus", "formulae": "formula",
+}
+
+# Different names for the same concept map onto one canonical token
+SYNONYMS = {
+    "pythagoras": "pythagorean", "pythagoras's": "pythagorean", "pythagorus": "pythagorean",
+    "differentiation": "derivative", "differentiate": "derivative", "differential": "derivative",
+    "integration": "integral", "integrate": "integral", "antiderivative": "integral",
+    "trig": "trigonometry", "trigonometric": "trigonometry",
+    "prob": "probability", "stats": "statistic", "statistics": "statistic",
+    "eigen": "eigenvalue",
+    "theorm": "theorem", "thereom": "theorem", "thm": "theorem",
+    "eqn": "equation", "eq": "equation", "quadratics": "quadratic",
+    "log": "logarithm", "logs": "logarithm", "ln": "logarithm",
+    "vectors": "vector", "lim": "limit",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+# Whitespace-separated chunks that are plain (possibly hyphenated) words; any other
+# chunk with a digit or a symbol is math, like "1/(x^2+1)" or "a^2+b^2=c^2"
+WORD_CHUNK_PATTERN = re.compile(r"^[a-z']+(?:-[a-z']+)*$")
+MATH_CHAR_PATTERN = re.compile(r"[0-9^+\-*/=<>()\[\]{}|\\_!]")
+# Sentence punctuation around a chunk that is not part of the math
+CHUNK_PUNCTUATION = ",.?;:\"`"
+# Separates the sorted words of a canonical topic from its math, which is kept in order
+MATH_SEPARATOR = " | "
+
+
+# Rule-based lemmatizer: irregular table, then common plural/verb suffixes
+def lemmatize(word):
+    if word in IRREGULAR_LEMMAS:
+        return IRREGULAR_LEMMAS[word]
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+# Split a lowercased topic into word chunks and math runs. Consecutive math chunks form
+# one run with the spaces removed, and a lone letter next to math ("x + 1") is a variable.
+def _split_math(text):
+    chunks = [chunk.strip(CHUNK_PUNCTUATION) for chunk in text.split()]
+    chunks = [chunk for chunk in chunks if chunk]
+    is_math = [not WORD_CHUNK_PATTERN.match(chunk) and bool(MATH_CHAR_PATTERN.search(chunk)) for chunk in chunks]
+    for index, chunk in enumerate(chunks):
+        if len(chunk) == 1 and chunk.isalpha() and any(
+                0 <= neighbor < len(chunks) and is_math[neighbor] for neighbor in (index - 1, index + 1)):
+            is_math[index] = True
+    words, runs = [], []
+    for index, chunk in enumerate(chunks):
+        if not is_math[index]:
+            words.append(chunk)
+        elif index and is_math[index - 1]:
+            runs[-1] += chunk
+        else:
+            runs.append(chunk)
+    return " ".join(words), runs
+
+
+def _canonical_words(text):
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        word = word.strip("'")
+        if word.endswith("'s"):
+            word = word[:-2]
+        if not word or word in STOP_WORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        for part in word.split():
+            part = SYNONYMS.get(lemmatize(part), lemmatize(part))
+            if part not in STOP_WORDS:
+                tokens.append(part)
+    return sorted(set(tokens))
+
+
+# Canonical form of a free-text topic: the words lowercased, stop words dropped,
+# lemmatized, synonyms unified and sorted so word order does not matter. Math
+# ("1/(x^2+1)", "a^2+b^2=c^2") is kept verbatim and in order after MATH_SEPARATOR,
+# since reordering or dropping any of it changes the problem.
+def canonicalize(topic):
+    text, runs = _split_math((topic or "").lower())
+    canonical = " ".join(_canonical_words(text))
+    if runs:
+        canonical = f"{canonical}{MATH_SEPARATOR}{' '.join(runs)}".strip()
+    return canonical
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _math_part(canonical):
+    return f" {canonical}".partition(MATH_SEPARATOR)[2]
+
+
+# Similarity of two canonical topics: token overlap blended with character
+# trigrams, so small spelling differences still score high. Topics with
+# different math are different problems, however close the wording.
+def topic_similarity(left, right):
+    if not left or not right:
+        return 0.0
+    if left == right:
+        return 1.0
+    if _math_part(left) != _math_part(right):
+        return 0.0
+    left_tokens, right_tokens = set(left.split()), set(right.split())
+    token_score = len(left_tokens & right_tokens) / len(left_tokens | right_tokens)
+    left_grams, right_grams = _trigrams(left), _trigrams(right)
+    gram_score = len(left_grams & right_grams) / len(left_grams | right_grams)
+    return 0.5 * token_score + 0.5 * gram_score
+
+
+# Cached generations keyed by canonical topic with a fuzzy lookup over all keys.
+# Entries live in the shared store; the keys are mirrored in memory for matching.
+class TopicCache:
+    NAMESPACE = "topic"
+
+    def __init__(self, store=None, root=TOPIC_CACHE_DIR, threshold=TOPIC_MATCH_THRESHOLD):
+        self.store = store or get_store()
+        self.root = root
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._import_json_cache()
+        self._index = set(self.store.cache_keys(self.NAMESPACE))
+
+    # One-time import of the earlier index.json + per-topic JSON file layout
+    def _import_json_cache(self):
+        index_path = os.path.join(self.root, "index.json")
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        for canonical in index:
+            entry_path = os.path.join(self.root, hashlib.sha256(canonical.encode("utf-8")).hexdigest() + ".json")
+            if os.path.exists(entry_path):
+                with open(entry_path, encoding="utf-8") as f:
+                    self.store.cache_put(self.NAMESPACE, canonical, json.load(f))
+        os.replace(index_path, index_path + ".imported")
+
+    # Best cached canonical topic for a raw topic: (canonical, confidence) or (None, 0.0)
+    def match(self, topic):
+        canonical = canonicalize(topic)
+        with self._lock:
+            if canonical in self._index:
+                return canonical, 1.0
+            best, best_score = None, 0.0
+            for cached in self._index:
+                score = topic_similarity(canonical, cached)
+                if score > best_score:
+                    best, best_score = cached, score
+        if best_score >= self.threshold:
+            return best, best_score
+        return None, best_score
+
+    def get(self, topic):
+        canonical, confidence = self.match(topic)
+        if canonical is None:
+            return None
+        entry = self.store.cache_get(self.NAMESPACE, canonical)
+        if entry is None:
+            return None
+        entry["confidence"] = confidence
+        return entry
+
+    def put(self, topic, result):
+        canonical = canonicalize(topic)
+        entry = dict(result, topic=topic, canonical=canonical, created=time.time())
+        with self._lock:
+            self.store.cache_put(self.NAMESPACE, canonical, entry)
+            self._index.add(canonical)
+
+    def invalidate(self, canonical):
+        with self._lock:
+            self._index.discard(canonical)
+            self.store.cache_delete(self.NAMESPACE, canonical)
+
+
+# Append a requested topic to the log used for hit-rate reports
+def log_topic(topic, path=TOPIC_LOG_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"topic": topic, "at": time.time()}) + "\n")
+
+
+# Replay a topic log against an exact-string cache and the canonical/fuzzy cache
+def hit_rate_report(topics, threshold=TOPIC_MATCH_THRESHOLD):
+    exact_seen = set()
+    canonical_seen = []
+    exact_hits = fuzzy_hits = 0
+    for topic in topics:
+        if topic in exact_seen:
+            exact_hits += 1
+        exact_seen.add(topic)
+
+        canonical = canonicalize(topic)
+        if any(topic_similarity(canonical, seen) >= threshold for seen in canonical_seen):
+            fuzzy_hits += 1
+        else:
+            canonical_seen.append(canonical)
+    total = len(topics)
+    return {
+        "requests": total,
+        "exact_hit_rate": exact_hits / total if total else 0.0,
+        "canonical_hit_rate": fuzzy_hits / total if total else 0.0,
+        "distinct_generations_exact": len(exact_seen),
+        "distinct_generations_canonical": len(canonical_seen),
+    }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_topic_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TopicCache()
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Topic canonicalization tools")
+    parser.add_argument("log", nargs="?", default=TOPIC_LOG_PATH, help="Topic log (jsonl) to report on")
+    parser.add_argument("--threshold", type=float, default=TOPIC_MATCH_THRESHOLD)
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        topics = [json.loads(line)["topic"] for line in f if line.strip()]
+    print(json.dumps(hit_rate_report(topics, args.threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
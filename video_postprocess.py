@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+
+# Emit HLS next to the faststart MP4 (off by default: it doubles storage per video)
+HLS_ENABLED = os.getenv("RENDER_HLS", "off") == "on"
+# A short first segment lets players start after ~1s of data, later ones can be longer
+HLS_INIT_SECONDS = float(os.getenv("HLS_INIT_SECONDS", "1"))
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+
+FASTSTART_SUFFIX = ".faststart.mp4"
+
+
+# Top-level MP4 boxes as (type, offset, size)
+def mp4_boxes(path):
+    boxes = []
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, box_type = struct.unpack(">I4s", f.read(8))
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = file_size - offset
+            if size < 8:
+                break
+            boxes.append((box_type.decode("latin-1"), offset, size))
+            offset += size
+    return boxes
+
+
+# True if the moov atom comes before the media data, so playback can start early
+def is_faststart(path):
+    offsets = {box_type: offset for box_type, offset, _ in reversed(mp4_boxes(path))}
+    return "moov" in offsets and offsets["moov"] < offsets.get("mdat", float("inf"))
+
+
+# Bytes a progressive player must download before it can show the first frame:
+# everything up to the end of moov plus the start of mdat when moov is in front,
+# otherwise the whole file (or a second ranged round trip to the tail)
+def bytes_before_first_frame(path, first_frame_bytes=64 * 1024):
+    boxes = mp4_boxes(path)
+    moov = next(((offset, size) for box_type, offset, size in boxes if box_type == "moov"), None)
+    if moov is None:
+        return os.path.getsize(path)
+    if is_faststart(path):
+        return min(os.path.getsize(path), moov[0] + moov[1] + first_frame_bytes)
+    return os.path.getsize(path)
+
+
+# Estimated time-to-first-frame for a download bandwidth (bytes/s) and round-trip time
+def time_to_first_frame(path, bandwidth=1_000_000, rtt=0.1):
+    return rtt + bytes_before_first_frame(path) / bandwidth
+
+
+def faststart_path(video_path):
+    root, _ = os.path.splitext(video_path)
+    return root + FASTSTART_SUFFIX
+
+
+def hls_dir(video_path):
+    root, _ = os.path.splitext(video_path)
+    return os.path.join(os.path.dirname(root), "hls", os.path.basename(root))
+
+
+# Remux (no re-encode) with the moov atom moved to the front. The original is kept
+# and the remux cached next to it; returns its path, or None if ffmpeg failed.
+def make_faststart(video_path):
+    output_path = faststart_path(video_path)
+    if os.path.exists(output_path):
+        return output_path
+    if is_faststart(video_path):
+        shutil.copyfile(video_path, output_path)
+        return output_path
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(output_path))
+    os.close(fd)
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path,
+             "-c", "copy", "-movflags", "+faststart", tmp_path],
+            check=True,
+            capture_output=True
+        )
+        os.replace(tmp_path, output_path)
+        return output_path
+    except (OSError, subprocess.CalledProcessError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
+# Segment into VOD HLS with a short first segment. Segments are cut on keyframes
+# (stream copy), so the first one is at most one GOP longer than HLS_INIT_SECONDS.
+# Returns the playlist path, or None if ffmpeg failed.
+def make_hls(video_path, init_seconds=HLS_INIT_SECONDS, segment_seconds=HLS_SEGMENT_SECONDS):
+    output_dir = hls_dir(video_path)
+    playlist = os.path.join(output_dir, "index.m3u8")
+    if os.path.exists(playlist):
+        return playlist
+    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(output_dir))
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-c", "copy",
+             "-f", "hls", "-hls_playlist_type", "vod",
+             "-hls_init_time", str(init_seconds), "-hls_time", str(segment_seconds),
+             "-hls_segment_filename", os.path.join(tmp_dir, "segment_%03d.ts"),
+             os.path.join(tmp_dir, "index.m3u8")],
+            check=True,
+            capture_output=True
+        )
+        os.replace(tmp_dir, output_dir)
+        return playlist
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+
+# Post-render stage: faststart remux, plus HLS when enabled
+def postprocess_video(video_path, hls=HLS_ENABLED):
+    result = {"faststart_path": make_faststart(video_path), "hls_playlist": None}
+    if hls:
+        result["hls_playlist"] = make_hls(video_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faststart/HLS post-processing and time-to-first-frame estimates")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--bandwidth", type=float, default=1_000_000, help="Download bandwidth in bytes/s")
+    parser.add_argument("--rtt", type=float, default=0.1)
+    parser.add_argument("--hls", action="store_true")
+    args = parser.parse_args()
+
+    for video in args.videos:
+        before = time_to_first_frame(video, args.bandwidth, args.rtt)
+        outputs = postprocess_video(video, hls=args.hls)
+        after = time_to_first_frame(outputs["faststart_path"], args.bandwidth, args.rtt) \
+            if outputs["faststart_path"] else None
+        print(json.dumps({
+            "video": video,
+            "size": os.path.getsize(video),
+            "faststart_before": is_faststart(video),
+            "ttff_before": round(before, 3),
+            "ttff_after": round(after, 3) if after is not None else None,
+            **outputs,
+        }))
+
+
+if __name__ == "__main__":
+    main()